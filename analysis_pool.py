@@ -0,0 +1,320 @@
+# analysis_pool.py
+import os
+import time
+import threading
+import logging
+import functools
+import multiprocessing
+from warmup import warm_up_pipeline, WARMUP_ENABLED
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+# librosa (~1s with numba and scipy) is imported inside the functions that use it,
+# so catalog-only processes and CLIs never load it
+from audio_features import (
+    decode_audio_bytes, magnitude_spectrogram, extract_clip_features, extract_rhythm_features,
+    ANALYSIS_PROFILES, ANALYSIS_SR
+)
+from audio_streaming import analyze_stream, stream_decode_audio_bytes
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+# Tasks admitted beyond the running ones before requests are turned away
+ANALYSIS_QUEUE_SIZE = int(os.environ.get('ANALYSIS_QUEUE_SIZE', 2 * ANALYSIS_WORKERS))
+ANALYSIS_TIMEOUT = int(os.environ.get('ANALYSIS_TIMEOUT', 60))
+# Suggested client back-off when the pool is full (Retry-After header)
+ANALYSIS_RETRY_AFTER = int(os.environ.get('ANALYSIS_RETRY_AFTER', 5))
+# Seconds start() waits for the workers to spawn and warm up
+ANALYSIS_START_TIMEOUT = int(os.environ.get('ANALYSIS_START_TIMEOUT', 120))
+
+# Leading audio returned for reference matching (see extract_signal_features)
+MATCH_HEAD_SECONDS = 10
+
+
+class PoolSaturated(Exception):
+    """Raised when the analysis queue is full (callers answer 503)"""
+
+
+class AnalysisTimeout(Exception):
+    """Raised when an analysis task exceeds its time budget"""
+
+
+def _warm_worker():
+    """
+    Pool initializer: run the full pipeline once so the first real task
+    doesn't pay for lazy imports and numba compilation
+    """
+    if WARMUP_ENABLED:
+        warm_up_pipeline()
+
+
+def _ping():
+    return os.getpid()
+
+
+def analyze_audio_bytes(audio_bytes, profile_name, streaming=False):
+    """
+    Decode and featurize one uploaded recording (runs in a pool worker)
+
+    Args:
+        audio_bytes: Encoded audio file contents
+        profile_name: Analysis profile (see ANALYSIS_PROFILES)
+        streaming: Decode and analyse block by block (bounded memory)
+
+    Returns:
+        Dict with 'features' (mean features), 'rhythm', 'duration', 'sr',
+        'head' (leading samples for reference matching), 'timeline'
+        (streaming only), 'conversion_time', 'analysis_time' and 'stages'
+        (perf_counter seconds per pipeline stage)
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg could not decode the input
+        subprocess.TimeoutExpired: ffmpeg did not finish in time
+    """
+    import librosa
+    if streaming:
+        # Decode and analysis overlap, so everything counts as analysis time
+        analysis_start = time.perf_counter()
+        features = analyze_stream(stream_decode_audio_bytes(audio_bytes), ANALYSIS_SR)
+        analysis_time = time.perf_counter() - analysis_start
+        rhythm = {
+            key: features.pop(key)
+            for key in ('periodicity_hz', 'periodicity_rpm', 'periodicity_strength')
+        }
+        head = features.pop('head')
+        return {
+            'features': features,
+            'rhythm': rhythm,
+            'duration': features['duration'],
+            'sr': ANALYSIS_SR,
+            'head': head[:MATCH_HEAD_SECONDS * ANALYSIS_SR],
+            'timeline': features.pop('timeline'),
+            'conversion_time': 0.0,
+            'analysis_time': analysis_time,
+            'stages': {'stream_analysis': analysis_time},
+        }
+
+    stages = {}
+    stage_start = time.perf_counter()
+    y, sr = decode_audio_bytes(audio_bytes)
+    stages['ffmpeg'] = time.perf_counter() - stage_start
+
+    duration = librosa.get_duration(y=y, sr=sr)
+
+    # All spectral metrics share one STFT of the clip
+    stage_start = time.perf_counter()
+    S = magnitude_spectrogram(y)
+    stages['stft'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    features = extract_clip_features(y, sr, S=S)
+    stages['clip_features'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    try:
+        rhythm = extract_rhythm_features(S, sr, beat_tracking=ANALYSIS_PROFILES[profile_name]['beat_tracking'])
+    except Exception as e:
+        logger.warning(f"Periodicity detection failed: {e}")
+        rhythm = {'periodicity_hz': 0.0, 'periodicity_rpm': 0.0, 'periodicity_strength': 0.0}
+    stages['rhythm'] = time.perf_counter() - stage_start
+
+    return {
+        'features': features,
+        'rhythm': rhythm,
+        'duration': duration,
+        'sr': sr,
+        'head': y[:MATCH_HEAD_SECONDS * sr],
+        'conversion_time': stages['ffmpeg'],
+        'analysis_time': stages['stft'] + stages['clip_features'] + stages['rhythm'],
+        'stages': stages,
+    }
+
+
+class AnalysisPool:
+    """
+    Warm process pool for CPU-bound librosa work, kept off request threads
+
+    At most max_workers + queue_size tasks are admitted at once; a
+    non-blocking submit beyond that raises PoolSaturated so the web tier
+    can shed load with a 503 instead of queueing without bound. A slot is
+    released only when its task really finishes (a running task can't be
+    cancelled), so admission always reflects the work the workers hold.
+    """
+
+    def __init__(self, max_workers=ANALYSIS_WORKERS, queue_size=ANALYSIS_QUEUE_SIZE,
+                 timeout=ANALYSIS_TIMEOUT):
+        """
+        Args:
+            max_workers: Worker processes
+            queue_size: Tasks admitted while all workers are busy
+            timeout: Default seconds to wait for a task result
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+        # Reentrant: a warm-up future that has already failed runs its
+        # done-callback (which discards the executor) inside _get_executor
+        self._lock = threading.RLock()
+        self._executor = None
+        self._warm_futures = []
+        self._in_flight = 0
+
+    def _get_executor(self):
+        """Return the live executor, creating (and spawning) a fresh one if needed"""
+        with self._lock:
+            if self._executor is None:
+                # spawn: the web process is threaded, where fork is unsafe
+                executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_warm_worker
+                )
+                self._executor = executor
+                # One ping per worker spawns the whole pool now rather than
+                # worker by worker under load, and tracks its warm-up for /ready
+                self._warm_futures = [executor.submit(_ping) for _ in range(self.max_workers)]
+                for future in self._warm_futures:
+                    future.add_done_callback(functools.partial(self._check_warm, executor))
+            return self._executor
+
+    def _check_warm(self, executor, future):
+        if future.cancelled() or future.exception() is None:
+            return
+        if self._discard(executor):
+            logger.error(f"Analysis pool workers failed to start: {future.exception()}")
+
+    def start(self, wait=WARMUP_ENABLED, timeout=ANALYSIS_START_TIMEOUT):
+        """
+        Spawn and warm all workers ahead of the first request
+
+        Args:
+            wait: Block until every worker has answered (so a worker that
+                cannot start fails the process at startup, not a request)
+            timeout: Seconds to wait for the workers when wait is set
+
+        Raises:
+            RuntimeError: a worker failed to start (only when waiting)
+        """
+        # Pool workers re-import the app module; they must not start pools of their own
+        # (parent_process() is still unset while the main module is re-imported)
+        if multiprocessing.current_process().name != 'MainProcess':
+            return
+        self._get_executor()
+        warm_futures = list(self._warm_futures)
+        logger.info(f"Analysis pool starting {self.max_workers} workers")
+        if not wait:
+            return
+
+        done, pending = wait_futures(warm_futures, timeout=timeout)
+        for future in done:
+            if future.cancelled() or future.exception() is not None:
+                error = 'cancelled' if future.cancelled() else future.exception()
+                raise RuntimeError(f"Analysis pool workers failed to start: {error}")
+        if pending:
+            logger.warning(f"Analysis pool workers still warming up after {timeout}s")
+        else:
+            logger.info(f"Analysis pool ready ({self.max_workers} workers)")
+
+    def is_ready(self):
+        """True once start() has a warmed-up worker answering"""
+        if self._warm_futures and self._executor is None:
+            # Discarded after a failure: respawn so readiness can recover without traffic
+            self._get_executor()
+        return bool(self._warm_futures) and all(
+            future.done() and future.exception() is None for future in self._warm_futures
+        )
+
+    def submit(self, fn, *args, block=False):
+        """
+        Admit fn(*args) to the pool
+
+        Args:
+            block: Wait for a free slot instead of raising (background jobs)
+
+        Returns:
+            concurrent.futures.Future
+
+        Raises:
+            PoolSaturated: no free slot and block is False
+        """
+        return self._submit(fn, args, block)[0]
+
+    def _submit(self, fn, args, block):
+        """
+        Returns:
+            Tuple (future, executor it was submitted to)
+        """
+        if not self._slots.acquire(blocking=block):
+            raise PoolSaturated("Analysis queue is full")
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # Broken since its last task: replace it once and retry
+                self._discard(executor)
+                executor = self._get_executor()
+                future = executor.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+
+        future.add_done_callback(lambda _: self._release())
+        return future, executor
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def in_flight(self):
+        """Tasks admitted and not yet finished (running plus queued)"""
+        return self._in_flight
+
+    def run(self, fn, *args, block=False, timeout=None):
+        """
+        Run fn(*args) on the pool and wait for its result
+
+        Raises:
+            PoolSaturated: no free slot and block is False
+            AnalysisTimeout: no result within timeout (default self.timeout)
+        """
+        future, executor = self._submit(fn, args, block)
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise AnalysisTimeout(f"Analysis did not finish within {timeout or self.timeout}s")
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); the next submit gets a fresh pool
+            if self._discard(executor):
+                logger.error("Analysis pool broken, workers will be replaced on the next task")
+            raise
+
+    def _discard(self, executor):
+        """
+        Drop executor if it is still the live one (a concurrent caller may
+        already have replaced it)
+
+        Returns:
+            True if this call dropped it
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return False
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        return True
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Process-wide pool shared by the upload routes and background jobs
+analysis_pool = AnalysisPool()
@@ -1,20 +1,34 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
-import librosa
-import numpy as np
 import subprocess
 import os
-from pathlib import Path
 import uuid
+import time
 from datetime import datetime
 import logging
 import traceback
-import requests
+# First local import: sets the numba cache dir before librosa loads
+from warmup import warmup_state
 from vehicle_api import vehicle_bp
-from youtube_helper import search_vehicle_issue_videos, YouTubeAudioDownloader
-from audio_matcher import find_best_audio_match
+from audio_matcher import extract_signal_features, find_best_reference_match, infer_issue_type
+from reference_index import get_vehicle_references, get_reference_index
+from reference_library import get_reference_library
+from audio_landmarks import extract_landmarks, LANDMARK_MIN_CONFIDENCE
+from result_cache import result_cache, result_cache_key
+from metrics import metrics, RequestTrace, timed_stage
+from log_config import configure_logging, dropped_log_records, LOG_DIR
+from audio_features import ANALYSIS_PROFILES, DEFAULT_ANALYSIS_PROFILE, ANALYSIS_SR
+from audio_streaming import STREAMING_THRESHOLD_BYTES
+from analysis_pool import (
+    analysis_pool, analyze_audio_bytes, PoolSaturated, AnalysisTimeout, ANALYSIS_RETRY_AFTER
+)
+from match_jobs import MatchJobQueue
+from live_analysis import LiveSessionRegistry
+from diagnostic_rules import rule_engine
+from batch_analysis import run_batch, resolve_batch_source, BATCH_ROOT, BATCH_OUTPUT_DIR, BATCH_POOL_WORKERS
 import json
+import copy
 
 app = Flask(__name__)
 
@@ -22,31 +36,12 @@ app = Flask(__name__)
 # LOGGING CONFIGURATION
 # ============================================================
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+# One queue drained by a background writer thread: request threads never
+# block on the log file or stdout (level: LOG_LEVEL, see log_config.py)
+configure_logging()
 
 logger = logging.getLogger(__name__)
 
-log_dir = Path('./logs')
-log_dir.mkdir(exist_ok=True)
-
-file_handler = logging.FileHandler(log_dir / f'autodecx_{datetime.now().strftime("%Y%m%d")}.log')
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-))
-logger.addHandler(file_handler)
-
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(logging.Formatter(
-    '%(asctime)s - %(levelname)s - %(message)s'
-))
-logger.addHandler(console_handler)
-
 logger.info("="*60)
 logger.info("AutoDecX Audio Analysis Backend Initialized")
 logger.info("="*60)
@@ -69,12 +64,45 @@ CORS(app, resources={
     }
 })
 
-UPLOAD_FOLDER = Path('./uploads')
-UPLOAD_FOLDER.mkdir(exist_ok=True)
-
 MAX_FILE_SIZE = 10 * 1024 * 1024
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
+# Cosine similarity a reference fingerprint match needs to override the
+# rule-based diagnosis (landmark matches use LANDMARK_MIN_CONFIDENCE)
+REFERENCE_MIN_SIMILARITY = 0.70
+
+# YouTube reference matching runs here, off the request thread
+match_jobs = MatchJobQueue()
+
+# Warm up this process before serving traffic, then start the analysis
+# pool; its workers warm up from the numba cache this run just filled
+# (concurrent first-time writers can corrupt the cache). With warm-up
+# enabled start() waits for the workers, so one that cannot spawn fails
+# the boot instead of the first upload
+warmup_state.run()
+analysis_pool.start()
+
+# In-progress live recordings (per process - chunked uploads need a
+# single worker process or sticky routing)
+live_sessions = LiveSessionRegistry()
+
+# Archive re-scoring runs one batch at a time on a slice of the analysis pool
+batch_jobs = MatchJobQueue(jobs_dir=os.environ.get('BATCH_JOBS_DIR', './batch_jobs'), max_workers=1)
+
+# Queue depths and cache effectiveness, read at scrape time by GET /metrics
+metrics.callback('autodecx_analysis_pool_in_flight', 'Analysis tasks admitted and not yet finished',
+                 analysis_pool.in_flight)
+metrics.callback('autodecx_match_jobs_depth', 'Reference-matching jobs queued or running', match_jobs.depth)
+metrics.callback('autodecx_live_sessions', 'Open live diagnosis sessions', lambda: len(live_sessions))
+metrics.callback('autodecx_result_cache_hits_total', 'Result cache hits',
+                 lambda: result_cache.stats()['hits'], 'counter')
+metrics.callback('autodecx_result_cache_misses_total', 'Result cache misses',
+                 lambda: result_cache.stats()['misses'], 'counter')
+metrics.callback('autodecx_log_records_dropped_total', 'Log records dropped because the log queue was full',
+                 dropped_log_records, 'counter')
+metrics.callback('autodecx_result_cache_hit_ratio', 'Result cache hit ratio since start',
+                 lambda: result_cache.stats()['hit_rate'])
+
 # ============================================================
 # REGISTER BLUEPRINTS
 # ============================================================
@@ -87,20 +115,356 @@ logger.info("✅ Vehicle API blueprint registered")
 # ============================================================
 
 @app.before_request
-def log_request_info():
-    """Log incoming request details"""
-    logger.info(f"Incoming request: {request.method} {request.path}")
-    logger.info(f"Remote address: {request.remote_addr}")
-    logger.info(f"User agent: {request.headers.get('User-Agent', 'Unknown')}")
-    if request.method == 'POST':
-        logger.info(f"Content type: {request.content_type}")
-        logger.info(f"Content length: {request.content_length} bytes")
+def start_request_trace():
+    """Start timing the request (routes add stages and fields to g.trace)"""
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    g.trace = RequestTrace(str(uuid.uuid4())[:8], route, request.method)
+    g.trace.set(remote_addr=request.remote_addr, content_length=request.content_length)
 
 @app.after_request
-def log_response_info(response):
-    """Log response details"""
-    logger.info(f"Response status: {response.status_code}")
-    logger.info(f"Response size: {response.content_length} bytes")
+def finish_request_trace(response):
+    """Write the single structured log record for the request"""
+    trace = g.get('trace')
+    if trace is not None:
+        trace.set(response_bytes=response.content_length)
+        trace.finish(response.status_code)
+    return response
+
+# ============================================================
+# DIAGNOSIS HELPERS
+# ============================================================
+
+# Log tag per rule severity
+RULE_LOG_TAGS = {
+    'error': 'CRITICAL',
+    'warning': 'WARNING',
+    'info': 'INFO'
+}
+
+
+def busy_response():
+    """503 telling the client to retry once the analysis pool has capacity"""
+    response = jsonify({'error': 'Server busy analyzing other recordings, please retry shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(ANALYSIS_RETRY_AFTER)
+    return response
+
+
+def run_diagnostic_rules(rms, spectral_centroid, zcr, spectral_bandwidth, duration, request_id):
+    """
+    Rule-based diagnostics on the clip's mean features (see diagnostic_rules.py)
+    
+    Returns:
+        List of issue dicts (type, severity, message)
+    """
+    rule_engine.maybe_reload()
+    
+    with timed_stage('rules'):
+        issues, fired_rules, quiet_groups = rule_engine.diagnose({
+            'rms': rms,
+            'spectral_centroid': spectral_centroid,
+            'zero_crossing_rate': zcr,
+            'spectral_bandwidth': spectral_bandwidth,
+            'duration': duration
+        })
+    
+    # Per-rule detail at debug level; the request record carries the issue types
+    if logger.isEnabledFor(logging.DEBUG):
+        values = f"RMS={rms:.4f}, centroid={spectral_centroid:.1f}Hz, ZCR={zcr:.4f}, bandwidth={spectral_bandwidth:.1f}Hz, duration={duration:.2f}s"
+        logger.debug(f"[{request_id}] Rule inputs: {values}")
+        for rule in fired_rules:
+            logger.debug(f"[{request_id}] {RULE_LOG_TAGS[rule['severity']]}: {rule['label']}")
+        for label in quiet_groups:
+            logger.debug(f"[{request_id}] {label}: Normal")
+    
+    return issues
+
+
+def finalize_diagnosis(response, request_id):
+    """Pick the primary issue and confidence from the detected issues"""
+    # Only update if YouTube didn't already provide better diagnosis
+    if len(response['issues']) > 0 and response['confidence'] < 0.90:
+        severity_order = {'error': 0, 'warning': 1, 'info': 2}
+        sorted_issues = sorted(response['issues'], key=lambda x: severity_order[x['severity']])
+        
+        # Only override if YouTube diagnosis wasn't confident
+        if response['predicted_issue'] == 'No significant issues detected':
+            response['predicted_issue'] = sorted_issues[0]['message']
+        
+        critical_count = sum(1 for i in response['issues'] if i['severity'] == 'error')
+        warning_count = sum(1 for i in response['issues'] if i['severity'] == 'warning')
+        
+        if critical_count > 0:
+            if response['confidence'] < 0.95:
+                response['confidence'] = 0.95
+            logger.debug(f"[{request_id}] Overall assessment: CRITICAL ({critical_count} critical issues)")
+        elif warning_count > 2:
+            if response['confidence'] < 0.85:
+                response['confidence'] = 0.85
+            logger.debug(f"[{request_id}] Overall assessment: WARNING ({warning_count} warnings)")
+        elif warning_count > 0:
+            if response['confidence'] < 0.80:
+                response['confidence'] = 0.80
+            logger.debug(f"[{request_id}] Overall assessment: WARNING")
+        else:
+            if response['confidence'] < 0.75:
+                response['confidence'] = 0.75
+            logger.debug(f"[{request_id}] Overall assessment: INFORMATIONAL")
+    elif len(response['issues']) == 0:
+        logger.debug(f"[{request_id}] Overall assessment: NORMAL")
+    
+    return response
+
+
+def new_analysis_response(duration, sr, clip_features, rhythm):
+    """Initial /upload-style response for a clip's features (before diagnostics)"""
+    response = {
+        'success': True,
+        'metrics': {
+            'duration': round(duration, 2),
+            'sample_rate': int(sr),
+            'rms': round(clip_features['rms'], 4),
+            'zero_crossing_rate': round(clip_features['zero_crossing_rate'], 4),
+            'periodicity_hz': round(rhythm['periodicity_hz'], 2),
+            'periodicity_rpm': round(rhythm['periodicity_rpm'], 1),
+            'periodicity_strength': round(rhythm['periodicity_strength'], 2),
+            'dominant_frequency': round(clip_features['spectral_centroid'], 2),
+            'spectral_rolloff': round(clip_features['spectral_rolloff'], 2),
+            'spectral_bandwidth': round(clip_features['spectral_bandwidth'], 2),
+            'vibration_level': round(clip_features['rms'], 4)
+        },
+        'issues': [],
+        'predicted_issue': 'No significant issues detected',
+        'confidence': 0.85
+    }
+    
+    if 'tempo' in rhythm:
+        response['metrics']['tempo'] = round(rhythm['tempo'], 1)
+    
+    return response
+
+
+def complete_diagnosis(response, clip_features, duration, request_id, vehicle_info=None, y=None, sr=None):
+    """
+    Run the rule-based diagnostics on a response and queue YouTube matching
+    
+    Args:
+        response: Response from new_analysis_response (updated in place)
+        clip_features: Unrounded mean features of the clip
+        duration: Clip duration in seconds
+        request_id: Request id for log correlation
+        vehicle_info: Vehicle details; when given, reference matching is queued
+        y: Decoded user audio (needed for matching)
+        sr: Sample rate of y
+        
+    Returns:
+        The updated response
+    """
+    # Existing rule-based diagnostics (as fallback)
+    response['issues'] = run_diagnostic_rules(
+        clip_features['rms'], clip_features['spectral_centroid'], clip_features['zero_crossing_rate'],
+        clip_features['spectral_bandwidth'], duration, request_id
+    )
+    
+    # Diagnosis before any reference match (the matching job starts from this)
+    rule_based_response = copy.deepcopy(response)
+    finalize_diagnosis(response, request_id)
+    
+    # ENHANCED: YouTube-based diagnosis (runs on the match worker pool)
+    if vehicle_info:
+        job_id = match_jobs.submit(
+            run_reference_match, request_id, rule_based_response, vehicle_info, y, sr
+        )
+        response['job_id'] = job_id
+        response['status'] = 'pending'
+        response['result_url'] = f"/upload/jobs/{job_id}"
+        logger.debug(f"[{request_id}] YouTube analysis queued as job {job_id}")
+    
+    return response
+
+
+def lookup_cached_response(cache_key):
+    """
+    Cached /upload response for a cache key, or None
+    
+    Entries whose reference-matching job has expired are dropped, so the
+    client never gets a result_url that 404s.
+    """
+    cached = result_cache.get(cache_key)
+    if cached is None:
+        return None
+    
+    if 'job_id' in cached and match_jobs.get(cached['job_id']) is None:
+        result_cache.discard(cache_key)
+        return None
+    
+    cached['cached'] = True
+    return cached
+
+
+def search_reference_library(request_id, user_features, vehicle_info, min_similarity=REFERENCE_MIN_SIMILARITY):
+    """
+    Match the user's clip against the pre-built reference library
+    
+    Searches references for the same make, model and sound location first,
+    then relaxes the model filter if nothing matches.
+    
+    Args:
+        request_id: Upload request id for log correlation
+        user_features: Fingerprint of the user's clip
+        vehicle_info: Vehicle details from the upload form
+        min_similarity: Minimum similarity for the match to be used
+        
+    Returns:
+        Dict with 'similarity', 'video_title' and 'issue_type', or None
+    """
+    library = get_reference_library()
+    library.maybe_reload()
+    if user_features is None or not len(library):
+        return None
+    
+    filters = {
+        'manufacturer': vehicle_info['manufacturer'],
+        'model': vehicle_info['model'],
+        'location': vehicle_info['soundLocation'],
+    }
+    with timed_stage('library_search'):
+        matches = library.search(user_features, k=1, filters=filters)
+        if not matches:
+            filters.pop('model')
+            matches = library.search(user_features, k=1, filters=filters)
+    
+    if not matches:
+        logger.debug(f"[{request_id}] No reference-library candidates for this vehicle")
+        return None
+    
+    video_info, _, similarity = matches[0]
+    logger.debug(f"[{request_id}] Library match: {video_info['title']} (similarity: {similarity*100:.1f}%)")
+    if similarity <= min_similarity:
+        return None
+    
+    return {
+        'similarity': similarity,
+        'video_title': video_info['title'],
+        'issue_type': infer_issue_type(video_info),
+    }
+
+
+def match_landmarks(request_id, y, sr, video_ids, min_confidence=LANDMARK_MIN_CONFIDENCE):
+    """
+    Match the user's clip against indexed references by frame-level landmarks
+    
+    Args:
+        request_id: Upload request id for log correlation
+        y: Decoded user audio
+        sr: Sample rate of y
+        video_ids: Reference videos to consider (those for the user's
+            vehicle, so an unrelated make or model can never match)
+        min_confidence: Minimum landmark confidence for the match to be used
+            (landmark_confidence scale, not cosine similarity)
+        
+    Returns:
+        Best-match dict (as find_best_reference_match), or None
+    """
+    index = get_reference_index()
+    if not video_ids or not len(index.landmarks):
+        return None
+    
+    hashes, frames = analysis_pool.run(extract_landmarks, y, sr, block=True)
+    with timed_stage('landmark_match'):
+        matches = index.match_landmarks(hashes, frames, k=1, video_ids=video_ids)
+    if not matches:
+        return None
+    
+    video_info, match = matches[0]
+    logger.debug(f"[{request_id}] Landmark match: {video_info['title']} "
+                 f"({match['aligned_hits']} aligned hits at {match['offset_seconds']}s)")
+    if match['confidence'] <= min_confidence:
+        return None
+    
+    return {
+        'similarity': match['confidence'],
+        'video_title': video_info['title'],
+        'issue_type': infer_issue_type(video_info),
+        'confidence': match['confidence'],
+    }
+
+
+def run_reference_match(request_id, response, vehicle_info, y, sr):
+    """
+    Enhance a rule-based response with YouTube reference matching
+    (Runs on the match worker pool - result is served by /upload/jobs/<job_id>)
+    
+    Args:
+        request_id: Upload request id for log correlation
+        response: Rule-based response before finalize_diagnosis
+        vehicle_info: Vehicle details from the upload form
+        y: Decoded user audio
+        sr: Sample rate of y
+        
+    Returns:
+        Final response dict
+    """
+    # Background work gets its own structured record (see metrics.RequestTrace)
+    trace = RequestTrace(request_id, 'match_job', 'JOB')
+    trace.set(vehicle_info=vehicle_info, match_source=None)
+    
+    try:
+        with trace.stage('match_featurize'):
+            user_features = analysis_pool.run(extract_signal_features, y, sr, block=True)
+        
+        # Pre-built reference library first: a confident match skips YouTube entirely
+        with trace.stage('library'):
+            library_match = search_reference_library(request_id, user_features, vehicle_info)
+        if library_match is not None:
+            response['predicted_issue'] = library_match['issue_type']
+            response['confidence'] = round(library_match['similarity'], 2)
+            trace.set(match_source='library', similarity=round(library_match['similarity'], 4))
+            finalize_diagnosis(response, request_id)
+            trace.finish('ok')
+            return response
+        
+        # Reference fingerprints (downloaded only on an index miss)
+        with trace.stage('youtube_references'):
+            references = get_vehicle_references(
+                manufacturer=vehicle_info['manufacturer'],
+                year=vehicle_info['year'],
+                model=vehicle_info['model'],
+                location=vehicle_info['soundLocation'],
+                max_videos=3
+            )
+        trace.set(references=len(references))
+        
+        if references:
+            # Time-aligned landmark hits among this vehicle's references first
+            # (already past their own cutoff); mean-vector similarity as the fallback
+            with trace.stage('match'):
+                best_match = match_landmarks(
+                    request_id, y, sr, [video_info['id'] for video_info, _ in references]
+                )
+                confident = best_match is not None
+                if best_match is None:
+                    best_match = find_best_reference_match(
+                        user_features, references, scaling=get_reference_index().feature_scaling()
+                    )
+                    confident = best_match['similarity'] > REFERENCE_MIN_SIMILARITY
+            trace.set(similarity=round(best_match['similarity'], 4))
+            
+            # Use YouTube match to enhance diagnosis (if confidence high)
+            if confident:
+                response['predicted_issue'] = best_match['issue_type']
+                response['confidence'] = round(best_match['similarity'], 2)
+                trace.set(match_source='youtube')
+        else:
+            logger.warning(f"[{request_id}] No YouTube results found, using rule-based")
+    
+    except Exception as e:
+        logger.error(f"[{request_id}] YouTube analysis failed: {str(e)}")
+        trace.set(error=str(e))
+        # Continue with rule-based diagnostics
+    
+    finalize_diagnosis(response, request_id)
+    trace.finish('error' if 'error' in trace.fields else 'ok')
     return response
 
 # ============================================================
@@ -109,8 +473,7 @@ def log_response_info(response):
 
 @app.route('/', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    logger.info("Health check endpoint accessed")
+    """Health check endpoint (probes are logged only via the sampled request record)"""
     return jsonify({
         'status': 'running',
         'service': 'AutoDecX Audio Analysis API',
@@ -118,28 +481,41 @@ def health_check():
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text-format metrics (stage latency histograms, queue depths, cache hit rates)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Result cache hit/miss counters"""
+    return jsonify(result_cache.stats())
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 200 only once warm-up has finished (use for autoscaling health checks)"""
+    ready, details = warmup_state.readiness(analysis_pool)
+    details['status'] = 'ready' if ready else 'warming_up'
+    
+    if not ready:
+        return jsonify(details), 503
+    
+    return jsonify(details)
+
 @app.route('/upload', methods=['POST', 'OPTIONS'])
 def upload_audio():
     """Main audio upload and analysis endpoint"""
     
     if request.method == 'OPTIONS':
-        logger.info("CORS preflight request handled")
         return '', 204
     
-    request_id = str(uuid.uuid4())[:8]
-    logger.info("="*60)
-    logger.info(f"[{request_id}] NEW AUDIO UPLOAD REQUEST")
-    logger.info("="*60)
-    
-    print("\n" + "="*60)
-    print("🎵 AUDIO UPLOAD RECEIVED")
-    print("="*60)
+    # Stage timings and outcome go into one structured record (see metrics.py)
+    trace = g.trace
+    request_id = trace.request_id
     
     try:
         if 'audio' not in request.files:
-            logger.error(f"[{request_id}] No audio field in request.files")
-            logger.error(f"[{request_id}] Available fields: {list(request.files.keys())}")
-            print("❌ No 'audio' field found")
+            logger.error(f"[{request_id}] No audio field in request.files (fields: {list(request.files.keys())})")
             return jsonify({'error': 'No audio file provided'}), 400
         
         file = request.files['audio']
@@ -152,427 +528,280 @@ def upload_audio():
         vehicle_info = None
         if 'vehicle_info' in request.form:
             vehicle_info = json.loads(request.form['vehicle_info'])
-            logger.info(f"[{request_id}] Vehicle info received: {vehicle_info}")
-        
-        logger.info(f"[{request_id}] File received: {file.filename}")
-        logger.info(f"[{request_id}] Content type: {file.content_type}")
-        
-        unique_id = str(uuid.uuid4())[:8]
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        original_path = UPLOAD_FOLDER / f"original_{timestamp}_{unique_id}.webm"
-        converted_path = UPLOAD_FOLDER / f"converted_{timestamp}_{unique_id}.wav"
-        
-        logger.info(f"[{request_id}] Saving to: {original_path}")
-        print(f"📁 Saving to: {original_path}")
-        
-        file.save(original_path)
-        file_size = original_path.stat().st_size
-        
-        logger.info(f"[{request_id}] File saved successfully: {file_size:,} bytes")
-        print(f"📊 File size: {file_size:,} bytes")
-        
-        ffmpeg_command = [
-            "ffmpeg", "-y",
-            "-i", str(original_path),
-            "-ac", "1",
-            "-ar", "44100",
-            "-acodec", "pcm_s16le",
-            str(converted_path)
-        ]
-        
-        logger.info(f"[{request_id}] Starting FFmpeg conversion...")
-        print("🔄 Running FFmpeg conversion...")
-        
-        conversion_start = datetime.now()
-        result = subprocess.run(
-            ffmpeg_command,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=30
+            trace.set(vehicle_info=vehicle_info)
+        
+        # Analysis profile (controls optional stages such as beat tracking)
+        profile_name = request.form.get('analysis_profile', DEFAULT_ANALYSIS_PROFILE)
+        if profile_name not in ANALYSIS_PROFILES:
+            logger.error(f"[{request_id}] Unknown analysis profile: {profile_name}")
+            return jsonify({'error': f"Unknown analysis profile '{profile_name}'"}), 400
+        
+        with trace.stage('read'):
+            audio_bytes = file.read()
+        file_size = len(audio_bytes)
+        
+        # Large uploads (or analysis_mode=streaming) are analysed block by
+        # block so memory stays bounded regardless of recording length
+        use_streaming = (
+            request.form.get('analysis_mode') == 'streaming'
+            or file_size > STREAMING_THRESHOLD_BYTES
         )
-        conversion_time = (datetime.now() - conversion_start).total_seconds()
-        
-        logger.info(f"[{request_id}] FFmpeg conversion complete in {conversion_time:.2f}s")
-        print("✅ Conversion complete")
-        
-        logger.info(f"[{request_id}] Starting audio analysis with librosa...")
-        print("🔬 Analyzing audio with librosa...")
-        
-        analysis_start = datetime.now()
-        y, sr = librosa.load(str(converted_path), sr=None)
-        duration = librosa.get_duration(y=y, sr=sr)
-        
-        logger.info(f"[{request_id}] Audio loaded: duration={duration:.2f}s, sr={sr}Hz, samples={len(y)}")
-        
-        rms = float(np.mean(librosa.feature.rms(y=y)))
-        zcr = float(np.mean(librosa.feature.zero_crossing_rate(y)))
-        
-        logger.info(f"[{request_id}] Basic features extracted: RMS={rms:.4f}, ZCR={zcr:.4f}")
-        
-        try:
-            tempo_result, _ = librosa.beat.beat_track(y=y, sr=sr)
-            if isinstance(tempo_result, np.ndarray):
-                tempo = float(tempo_result.item()) if tempo_result.size > 0 else 0.0
-            else:
-                tempo = float(tempo_result) if tempo_result else 0.0
-            logger.info(f"[{request_id}] Tempo detected: {tempo:.1f} BPM")
-        except Exception as e:
-            logger.warning(f"[{request_id}] Tempo detection failed: {e}")
-            print(f"⚠️ Tempo detection failed: {e}")
-            tempo = 0.0
-        
-        spectral_centroid = float(np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)))
-        spectral_rolloff = float(np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr)))
-        spectral_bandwidth = float(np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr)))
-        
-        logger.info(f"[{request_id}] Spectral features: centroid={spectral_centroid:.1f}Hz, rolloff={spectral_rolloff:.1f}Hz, bandwidth={spectral_bandwidth:.1f}Hz")
-        
-        analysis_time = (datetime.now() - analysis_start).total_seconds()
-        logger.info(f"[{request_id}] Analysis complete in {analysis_time:.2f}s")
-        
-        print(f"⏱️  Duration: {duration:.2f}s")
-        print(f"🎯 RMS: {rms:.4f}")
-        print(f"〰️  ZCR: {zcr:.4f}")
-        print(f"🎵 Tempo: {tempo:.1f} BPM")
-        print(f"📊 Spectral Centroid: {spectral_centroid:.1f} Hz")
-        print(f"📈 Spectral Rolloff: {spectral_rolloff:.1f} Hz")
-        print(f"📏 Spectral Bandwidth: {spectral_bandwidth:.1f} Hz")
+        trace.set(file_size=file_size, profile=profile_name, streaming=use_streaming)
+        
+        # Re-submitted recordings (retries, page refreshes) are served from the result cache
+        with trace.stage('cache_lookup'):
+            cache_key = result_cache_key(audio_bytes, vehicle_info, profile_name, use_streaming, rule_engine.version)
+            cached_response = lookup_cached_response(cache_key)
+        trace.set(cache_hit=cached_response is not None)
+        if cached_response is not None:
+            return jsonify(cached_response)
+        
+        # Decode and featurize on the analysis pool; this thread only waits
+        pool_start = time.perf_counter()
+        result = analysis_pool.run(analyze_audio_bytes, audio_bytes, profile_name, use_streaming)
+        pool_time = time.perf_counter() - pool_start
+        
+        # Worker-side stages, plus time spent queued and shipping data to the worker
+        for stage, seconds in result['stages'].items():
+            trace.add_stage(stage, seconds)
+        trace.add_stage('pool_overhead', max(0.0, pool_time - sum(result['stages'].values())))
+        
+        clip_features = result['features']
+        rhythm = result['rhythm']
+        duration = result['duration']
+        sr = result['sr']
+        y = result['head']
         
         # Build initial response
-        response = {
-            'success': True,
-            'metrics': {
-                'duration': round(duration, 2),
-                'sample_rate': int(sr),
-                'rms': round(rms, 4),
-                'zero_crossing_rate': round(zcr, 4),
-                'tempo': round(tempo, 1),
-                'dominant_frequency': round(spectral_centroid, 2),
-                'spectral_rolloff': round(spectral_rolloff, 2),
-                'spectral_bandwidth': round(spectral_bandwidth, 2),
-                'vibration_level': round(rms, 4)
-            },
-            'issues': [],
-            'predicted_issue': 'No significant issues detected',
-            'confidence': 0.85
-        }
-        
-        # ENHANCED: YouTube-based diagnosis (SILENT - runs in background)
-        if vehicle_info:
-            try:
-                logger.info(f"[{request_id}] Starting YouTube analysis (background)...")
-                print("🎥 Searching YouTube for similar issues (background)...")
-                
-                # Search and download (background)
-                youtube_results = search_vehicle_issue_videos(
-                    manufacturer=vehicle_info['manufacturer'],
-                    year=vehicle_info['year'],
-                    model=vehicle_info['model'],
-                    location=vehicle_info['soundLocation'],
-                    max_videos=3
-                )
-                
-                if youtube_results:
-                    logger.info(f"[{request_id}] Found {len(youtube_results)} YouTube matches")
-                    print(f"✅ Found {len(youtube_results)} reference videos")
-                    
-                    # Compare audio (background)
-                    best_match = find_best_audio_match(str(converted_path), youtube_results)
-                    
-                    logger.info(f"[{request_id}] Best match similarity: {best_match['similarity']*100:.1f}%")
-                    
-                    # Use YouTube match to enhance diagnosis (if confidence high)
-                    if best_match['similarity'] > 0.70:
-                        response['predicted_issue'] = best_match['issue_type']
-                        response['confidence'] = round(best_match['similarity'], 2)
-                        logger.info(f"[{request_id}] Using YouTube-matched diagnosis")
-                        print(f"✅ High confidence match found ({best_match['similarity']*100:.0f}%)")
-                    
-                    # Cleanup downloaded videos (background)
-                    downloader = YouTubeAudioDownloader()
-                    downloader.cleanup_temp_files()
-                else:
-                    logger.warning(f"[{request_id}] No YouTube results found, using rule-based")
-                    print("⚠️  No YouTube matches, using rule-based analysis")
-            
-            except Exception as e:
-                logger.error(f"[{request_id}] YouTube analysis failed: {str(e)}")
-                print(f"⚠️  YouTube analysis failed, using rule-based fallback")
-                # Continue with rule-based diagnostics
-        
-        # Existing rule-based diagnostics (as fallback)
-        logger.info(f"[{request_id}] Running rule-based diagnostics...")
-        print("\n🔍 Running diagnostic analysis...")
-        
-        issue_count = 0
-        
-        if rms > 0.20:
-            response['issues'].append({
-                'type': 'critical_vibration',
-                'severity': 'error',
-                'message': 'Critical vibration levels detected - immediate inspection recommended'
-            })
-            logger.warning(f"[{request_id}] CRITICAL: Very high vibration (RMS={rms:.4f})")
-            print("❌ CRITICAL: Very high vibration")
-            issue_count += 1
-        elif rms > 0.15:
-            response['issues'].append({
-                'type': 'high_vibration',
-                'severity': 'warning',
-                'message': 'Elevated vibration levels - check engine mounts or bearings'
-            })
-            logger.warning(f"[{request_id}] WARNING: High vibration (RMS={rms:.4f})")
-            print("⚠️  WARNING: High vibration")
-            issue_count += 1
-        elif rms < 0.01:
-            response['issues'].append({
-                'type': 'low_signal',
-                'severity': 'info',
-                'message': 'Very low signal - move microphone closer to sound source'
-            })
-            logger.info(f"[{request_id}] INFO: Low signal (RMS={rms:.4f})")
-            print("ℹ️  INFO: Low signal strength")
-            issue_count += 1
-        else:
-            logger.info(f"[{request_id}] Vibration level: Normal (RMS={rms:.4f})")
-            print("✅ Vibration level: Normal")
-        
-        if spectral_centroid > 6000:
-            response['issues'].append({
-                'type': 'critical_high_frequency',
-                'severity': 'error',
-                'message': 'Critical high-frequency noise - likely bearing failure or severe wear'
-            })
-            logger.warning(f"[{request_id}] CRITICAL: Extremely high frequency ({spectral_centroid:.1f}Hz)")
-            print("❌ CRITICAL: Extremely high frequency")
-            issue_count += 1
-        elif spectral_centroid > 5000:
-            response['issues'].append({
-                'type': 'very_high_frequency',
-                'severity': 'warning',
-                'message': 'Very high-frequency noise - possible bearing wear or air leak'
-            })
-            logger.warning(f"[{request_id}] WARNING: Very high frequency ({spectral_centroid:.1f}Hz)")
-            print("⚠️  WARNING: Very high frequency")
-            issue_count += 1
-        elif spectral_centroid > 3000:
-            response['issues'].append({
-                'type': 'high_frequency_noise',
-                'severity': 'info',
-                'message': 'High-frequency noise - possible belt squeal or pulley issue'
-            })
-            logger.info(f"[{request_id}] INFO: High frequency ({spectral_centroid:.1f}Hz)")
-            print("ℹ️  INFO: High frequency detected")
-            issue_count += 1
-        elif spectral_centroid < 500:
-            response['issues'].append({
-                'type': 'low_frequency_rumble',
-                'severity': 'info',
-                'message': 'Low-frequency rumble - possible exhaust or suspension issue'
-            })
-            logger.info(f"[{request_id}] INFO: Low frequency rumble ({spectral_centroid:.1f}Hz)")
-            print("ℹ️  INFO: Low frequency rumble")
-            issue_count += 1
-        elif spectral_centroid < 300:
-            response['issues'].append({
-                'type': 'very_low_frequency',
-                'severity': 'warning',
-                'message': 'Very low-frequency noise - possible structural or mounting issue'
-            })
-            logger.warning(f"[{request_id}] WARNING: Very low frequency ({spectral_centroid:.1f}Hz)")
-            print("⚠️  WARNING: Very low frequency")
-            issue_count += 1
-        else:
-            logger.info(f"[{request_id}] Frequency range: Normal ({spectral_centroid:.1f}Hz)")
-            print("✅ Frequency range: Normal")
-        
-        if zcr > 0.30:
-            response['issues'].append({
-                'type': 'critical_irregular',
-                'severity': 'error',
-                'message': 'Critical irregular pattern - possible severe misfire or mechanical failure'
-            })
-            logger.warning(f"[{request_id}] CRITICAL: Highly irregular pattern (ZCR={zcr:.4f})")
-            print("❌ CRITICAL: Highly irregular pattern")
-            issue_count += 1
-        elif zcr > 0.25:
-            response['issues'].append({
-                'type': 'highly_irregular',
-                'severity': 'warning',
-                'message': 'Highly irregular pattern - possible misfire or timing issue'
-            })
-            logger.warning(f"[{request_id}] WARNING: Irregular pattern (ZCR={zcr:.4f})")
-            print("⚠️  WARNING: Irregular pattern")
-            issue_count += 1
-        elif zcr > 0.20:
-            response['issues'].append({
-                'type': 'irregular_pattern',
-                'severity': 'info',
-                'message': 'Irregular acoustic pattern - monitor for changes'
-            })
-            logger.info(f"[{request_id}] INFO: Slight irregularity (ZCR={zcr:.4f})")
-            print("ℹ️  INFO: Slight irregularity")
-            issue_count += 1
-        elif zcr < 0.05:
-            response['issues'].append({
-                'type': 'very_smooth_pattern',
-                'severity': 'info',
-                'message': 'Very smooth pattern - consider if this is expected for the test'
-            })
-            logger.info(f"[{request_id}] INFO: Very smooth pattern (ZCR={zcr:.4f})")
-            print("ℹ️  INFO: Very smooth pattern")
-            issue_count += 1
-        else:
-            logger.info(f"[{request_id}] Pattern regularity: Normal (ZCR={zcr:.4f})")
-            print("✅ Pattern regularity: Normal")
-        
-        if spectral_bandwidth > 3000:
-            response['issues'].append({
-                'type': 'wide_frequency_spread',
-                'severity': 'warning',
-                'message': 'Wide frequency spread - possible multiple simultaneous issues'
-            })
-            logger.warning(f"[{request_id}] WARNING: Wide frequency spread ({spectral_bandwidth:.1f}Hz)")
-            print("⚠️  WARNING: Wide frequency spread")
-            issue_count += 1
-        elif spectral_bandwidth < 500:
-            response['issues'].append({
-                'type': 'narrow_frequency',
-                'severity': 'info',
-                'message': 'Narrow frequency band - single dominant sound source'
-            })
-            logger.info(f"[{request_id}] INFO: Narrow frequency band ({spectral_bandwidth:.1f}Hz)")
-            print("ℹ️  INFO: Narrow frequency band")
-            issue_count += 1
-        else:
-            logger.info(f"[{request_id}] Frequency spread: Normal ({spectral_bandwidth:.1f}Hz)")
-            print("✅ Frequency spread: Normal")
-        
-        if rms > 0.15 and spectral_centroid > 4000:
-            response['issues'].append({
-                'type': 'vibration_and_high_freq',
-                'severity': 'error',
-                'message': 'High vibration with high-frequency noise - critical bearing or pulley wear'
-            })
-            logger.warning(f"[{request_id}] CRITICAL: Combined vibration and frequency issue")
-            print("❌ CRITICAL: Combined vibration and frequency issue")
-            issue_count += 1
+        response = new_analysis_response(duration, sr, clip_features, rhythm)
         
-        if rms > 0.15 and zcr > 0.20:
-            response['issues'].append({
-                'type': 'vibration_and_irregular',
-                'severity': 'warning',
-                'message': 'High vibration with irregular pattern - possible engine mount or timing issue'
-            })
-            logger.warning(f"[{request_id}] WARNING: Combined vibration and irregularity")
-            print("⚠️  WARNING: Combined vibration and irregularity")
-            issue_count += 1
+        if use_streaming:
+            response['timeline'] = result['timeline']
         
-        if spectral_centroid < 800 and rms > 0.10:
-            response['issues'].append({
-                'type': 'low_freq_high_energy',
-                'severity': 'warning',
-                'message': 'Low-frequency high-energy noise - possible exhaust or structural issue'
-            })
-            logger.warning(f"[{request_id}] WARNING: Low-frequency high-energy")
-            print("⚠️  WARNING: Low-frequency high-energy")
-            issue_count += 1
+        # Rule-based diagnostics, then queue YouTube matching
+        with trace.stage('diagnosis'):
+            complete_diagnosis(response, clip_features, duration, request_id, vehicle_info, y, sr)
         
-        if duration < 3:
-            response['issues'].append({
-                'type': 'short_recording',
-                'severity': 'info',
-                'message': 'Recording too short for reliable analysis - recommend 5-10 seconds'
-            })
-            logger.info(f"[{request_id}] INFO: Short recording ({duration:.2f}s)")
-            print("ℹ️  INFO: Short recording duration")
-            issue_count += 1
-        elif duration > 15:
-            response['issues'].append({
-                'type': 'long_recording',
-                'severity': 'info',
-                'message': 'Long recording detected - using average values'
-            })
-            logger.info(f"[{request_id}] INFO: Long recording ({duration:.2f}s)")
-            print("ℹ️  INFO: Long recording")
-            issue_count += 1
+        result_cache.put(cache_key, response)
         
-        # Only update if YouTube didn't already provide better diagnosis
-        if len(response['issues']) > 0 and response['confidence'] < 0.90:
-            severity_order = {'error': 0, 'warning': 1, 'info': 2}
-            sorted_issues = sorted(response['issues'], key=lambda x: severity_order[x['severity']])
-            
-            # Only override if YouTube diagnosis wasn't confident
-            if response['predicted_issue'] == 'No significant issues detected':
-                response['predicted_issue'] = sorted_issues[0]['message']
-            
-            critical_count = sum(1 for i in response['issues'] if i['severity'] == 'error')
-            warning_count = sum(1 for i in response['issues'] if i['severity'] == 'warning')
-            
-            if critical_count > 0:
-                if response['confidence'] < 0.95:
-                    response['confidence'] = 0.95
-                logger.warning(f"[{request_id}] Overall assessment: CRITICAL ({critical_count} critical issues)")
-                print("\n❌ Overall assessment: CRITICAL")
-            elif warning_count > 2:
-                if response['confidence'] < 0.85:
-                    response['confidence'] = 0.85
-                logger.warning(f"[{request_id}] Overall assessment: WARNING ({warning_count} warnings)")
-                print("\n⚠️  Overall assessment: WARNING (Multiple issues)")
-            elif warning_count > 0:
-                if response['confidence'] < 0.80:
-                    response['confidence'] = 0.80
-                logger.warning(f"[{request_id}] Overall assessment: WARNING")
-                print("\n⚠️  Overall assessment: WARNING")
-            else:
-                if response['confidence'] < 0.75:
-                    response['confidence'] = 0.75
-                logger.info(f"[{request_id}] Overall assessment: INFORMATIONAL")
-                print("\nℹ️  Overall assessment: INFORMATIONAL")
-        elif len(response['issues']) == 0:
-            logger.info(f"[{request_id}] Overall assessment: NORMAL")
-            print("\n✅ Overall assessment: NORMAL")
-        
-        # Cleanup user's audio files
-        os.remove(original_path)
-        os.remove(converted_path)
-        logger.info(f"[{request_id}] User audio files cleaned up")
-        print("🧹 Temporary files cleaned up")
-        
-        total_time = conversion_time + analysis_time
-        
-        print("="*60)
-        print("✅ ANALYSIS COMPLETE")
-        print(f"📋 Primary Issue: {response['predicted_issue']}")
-        print(f"🎯 Confidence: {response['confidence']*100:.0f}%")
-        print(f"🔍 Total Issues Found: {len(response['issues'])}")
-        print(f"⏱️  Processing Time: {total_time:.2f}s")
-        print("="*60 + "\n")
-        
-        logger.info("="*60)
-        logger.info(f"[{request_id}] ANALYSIS COMPLETE")
-        logger.info(f"[{request_id}] Primary Issue: {response['predicted_issue']}")
-        logger.info(f"[{request_id}] Confidence: {response['confidence']*100:.0f}%")
-        logger.info(f"[{request_id}] Total Issues: {len(response['issues'])}")
-        logger.info(f"[{request_id}] Processing Time: {total_time:.2f}s (conversion: {conversion_time:.2f}s, analysis: {analysis_time:.2f}s)")
-        logger.info("="*60)
+        trace.set(
+            duration=round(duration, 2),
+            predicted_issue=response['predicted_issue'],
+            confidence=response['confidence'],
+            issues=[issue['type'] for issue in response['issues']],
+            job_id=response.get('job_id'),
+        )
         
         return jsonify(response)
     
+    except PoolSaturated:
+        trace.set(error='pool_saturated')
+        return busy_response()
+    
+    except AnalysisTimeout as e:
+        logger.error(f"[{request_id}] {str(e)}")
+        trace.set(error='analysis_timeout')
+        return jsonify({'error': 'Audio analysis timed out'}), 504
+    
     except subprocess.TimeoutExpired:
         logger.error(f"[{request_id}] FFmpeg conversion timeout")
-        print("❌ FFmpeg timeout")
+        trace.set(error='ffmpeg_timeout')
         return jsonify({'error': 'Audio conversion timeout'}), 500
     
+    except subprocess.CalledProcessError as e:
+        logger.error(f"[{request_id}] FFmpeg decode failed: {e.stderr.decode(errors='replace').strip()}")
+        trace.set(error='decode_failed')
+        return jsonify({'error': 'Could not decode audio file'}), 400
+    
     except Exception as e:
         logger.error(f"[{request_id}] Upload processing error: {str(e)}")
         logger.error(f"[{request_id}] Traceback:\n{traceback.format_exc()}")
-        print(f"❌ Error: {str(e)}")
-        traceback.print_exc()
+        trace.set(error=str(e))
         return jsonify({'error': str(e)}), 500
 
+@app.route('/upload/jobs/<job_id>', methods=['GET'])
+def get_upload_job(job_id):
+    """Poll a queued YouTube matching job for the final diagnosis"""
+    job = match_jobs.get(job_id)
+    
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    
+    return jsonify(job)
+
+@app.route('/live', methods=['POST', 'OPTIONS'])
+def start_live_session():
+    """Start a live diagnosis session for a recording in progress"""
+    
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    body = request.get_json(silent=True) or {}
+    vehicle_info = body.get('vehicle_info')
+    
+    session = live_sessions.create(vehicle_info=vehicle_info)
+    if session is None:
+        g.trace.set(error='live_session_limit')
+        return jsonify({'error': 'Too many live sessions, try again shortly'}), 503
+    
+    g.trace.set(stream_id=session.session_id, vehicle_info=vehicle_info)
+    
+    return jsonify({
+        'stream_id': session.session_id,
+        'chunk_url': f"/live/{session.session_id}/chunk",
+        'finish_url': f"/live/{session.session_id}/finish"
+    })
+
+@app.route('/live/<stream_id>/chunk', methods=['POST', 'OPTIONS'])
+def live_chunk(stream_id):
+    """
+    Append one encoded chunk (raw request body) to a live session
+    
+    Returns provisional metrics and issues over the audio decoded so far.
+    """
+    
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    session = live_sessions.get(stream_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired live session'}), 404
+    
+    chunk = request.get_data(cache=False)
+    try:
+        session.feed(chunk)
+    except (BrokenPipeError, ValueError):
+        live_sessions.remove(stream_id)
+        session.abort()
+        logger.error(f"[{stream_id[:8]}] Live decoder exited, dropping session")
+        g.trace.set(stream_id=stream_id, error='decode_failed')
+        return jsonify({'error': 'Could not decode audio stream'}), 400
+    
+    snapshot = session.snapshot()
+    issues = []
+    if snapshot['duration'] > 0:
+        issues = run_diagnostic_rules(
+            snapshot['rms'], snapshot['spectral_centroid'], snapshot['zero_crossing_rate'],
+            snapshot['spectral_bandwidth'], snapshot['duration'], stream_id[:8]
+        )
+    
+    return jsonify({
+        'stream_id': stream_id,
+        'provisional': True,
+        'bytes_received': session.bytes_received,
+        'metrics': {
+            'duration': round(snapshot['duration'], 2),
+            'rms': round(snapshot['rms'], 4),
+            'zero_crossing_rate': round(snapshot['zero_crossing_rate'], 4),
+            'dominant_frequency': round(snapshot['spectral_centroid'], 2),
+            'spectral_rolloff': round(snapshot['spectral_rolloff'], 2),
+            'spectral_bandwidth': round(snapshot['spectral_bandwidth'], 2),
+            'vibration_level': round(snapshot['rms'], 4)
+        },
+        'issues': issues
+    })
+
+@app.route('/live/<stream_id>/finish', methods=['POST', 'OPTIONS'])
+def finish_live_session(stream_id):
+    """Close a live session and return the final diagnosis (same shape as /upload)"""
+    
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    session = live_sessions.remove(stream_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired live session'}), 404
+    
+    trace = g.trace
+    request_id = stream_id[:8]
+    trace.set(stream_id=stream_id, bytes_received=session.bytes_received)
+    
+    try:
+        features = session.finish()
+        duration = features['duration']
+        rhythm = {
+            key: features[key]
+            for key in ('periodicity_hz', 'periodicity_rpm', 'periodicity_strength')
+        }
+        
+        response = new_analysis_response(duration, ANALYSIS_SR, features, rhythm)
+        response['timeline'] = features['timeline']
+        complete_diagnosis(
+            response, features, duration, request_id,
+            session.vehicle_info, features['head'], ANALYSIS_SR
+        )
+        
+        trace.set(
+            duration=round(duration, 2),
+            predicted_issue=response['predicted_issue'],
+            confidence=response['confidence'],
+            issues=[issue['type'] for issue in response['issues']],
+            job_id=response.get('job_id'),
+        )
+        
+        return jsonify(response)
+    
+    except subprocess.TimeoutExpired:
+        logger.error(f"[{request_id}] Live decoder did not finish in time")
+        trace.set(error='ffmpeg_timeout')
+        return jsonify({'error': 'Audio conversion timeout'}), 500
+    
+    except subprocess.CalledProcessError as e:
+        logger.error(f"[{request_id}] Live decode failed: {e.stderr.decode(errors='replace').strip()}")
+        trace.set(error='decode_failed')
+        return jsonify({'error': 'Could not decode audio stream'}), 400
+
+@app.route('/batch', methods=['POST', 'OPTIONS'])
+def start_batch():
+    """
+    Queue a batch analysis of recordings under BATCH_ROOT
+    
+    JSON body: source (directory or manifest, relative to BATCH_ROOT),
+    optional format ('jsonl' or 'parquet') and analysis_profile
+    """
+    
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    body = request.get_json(silent=True) or {}
+    output_format = body.get('format', 'jsonl')
+    profile_name = body.get('analysis_profile', DEFAULT_ANALYSIS_PROFILE)
+    
+    if output_format not in ('jsonl', 'parquet'):
+        return jsonify({'error': f"Unknown output format '{output_format}'"}), 400
+    if profile_name not in ANALYSIS_PROFILES:
+        return jsonify({'error': f"Unknown analysis profile '{profile_name}'"}), 400
+    
+    try:
+        source = resolve_batch_source(body.get('source', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    output = BATCH_OUTPUT_DIR / f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{output_format}"
+    job_id = batch_jobs.submit_with_progress(
+        run_batch, str(source), str(output), output_format, profile_name,
+        max_workers=BATCH_POOL_WORKERS, pool=analysis_pool, root=BATCH_ROOT
+    )
+    
+    logger.info(f"Batch job {job_id} queued for {source} -> {output}")
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'pending',
+        'result_url': f"/batch/jobs/{job_id}",
+        'output': str(output)
+    }), 202
+
+@app.route('/batch/jobs/<job_id>', methods=['GET'])
+def get_batch_job(job_id):
+    """Poll a batch job for progress and its summary"""
+    job = batch_jobs.get(job_id)
+    
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    
+    return jsonify(job)
+
 # ============================================================
 # ERROR HANDLERS
 # ============================================================
@@ -600,10 +829,15 @@ if __name__ == '__main__':
     logger.info("📡 Server: http://127.0.0.1:5000")
     logger.info("🔧 Endpoints:")
     logger.info("   GET  /       → Health check")
+    logger.info("   GET  /ready  → Readiness (warm-up finished)")
     logger.info("   POST /upload → Audio analysis")
+    logger.info("   GET  /upload/jobs/<job_id> → YouTube match result")
+    logger.info("   POST /live   → Live diagnosis (then /live/<id>/chunk, /live/<id>/finish)")
+    logger.info("   POST /batch  → Batch analysis of a recording archive")
+    logger.info("   GET  /cache/stats → Result cache hit/miss counters")
+    logger.info("   GET  /metrics → Prometheus metrics (stage latencies, queue depth)")
     logger.info("   GET  /api/vehicle-models → Vehicle model lookup")
-    logger.info("📁 Upload folder: " + str(UPLOAD_FOLDER.absolute()))
-    logger.info("📄 Log folder: " + str(log_dir.absolute()))
+    logger.info("📄 Log folder: " + str(LOG_DIR.absolute()))
     logger.info("="*60)
     
     print("\n" + "="*60)
@@ -612,7 +846,13 @@ if __name__ == '__main__':
     print("📡 Running on http://127.0.0.1:5000")
     print("🔧 Endpoints:")
     print("   GET  /       → Health check")
+    print("   GET  /ready  → Readiness (warm-up finished)")
     print("   POST /upload → Audio analysis")
+    print("   GET  /upload/jobs/<job_id> → YouTube match result")
+    print("   POST /live   → Live diagnosis (then /live/<id>/chunk, /live/<id>/finish)")
+    print("   POST /batch  → Batch analysis of a recording archive")
+    print("   GET  /cache/stats → Result cache hit/miss counters")
+    print("   GET  /metrics → Prometheus metrics (stage latencies, queue depth)")
     print("   GET  /api/vehicle-models → Vehicle model lookup")
     print("="*60 + "\n")
     
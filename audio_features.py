@@ -0,0 +1,272 @@
+# audio_features.py
+import os
+# librosa (~1s with numba and scipy) is imported inside the functions that use it,
+# so catalog-only processes and CLIs never load it
+import numpy as np
+import subprocess
+import logging
+
+logger = logging.getLogger(__name__)
+
+# STFT parameters (librosa defaults, so metrics match the old per-feature calls)
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Number of MFCC coefficients used in the matcher fingerprint
+N_MFCC = 20
+
+# Analysis profiles: which optional (expensive) stages run on /upload.
+# None of the diagnostic rules use musical tempo, so beat tracking is opt-in.
+ANALYSIS_PROFILES = {
+    'fast': {'beat_tracking': False},
+    'full': {'beat_tracking': True},
+}
+DEFAULT_ANALYSIS_PROFILE = os.environ.get('ANALYSIS_PROFILE', 'fast')
+
+# Repetition rates searched by the periodicity estimator (Hz); the onset
+# envelope runs at sr / HOP_LENGTH frames/s, which caps the upper bound
+PERIODICITY_MIN_HZ = 0.5
+PERIODICITY_MAX_HZ = 15.0
+PERIODICITY_PEAK_RATIO = 0.7
+# Weaker autocorrelation peaks are reported as "no periodic pattern"
+PERIODICITY_MIN_STRENGTH = 0.2
+
+# Uploads are decoded straight to the rate reference fingerprints use
+ANALYSIS_SR = 22050
+FFMPEG_TIMEOUT = 30
+
+
+def ffmpeg_decode_command(sr=ANALYSIS_SR, low_latency=False):
+    """
+    ffmpeg command reading an encoded file on stdin and writing mono
+    float32 PCM at sr to stdout
+
+    Args:
+        sr: Output sample rate
+        low_latency: Minimise input probing/buffering (for live streams)
+    """
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
+    if low_latency:
+        command += ["-probesize", "32768", "-analyzeduration", "0", "-fflags", "nobuffer"]
+    return command + [
+        "-i", "pipe:0",
+        "-ac", "1",
+        "-ar", str(sr),
+        "-acodec", "pcm_f32le",
+        "-f", "f32le",
+        "pipe:1"
+    ]
+
+
+def decode_audio_bytes(data, sr=ANALYSIS_SR, timeout=FFMPEG_TIMEOUT):
+    """
+    Decode an uploaded audio file in memory by piping it through ffmpeg
+
+    The encoded bytes go to ffmpeg's stdin and mono float32 PCM at the
+    analysis rate is read back from stdout, so nothing touches the disk.
+    The input must be a streamable container (webm/ogg/wav/mp3).
+
+    Args:
+        data: Encoded audio file contents
+        sr: Output sample rate
+        timeout: ffmpeg timeout in seconds
+
+    Returns:
+        Tuple (y, sr) with y as a float32 numpy array
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg could not decode the input
+        subprocess.TimeoutExpired: ffmpeg did not finish within timeout
+    """
+    ffmpeg_command = ffmpeg_decode_command(sr)
+
+    result = subprocess.run(
+        ffmpeg_command,
+        input=data,
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=timeout
+    )
+
+    return np.frombuffer(result.stdout, dtype=np.float32), sr
+
+
+def magnitude_spectrogram(y, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Compute the magnitude spectrogram of a signal once so every
+    spectral metric can be derived from it
+
+    Args:
+        y: Mono audio signal
+        n_fft: FFT window size
+        hop_length: Hop between frames in samples
+
+    Returns:
+        Magnitude spectrogram of shape (1 + n_fft // 2, n_frames)
+    """
+    import librosa
+    return np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+
+
+def extract_clip_features(y, sr, n_mfcc=0, S=None):
+    """
+    Extract all analysis metrics for a clip from a single STFT
+
+    Args:
+        y: Mono audio signal
+        sr: Sample rate of y
+        n_mfcc: Number of MFCC coefficients to compute (0 to skip MFCCs)
+        S: Optional precomputed magnitude spectrogram of y
+
+    Returns:
+        Dict of mean feature values (plus 'mfcc_mean' when n_mfcc > 0)
+    """
+    import librosa
+    if S is None:
+        S = magnitude_spectrogram(y)
+
+    # RMS and ZCR are time-domain frame statistics and need no FFT; RMS is
+    # kept on the raw signal so the diagnostic thresholds keep their scale
+    features = {
+        'rms': float(np.mean(librosa.feature.rms(
+            y=y, frame_length=N_FFT, hop_length=HOP_LENGTH
+        ))),
+        'zero_crossing_rate': float(np.mean(librosa.feature.zero_crossing_rate(
+            y, frame_length=N_FFT, hop_length=HOP_LENGTH
+        ))),
+        'spectral_centroid': float(np.mean(librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=N_FFT))),
+        'spectral_rolloff': float(np.mean(librosa.feature.spectral_rolloff(S=S, sr=sr, n_fft=N_FFT))),
+        'spectral_bandwidth': float(np.mean(librosa.feature.spectral_bandwidth(S=S, sr=sr, n_fft=N_FFT))),
+    }
+
+    if n_mfcc:
+        mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr, n_fft=N_FFT)
+        mfccs = librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=n_mfcc)
+        features['mfcc_mean'] = np.mean(mfccs, axis=1)
+
+    return features
+
+
+def features_to_vector(features):
+    """
+    Flatten a feature dict into the matcher fingerprint vector
+    (MFCC means followed by centroid, rolloff, bandwidth and ZCR)
+
+    Args:
+        features: Dict returned by extract_clip_features with n_mfcc > 0
+
+    Returns:
+        1-D numpy array
+    """
+    return np.concatenate([
+        features['mfcc_mean'],
+        [
+            features['spectral_centroid'],
+            features['spectral_rolloff'],
+            features['spectral_bandwidth'],
+            features['zero_crossing_rate'],
+        ]
+    ])
+
+
+def energy_envelope(S):
+    """Per-frame spectral RMS envelope from a magnitude spectrogram"""
+    return np.sqrt(np.mean(S ** 2, axis=0))
+
+
+def onset_envelope(S, sr, hop_length=HOP_LENGTH):
+    """Spectral-flux onset strength envelope from a magnitude spectrogram"""
+    import librosa
+    return librosa.onset.onset_strength(
+        S=librosa.amplitude_to_db(S, ref=np.max), sr=sr, hop_length=hop_length
+    )
+
+
+def estimate_periodicity(envelope, sr, hop_length=HOP_LENGTH,
+                         min_hz=PERIODICITY_MIN_HZ, max_hz=PERIODICITY_MAX_HZ):
+    """
+    Estimate the dominant repetition rate (ticks, knocks, firing pulses)
+    from the autocorrelation of a frame envelope
+
+    Args:
+        envelope: Frame envelope (see energy_envelope)
+        sr: Sample rate of the analysed signal
+        hop_length: Hop between envelope frames
+        min_hz: Slowest repetition rate to consider
+        max_hz: Fastest repetition rate to consider
+
+    Returns:
+        Dict with 'periodicity_hz', 'periodicity_rpm' (repetitions per
+        minute) and 'periodicity_strength' (normalized autocorrelation
+        peak, 0.0 to 1.0); the rate is zero when no periodic pattern is found
+    """
+    import librosa
+    result = {'periodicity_hz': 0.0, 'periodicity_rpm': 0.0, 'periodicity_strength': 0.0}
+
+    frame_rate = sr / hop_length
+    min_lag = max(2, int(np.ceil(frame_rate / min(max_hz, frame_rate / 2))))
+    max_lag = min(int(frame_rate / min_hz), len(envelope) // 2)
+
+    if max_lag <= min_lag:
+        return result
+
+    autocorr = librosa.autocorrelate(envelope - np.mean(envelope), max_size=max_lag + 2)
+    if autocorr[0] <= 0:
+        return result
+    autocorr = autocorr / autocorr[0]
+
+    # Local maxima within the lag range; multiples of the true period score
+    # about as high, so take the shortest lag close to the best peak
+    lags = np.arange(min_lag, max_lag + 1)
+    is_peak = (autocorr[lags] > autocorr[lags - 1]) & (autocorr[lags] >= autocorr[lags + 1])
+    if not np.any(is_peak):
+        return result
+    peak_lags = lags[is_peak]
+    best = np.max(autocorr[peak_lags])
+    lag = int(peak_lags[np.argmax(autocorr[peak_lags] >= PERIODICITY_PEAK_RATIO * best)])
+    strength = float(autocorr[lag])
+
+    if strength < PERIODICITY_MIN_STRENGTH:
+        result['periodicity_strength'] = max(0.0, strength)
+        return result
+
+    # Parabolic interpolation for a sub-frame lag estimate
+    left, center, right = autocorr[lag - 1], autocorr[lag], autocorr[lag + 1]
+    denominator = left - 2 * center + right
+    offset = 0.5 * (left - right) / denominator if denominator != 0 else 0.0
+    rate_hz = frame_rate / (lag + offset)
+
+    result['periodicity_hz'] = float(rate_hz)
+    result['periodicity_rpm'] = float(rate_hz * 60)
+    result['periodicity_strength'] = min(1.0, strength)
+    return result
+
+
+def estimate_tempo(onset_env, sr, hop_length=HOP_LENGTH):
+    """Musical tempo (BPM) via librosa beat tracking on a precomputed envelope"""
+    import librosa
+    tempo_result, _ = librosa.beat.beat_track(onset_envelope=onset_env, sr=sr, hop_length=hop_length)
+    if isinstance(tempo_result, np.ndarray):
+        return float(tempo_result.item()) if tempo_result.size > 0 else 0.0
+    return float(tempo_result) if tempo_result else 0.0
+
+
+def extract_rhythm_features(S, sr, beat_tracking=False):
+    """
+    Periodicity (and optionally tempo) from the shared spectrogram
+
+    Args:
+        S: Magnitude spectrogram of the clip
+        sr: Sample rate
+        beat_tracking: Also run librosa beat tracking (expensive)
+
+    Returns:
+        Dict of periodicity metrics, plus 'tempo' when beat_tracking is set
+    """
+    features = estimate_periodicity(energy_envelope(S), sr)
+
+    if beat_tracking:
+        features['tempo'] = estimate_tempo(onset_envelope(S, sr), sr)
+
+    return features
@@ -0,0 +1,310 @@
+# audio_landmarks.py
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+import numpy as np
+# librosa (~1s with numba and scipy) is imported inside the functions that use it,
+# so catalog-only processes and CLIs never load it
+from audio_features import magnitude_spectrogram, ANALYSIS_SR, HOP_LENGTH
+from single_flight import file_lock
+
+logger = logging.getLogger(__name__)
+
+# Spectral peaks must be the maximum of this (freq bins, frames) neighbourhood
+PEAK_NEIGHBORHOOD = (15, 7)
+# ...and this many dB above the clip's median level
+PEAK_MIN_DB = 10.0
+# Density cap so loud, busy clips don't flood the index
+PEAKS_PER_SECOND = 30
+
+# Each anchor peak is paired with up to FAN_OUT later peaks within the target zone
+FAN_OUT = 5
+PAIR_SEARCH = 15
+MAX_PAIR_FRAMES = 63  # ~1.5s at 22050 Hz / hop 512: covers ticks down to ~40 RPM
+MAX_PAIR_BINS = 255
+
+# Hash layout: anchor bin / 2 (10 bits) | target bin / 2 (10 bits) | frame delta (6 bits)
+FREQ_QUANT = 2
+
+# Hashes posted for more references than this are too common to discriminate
+MAX_POSTINGS = int(os.environ.get('LANDMARK_MAX_POSTINGS', 5000))
+# Aligned hits at which a landmark match reaches ~63% confidence
+LANDMARK_HIT_SCALE = 15
+# Confidence a landmark match needs to be used (0.85 = ~29 aligned hits). This is
+# on the landmark_confidence scale, not cosine similarity, so it has its own cutoff
+LANDMARK_MIN_CONFIDENCE = float(os.environ.get('LANDMARK_MIN_CONFIDENCE', 0.85))
+
+LANDMARK_SECONDS = 30
+LANDMARKS_FILENAME = 'landmarks.npz'
+
+
+def find_spectral_peaks(S, sr=ANALYSIS_SR, hop_length=HOP_LENGTH):
+    """
+    Pick the prominent time-frequency peaks of a magnitude spectrogram
+
+    Returns:
+        Tuple (bins, frames) of int arrays, ordered by frame
+    """
+    from scipy.ndimage import maximum_filter
+    import librosa
+    if S.size == 0:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+
+    S_db = librosa.amplitude_to_db(S, ref=np.max)
+    is_peak = (maximum_filter(S_db, size=PEAK_NEIGHBORHOOD, mode='constant', cval=-np.inf) == S_db)
+    is_peak &= S_db > np.median(S_db) + PEAK_MIN_DB
+    bins, frames = np.nonzero(is_peak)
+
+    max_peaks = max(1, int(PEAKS_PER_SECOND * S.shape[1] * hop_length / sr))
+    if len(bins) > max_peaks:
+        keep = np.argpartition(-S_db[bins, frames], max_peaks - 1)[:max_peaks]
+        bins, frames = bins[keep], frames[keep]
+
+    order = np.lexsort((bins, frames))
+    return bins[order].astype(np.int32), frames[order].astype(np.int32)
+
+
+def extract_landmarks(y, sr=ANALYSIS_SR, S=None):
+    """
+    Frame-level fingerprint: hashed pairs of spectral peaks
+
+    Each landmark encodes two peak frequencies and the time between them,
+    so it keeps the timing a mean-pooled MFCC vector throws away (a 4 Hz
+    tick and a steady whine with the same spectrum hash differently).
+
+    Args:
+        y: Mono audio signal
+        sr: Sample rate of y
+        S: Optional precomputed magnitude spectrogram of y
+
+    Returns:
+        Tuple (hashes uint32, anchor frames int32)
+    """
+    if S is None:
+        S = magnitude_spectrogram(y)
+    bins, frames = find_spectral_peaks(S, sr)
+
+    anchors, targets, ranks = [], [], []
+    for step in range(1, PAIR_SEARCH + 1):
+        anchor = np.arange(len(bins) - step)
+        target = anchor + step
+        dt = frames[target] - frames[anchor]
+        valid = (dt > 0) & (dt <= MAX_PAIR_FRAMES) & (np.abs(bins[target] - bins[anchor]) <= MAX_PAIR_BINS)
+        anchors.append(anchor[valid])
+        targets.append(target[valid])
+        ranks.append(np.full(int(valid.sum()), step))
+
+    anchor = np.concatenate(anchors)
+    target = np.concatenate(targets)
+    if len(anchor) == 0:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)
+
+    # Keep the FAN_OUT nearest targets of each anchor
+    order = np.lexsort((np.concatenate(ranks), anchor))
+    anchor, target = anchor[order], target[order]
+    group_start = np.searchsorted(anchor, anchor, side='left')
+    keep = np.arange(len(anchor)) - group_start < FAN_OUT
+    anchor, target = anchor[keep], target[keep]
+
+    hashes = (
+        ((bins[anchor] // FREQ_QUANT).astype(np.uint32) << 16)
+        | ((bins[target] // FREQ_QUANT).astype(np.uint32) << 6)
+        | (frames[target] - frames[anchor]).astype(np.uint32)
+    )
+    return hashes, frames[anchor]
+
+
+def landmark_confidence(aligned_hits):
+    """Map a count of time-aligned landmark hits to a 0-1 confidence"""
+    return float(1.0 - np.exp(-aligned_hits / LANDMARK_HIT_SCALE))
+
+
+class LandmarkIndex:
+    """
+    Inverted index from landmark hash to (reference, frame) postings
+
+    Postings are kept sorted by hash, so a query is one binary search per
+    distinct query hash plus the matching postings - independent of how
+    many references the index holds. Matches are scored by time-aligned
+    hits: postings whose reference-minus-query frame offset agree.
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path: .npz file to load from / save to (None for in-memory only)
+        """
+        self.path = Path(path) if path is not None else None
+        self._lock = threading.Lock()
+        self.video_ids = []
+        self._video_slots = {}
+        self._hashes = np.zeros(0, dtype=np.uint32)
+        self._refs = np.zeros(0, dtype=np.int32)
+        self._frames = np.zeros(0, dtype=np.int32)
+        self._pending = []
+        self.load()
+
+    def _read_disk(self):
+        """
+        Returns:
+            Tuple (hashes, refs, frames, video_ids) from disk, or None if absent or unreadable
+        """
+        if self.path is None or not self.path.exists():
+            return None
+
+        try:
+            with np.load(self.path) as data:
+                return (data['hashes'], data['refs'], data['frames'],
+                        json.loads(str(data['video_ids'])))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to load landmark index {self.path}: {str(e)}")
+            return None
+
+    def load(self):
+        """Load postings from disk (an absent file is treated as empty)"""
+        postings = self._read_disk()
+        if postings is None:
+            return
+
+        hashes, refs, frames, video_ids = postings
+        with self._lock:
+            self._hashes, self._refs, self._frames = hashes, refs, frames
+            self.video_ids = video_ids
+            self._video_slots = {video_id: slot for slot, video_id in enumerate(video_ids)}
+            self._pending = []
+        logger.info(f"Loaded landmark index: {len(video_ids)} references, {len(hashes)} landmarks")
+
+    def save(self):
+        """
+        Merge with the postings on disk and atomically write the result
+
+        Under a file lock, references another worker process saved since
+        this one loaded are folded in first, so concurrent writers never
+        drop each other's references.
+        """
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.path.with_suffix('.lock')):
+            postings = self._read_disk()
+            with self._lock:
+                if postings is not None:
+                    self._merge_disk(*postings)
+                self._merge_pending()
+                tmp_path = self.path.with_name(f'landmarks.{os.getpid()}.tmp.npz')
+                np.savez(tmp_path, hashes=self._hashes, refs=self._refs, frames=self._frames,
+                         video_ids=json.dumps(self.video_ids))
+                os.replace(tmp_path, self.path)
+
+    def _merge_disk(self, hashes, refs, frames, video_ids):
+        """Queue the on-disk references this process lacks (caller holds the lock)"""
+        remap = np.full(len(video_ids), -1, dtype=np.int32)
+        for disk_slot, video_id in enumerate(video_ids):
+            if video_id in self._video_slots:
+                continue
+            remap[disk_slot] = len(self.video_ids)
+            self._video_slots[video_id] = len(self.video_ids)
+            self.video_ids.append(video_id)
+
+        new_refs = remap[refs] if len(refs) else refs
+        keep = new_refs >= 0
+        if keep.any():
+            self._pending.append((hashes[keep], new_refs[keep], frames[keep]))
+
+    def __contains__(self, video_id):
+        return video_id in self._video_slots
+
+    def __len__(self):
+        return len(self.video_ids)
+
+    def add(self, video_id, hashes, frames):
+        """Post one reference's landmarks (re-adding a video is a no-op)"""
+        with self._lock:
+            if video_id in self._video_slots:
+                return
+            slot = len(self.video_ids)
+            self.video_ids.append(video_id)
+            self._video_slots[video_id] = slot
+            self._pending.append((
+                np.asarray(hashes, dtype=np.uint32),
+                np.full(len(hashes), slot, dtype=np.int32),
+                np.asarray(frames, dtype=np.int32),
+            ))
+
+    def _merge_pending(self):
+        """Fold added references into the sorted postings (caller holds the lock)"""
+        if not self._pending:
+            return
+        hashes = np.concatenate([self._hashes] + [p[0] for p in self._pending])
+        refs = np.concatenate([self._refs] + [p[1] for p in self._pending])
+        frames = np.concatenate([self._frames] + [p[2] for p in self._pending])
+        order = np.argsort(hashes, kind='stable')
+        self._hashes, self._refs, self._frames = hashes[order], refs[order], frames[order]
+        self._pending = []
+
+    def match(self, hashes, frames, k=5, video_ids=None):
+        """
+        Rank references by time-aligned landmark hits
+
+        Args:
+            hashes: Query landmark hashes (see extract_landmarks)
+            frames: Query anchor frames
+            k: Number of references to return
+            video_ids: Optional subset of references to consider
+
+        Returns:
+            List of dicts with 'video_id', 'aligned_hits', 'offset_seconds'
+            (where the query starts in the reference) and 'confidence', best first
+        """
+        with self._lock:
+            self._merge_pending()
+            index_hashes, index_refs, index_frames = self._hashes, self._refs, self._frames
+            slots = self._video_slots
+
+        if len(hashes) == 0 or len(index_hashes) == 0:
+            return []
+
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        frames = np.asarray(frames, dtype=np.int64)
+        left = np.searchsorted(index_hashes, hashes, side='left')
+        counts = np.searchsorted(index_hashes, hashes, side='right') - left
+        counts[counts > MAX_POSTINGS] = 0
+        if counts.sum() == 0:
+            return []
+
+        # Expand every query landmark into its postings
+        query_rows = np.repeat(np.arange(len(hashes)), counts)
+        postings = np.repeat(left - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        refs = index_refs[postings].astype(np.int64)
+        offsets = index_frames[postings] - frames[query_rows]
+
+        if video_ids is not None:
+            allowed = np.zeros(len(self.video_ids), dtype=bool)
+            allowed[[slots[video_id] for video_id in video_ids if video_id in slots]] = True
+            keep = allowed[refs]
+            refs, offsets = refs[keep], offsets[keep]
+            if len(refs) == 0:
+                return []
+
+        # Votes per (reference, offset); a true match piles up on one offset
+        span = int(offsets.max() - offsets.min()) + 1
+        keys, votes = np.unique(refs * span + (offsets - offsets.min()), return_counts=True)
+        key_refs = keys // span
+        order = np.lexsort((-votes, key_refs))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = key_refs[order][1:] != key_refs[order][:-1]
+        best = order[first]
+
+        best = best[np.argsort(-votes[best], kind='stable')][:k]
+        hop_seconds = HOP_LENGTH / ANALYSIS_SR
+        return [
+            {
+                'video_id': self.video_ids[int(key_refs[i])],
+                'aligned_hits': int(votes[i]),
+                'offset_seconds': round(float(keys[i] % span + offsets.min()) * hop_seconds, 2),
+                'confidence': landmark_confidence(votes[i]),
+            }
+            for i in best
+        ]
@@ -1,79 +1,229 @@
 # audio_matcher.py
-import librosa
+# librosa (~1s with numba and scipy) is imported inside the functions that use it,
+# so catalog-only processes and CLIs never load it
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from pathlib import Path
+from audio_features import extract_clip_features, features_to_vector, N_MFCC
+from audio_landmarks import extract_landmarks, LANDMARK_SECONDS
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rough population location/scale of each fingerprint dimension (MFCC
+# means, then centroid, rolloff, bandwidth in Hz and ZCR). Without
+# standardization the spectral values in the thousands of Hz dominate
+# the cosine and every pair scores close to 1.0.
+DEFAULT_FEATURE_CENTER = np.array([-300.0, 50.0] + [0.0] * (N_MFCC - 2) + [2500.0, 5000.0, 2300.0, 0.10])
+DEFAULT_FEATURE_SCALE = np.array([150.0, 40.0] + [15.0] * (N_MFCC - 2) + [1500.0, 2500.0, 900.0, 0.08])
+
+# Fingerprints needed before scaling is fitted from data instead of the defaults
+MIN_SCALING_SAMPLES = 20
+
+
+def fit_feature_scaling(feature_matrix, min_samples=MIN_SCALING_SAMPLES):
+    """
+    Per-dimension (center, scale) for standardizing fingerprints
+    
+    Args:
+        feature_matrix: (N, D) matrix of fingerprints (e.g. the whole reference index)
+        min_samples: Below this many rows the defaults are returned
+        
+    Returns:
+        Tuple (center, scale) of 1-D arrays
+    """
+    feature_matrix = np.atleast_2d(np.asarray(feature_matrix, dtype=float))
+    if feature_matrix.shape[0] < min_samples or feature_matrix.shape[1] != len(DEFAULT_FEATURE_SCALE):
+        return DEFAULT_FEATURE_CENTER, DEFAULT_FEATURE_SCALE
+    
+    center = feature_matrix.mean(axis=0)
+    # Floor the spread so a near-constant dimension can't blow up
+    scale = np.maximum(feature_matrix.std(axis=0), 0.1 * DEFAULT_FEATURE_SCALE)
+    return center, scale
+
+
+def normalize_fingerprints(feature_matrix, scaling=None):
+    """
+    Standardize fingerprints per dimension and scale each row to unit length
+    
+    Args:
+        feature_matrix: (N, D) matrix or a single 1-D fingerprint
+        scaling: (center, scale) from fit_feature_scaling (defaults if None)
+        
+    Returns:
+        (N, D) float64 matrix of unit rows (all-zero rows stay zero)
+    """
+    center, scale = scaling if scaling is not None else (DEFAULT_FEATURE_CENTER, DEFAULT_FEATURE_SCALE)
+    standardized = (np.atleast_2d(np.asarray(feature_matrix, dtype=float)) - center) / scale
+    norms = np.linalg.norm(standardized, axis=1, keepdims=True)
+    return standardized / np.where(norms > 0, norms, 1.0)
+
+
 def extract_audio_features(audio_path, sr=22050, duration=10):
     """
     Extract comprehensive audio features for comparison
     (This runs in background - user never sees this)
     """
+    import librosa
     try:
         # Load audio
         y, sr = librosa.load(audio_path, sr=sr, duration=duration)
         
-        # MFCC features (voice/sound fingerprint)
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
-        mfcc_mean = np.mean(mfccs, axis=1)
-        
-        # Spectral features
-        spectral_centroid = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
-        spectral_rolloff = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr))
-        spectral_bandwidth = np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr))
-        zero_crossing_rate = np.mean(librosa.feature.zero_crossing_rate(y))
-        
-        # Combine all features
-        features = np.concatenate([
-            mfcc_mean,
-            [spectral_centroid, spectral_rolloff, spectral_bandwidth, zero_crossing_rate]
-        ])
+        return extract_signal_features(y, sr, target_sr=sr, duration=duration)
+    
+    except Exception as e:
+        logger.error(f"Feature extraction error: {str(e)}")
+        return None
+
+
+def extract_reference_fingerprints(audio_path, sr=22050, duration=10):
+    """
+    Mean-vector fingerprint plus frame-level landmarks from one decode
+    (This runs in background - user never sees this)
+    
+    Returns:
+        Tuple (feature_vector, (landmark_hashes, landmark_frames)), or None on failure
+    """
+    import librosa
+    try:
+        y, sr = librosa.load(audio_path, sr=sr, duration=max(duration, LANDMARK_SECONDS))
         
-        return features
+        return extract_signal_features(y, sr, target_sr=sr, duration=duration), extract_landmarks(y, sr)
     
     except Exception as e:
         logger.error(f"Feature extraction error: {str(e)}")
         return None
 
 
-def compare_audio_similarity(user_audio_path, reference_audio_path):
+def extract_signal_features(y, sr, target_sr=22050, duration=10):
+    """
+    Extract the comparison fingerprint from an already-decoded signal
+    
+    Args:
+        y: Mono audio signal
+        sr: Sample rate of y
+        target_sr: Analysis sample rate used for reference fingerprints
+        duration: Seconds of audio to use
+        
+    Returns:
+        Feature vector (MFCC means + spectral means)
+    """
+    import librosa
+    y = y[:int(duration * sr)]
+    if sr != target_sr:
+        y = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+    
+    # MFCC + spectral features from a single STFT
+    return features_to_vector(extract_clip_features(y, target_sr, n_mfcc=N_MFCC))
+
+
+def compare_audio_similarity(user_audio_path, reference_audio_path, user_features=None):
     """
     Compare two audio files and return similarity score
     (This runs in background - user never sees this)
     
+    Args:
+        user_audio_path: Path to user's recorded audio
+        reference_audio_path: Path to reference audio
+        user_features: Optional precomputed feature vector for the user's clip
+    
     Returns:
-        Similarity score (0.0 to 1.0)
+        Similarity score (0 to 100)
     """
-    # Extract features from both
-    user_features = extract_audio_features(user_audio_path)
+    # Extract features from both (user clip only if not supplied)
+    if user_features is None:
+        user_features = extract_audio_features(user_audio_path)
     ref_features = extract_audio_features(reference_audio_path)
     
     if user_features is None or ref_features is None:
         return 0.0
     
-    # Calculate cosine similarity
-    user_features = user_features.reshape(1, -1)
-    ref_features = ref_features.reshape(1, -1)
+    # Calculate cosine similarity and convert to 0-100 scale
+    similarity_percent = float(score_references(user_features, ref_features)[0]) * 100
     
-    similarity = cosine_similarity(user_features, ref_features)[0][0]
+    return similarity_percent
+
+
+def score_references(user_features, reference_features, scaling=None):
+    """
+    Score many reference fingerprints against the user fingerprint at once
+    
+    Args:
+        user_features: 1-D user feature vector
+        reference_features: Sequence of reference vectors or an (N, D) matrix
+        scaling: (center, scale) from fit_feature_scaling (defaults if None)
+        
+    Returns:
+        Array of N similarity scores (0.0 to 1.0): cosine similarity of the
+        standardized fingerprints, with anti-correlated pairs clipped to 0
+    """
+    reference_matrix = np.atleast_2d(np.asarray(reference_features, dtype=float))
     
-    # Convert to 0-100 scale
-    similarity_percent = max(0, min(100, similarity * 100))
+    if reference_matrix.size == 0:
+        return np.zeros(0)
     
-    return similarity_percent
+    # Unit rows, so cosine similarity is one matrix-vector product
+    user_unit = normalize_fingerprints(user_features, scaling)[0]
+    similarities = normalize_fingerprints(reference_matrix, scaling) @ user_unit
+    
+    return np.clip(similarities, 0.0, 1.0)
 
 
-def find_best_audio_match(user_audio_path, youtube_results):
+def top_k_references(user_features, reference_features, k=5, scaling=None):
     """
-    Find the best matching YouTube video based on audio similarity
+    Indices and scores of the k most similar references, best first
+    
+    Args:
+        user_features: 1-D user feature vector
+        reference_features: (N, D) matrix of reference fingerprints
+        k: Number of matches to return (all if N < k)
+        scaling: (center, scale) from fit_feature_scaling (defaults if None)
+        
+    Returns:
+        Tuple (indices, scores) of 1-D arrays
+    """
+    similarities = score_references(user_features, reference_features, scaling)
+    k = min(k, len(similarities))
+    if k == 0:
+        return np.zeros(0, dtype=int), np.zeros(0)
+    
+    # argpartition keeps this O(N) for large reference sets
+    candidates = np.argpartition(-similarities, k - 1)[:k]
+    order = candidates[np.argsort(-similarities[candidates], kind='stable')]
+    return order, similarities[order]
+
+
+def infer_issue_type(video_info):
+    """
+    Infer a diagnosis from a reference video's title
+    (This runs in background - user never sees this)
+    """
+    title_lower = video_info['title'].lower()
+    
+    if 'belt' in title_lower or 'squeal' in title_lower:
+        return 'Belt squeal detected - serpentine belt replacement recommended'
+    elif 'bearing' in title_lower or 'wheel bearing' in title_lower:
+        return 'Bearing wear detected - inspect wheel bearings'
+    elif 'misfire' in title_lower or 'cylinder' in title_lower:
+        return 'Engine misfire detected - check spark plugs and ignition'
+    elif 'exhaust' in title_lower or 'leak' in title_lower:
+        return 'Exhaust leak detected - inspect exhaust system'
+    elif 'brake' in title_lower or 'brakes' in title_lower:
+        return 'Brake noise detected - inspect brake pads and rotors'
+    elif 'timing' in title_lower or 'chain' in title_lower:
+        return 'Timing chain/belt issue detected - immediate inspection needed'
+    else:
+        return f'Mechanical issue detected - similar to common {video_info["channel"]} diagnosis'
+
+
+def find_best_reference_match(user_features, references, scaling=None):
+    """
+    Find the best matching reference from precomputed fingerprints
     (This runs in background - user never sees this)
     
     Args:
-        user_audio_path: Path to user's recorded audio
-        youtube_results: List of (video_info, audio_path) tuples
+        user_features: Feature vector for the user's clip
+        references: List of (video_info, feature_vector) tuples
+        scaling: (center, scale) from fit_feature_scaling (defaults if None)
         
     Returns:
         Dict with best match info and inferred diagnosis
@@ -85,33 +235,48 @@ def find_best_audio_match(user_audio_path, youtube_results):
         'confidence': 0.5
     }
     
-    for video_info, ref_audio_path in youtube_results:
-        similarity = compare_audio_similarity(user_audio_path, ref_audio_path)
-        
-        if similarity > best_match['similarity']:
-            best_match['similarity'] = similarity / 100  # Convert to 0-1
-            best_match['video_title'] = video_info['title']
-            
-            # Infer issue type from video title (background analysis)
-            title_lower = video_info['title'].lower()
-            
-            if 'belt' in title_lower or 'squeal' in title_lower:
-                best_match['issue_type'] = 'Belt squeal detected - serpentine belt replacement recommended'
-            elif 'bearing' in title_lower or 'wheel bearing' in title_lower:
-                best_match['issue_type'] = 'Bearing wear detected - inspect wheel bearings'
-            elif 'misfire' in title_lower or 'cylinder' in title_lower:
-                best_match['issue_type'] = 'Engine misfire detected - check spark plugs and ignition'
-            elif 'exhaust' in title_lower or 'leak' in title_lower:
-                best_match['issue_type'] = 'Exhaust leak detected - inspect exhaust system'
-            elif 'brake' in title_lower or 'brakes' in title_lower:
-                best_match['issue_type'] = 'Brake noise detected - inspect brake pads and rotors'
-            elif 'timing' in title_lower or 'chain' in title_lower:
-                best_match['issue_type'] = 'Timing chain/belt issue detected - immediate inspection needed'
-            else:
-                best_match['issue_type'] = f'Mechanical issue detected - similar to common {video_info["channel"]} diagnosis'
-            
-            best_match['confidence'] = best_match['similarity']
+    if user_features is None or not references:
+        return best_match
+    
+    videos = [video_info for video_info, _ in references]
+    indices, scores = top_k_references(
+        user_features, np.vstack([features for _, features in references]), k=1, scaling=scaling
+    )
+    best_index = int(indices[0])
+    
+    if scores[0] > 0:
+        video_info = videos[best_index]
+        best_match['similarity'] = float(scores[0])
+        best_match['video_title'] = video_info['title']
+        best_match['issue_type'] = infer_issue_type(video_info)
+        best_match['confidence'] = best_match['similarity']
     
     logger.info(f"Best match: {best_match['video_title']} (similarity: {best_match['similarity']*100:.1f}%)")
     
-    return best_match
\ No newline at end of file
+    return best_match
+
+
+def find_best_audio_match(user_audio_path, youtube_results, user_features=None):
+    """
+    Find the best matching YouTube video based on audio similarity
+    (This runs in background - user never sees this)
+    
+    Args:
+        user_audio_path: Path to user's recorded audio
+        youtube_results: List of (video_info, audio_path) tuples
+        user_features: Optional precomputed feature vector for the user's
+            clip; when omitted it is extracted once from user_audio_path
+        
+    Returns:
+        Dict with best match info and inferred diagnosis
+    """
+    if user_features is None:
+        user_features = extract_audio_features(user_audio_path)
+    
+    references = []
+    for video_info, ref_audio_path in youtube_results:
+        ref_features = extract_audio_features(ref_audio_path)
+        if ref_features is not None:
+            references.append((video_info, ref_features))
+    
+    return find_best_reference_match(user_features, references)
@@ -0,0 +1,319 @@
+# audio_streaming.py
+import os
+import time
+import threading
+import subprocess
+import logging
+# librosa (~1s with numba and scipy) is imported inside the functions that use it,
+# so catalog-only processes and CLIs never load it
+import numpy as np
+from audio_features import (
+    N_FFT, HOP_LENGTH, ANALYSIS_SR, FFMPEG_TIMEOUT, estimate_periodicity, ffmpeg_decode_command
+)
+
+logger = logging.getLogger(__name__)
+
+# PCM samples read per block (~1.5 s at the analysis rate)
+STREAM_BLOCK_SIZE = 32768
+# Length of each window in the reported time series
+STREAM_WINDOW_SECONDS = 1.0
+# Leading audio kept for reference matching and periodicity (bounded)
+STREAM_HEAD_SECONDS = 10
+STREAM_ENVELOPE_SECONDS = 30
+# Uploads larger than this are analysed in streaming mode
+STREAMING_THRESHOLD_BYTES = int(os.environ.get('STREAMING_THRESHOLD_BYTES', 2 * 1024 * 1024))
+
+ROLL_PERCENT = 0.85
+
+
+def stream_decode_audio_bytes(data, sr=ANALYSIS_SR, block_size=STREAM_BLOCK_SIZE, timeout=FFMPEG_TIMEOUT):
+    """
+    Decode an uploaded audio file through ffmpeg, yielding fixed-size PCM blocks
+
+    Unlike decode_audio_bytes, the full decoded signal is never held in
+    memory: blocks are yielded as ffmpeg produces them.
+
+    Args:
+        data: Encoded audio file contents
+        sr: Output sample rate
+        block_size: Samples per yielded block (the last block may be shorter)
+        timeout: ffmpeg timeout in seconds
+
+    Yields:
+        float32 numpy arrays of mono samples
+
+    Raises:
+        subprocess.CalledProcessError: ffmpeg could not decode the input
+        subprocess.TimeoutExpired: ffmpeg did not finish within timeout
+    """
+    ffmpeg_command = ffmpeg_decode_command(sr)
+
+    process = subprocess.Popen(
+        ffmpeg_command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+
+    # Feed stdin from a thread so a full stdout pipe can't deadlock us
+    def feed():
+        try:
+            process.stdin.write(data)
+        except (BrokenPipeError, ValueError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    stderr_chunks = []
+    feeder = threading.Thread(target=feed, daemon=True)
+    drainer = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    feeder.start()
+    drainer.start()
+
+    deadline = time.monotonic() + timeout
+    block_bytes = block_size * 4
+    pending = b''
+
+    try:
+        while True:
+            if time.monotonic() > deadline:
+                raise subprocess.TimeoutExpired(ffmpeg_command, timeout)
+
+            chunk = process.stdout.read(block_bytes - len(pending))
+            if not chunk:
+                break
+            pending += chunk
+            if len(pending) == block_bytes:
+                yield np.frombuffer(pending, dtype=np.float32)
+                pending = b''
+
+        # Drop a trailing partial sample, if any
+        usable = len(pending) - len(pending) % 4
+        if usable:
+            yield np.frombuffer(pending[:usable], dtype=np.float32)
+
+        returncode = process.wait(timeout=max(0.1, deadline - time.monotonic()))
+        drainer.join(timeout=1)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(
+                returncode, ffmpeg_command, stderr=b''.join(stderr_chunks)
+            )
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def stream_audio_file(path, sr=ANALYSIS_SR, block_size=STREAM_BLOCK_SIZE):
+    """
+    Read an audio file from disk in fixed-size blocks (soundfile formats)
+
+    Yields:
+        float32 numpy arrays of mono samples at sr
+    """
+    import librosa
+    native_sr = librosa.get_samplerate(path)
+    stream = librosa.stream(
+        path, block_length=1, frame_length=block_size, hop_length=block_size,
+        mono=True, fill_value=None, dtype=np.float32
+    )
+    for block in stream:
+        if native_sr != sr:
+            block = librosa.resample(block, orig_sr=native_sr, target_sr=sr)
+        yield block
+
+
+class StreamingAnalyzer:
+    """
+    Incremental RMS, ZCR and spectral-moment statistics over PCM blocks
+
+    Frames are cut with the same FFT size, hop and centering as the batch
+    analysis (the signal is padded with n_fft // 2 zeros at both ends, as
+    librosa's center=True does); the samples that overlap the next block
+    are carried over. Only running
+    sums, a per-window time series and a bounded head of the signal are
+    kept, so memory does not grow with the recording length.
+    """
+
+    def __init__(self, sr=ANALYSIS_SR, n_fft=N_FFT, hop_length=HOP_LENGTH,
+                 window_seconds=STREAM_WINDOW_SECONDS, head_seconds=STREAM_HEAD_SECONDS,
+                 envelope_seconds=STREAM_ENVELOPE_SECONDS):
+        """
+        Args:
+            sr: Sample rate of the incoming blocks
+            n_fft: Frame/FFT size
+            hop_length: Hop between frames
+            window_seconds: Length of each time-series window
+            head_seconds: Leading audio retained (for reference matching)
+            envelope_seconds: Leading energy envelope retained (for periodicity)
+        """
+        import librosa
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.window = librosa.filters.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+        self.freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+        self.frames_per_window = max(1, int(round(window_seconds * sr / hop_length)))
+        self.head_samples = int(head_seconds * sr)
+        self.envelope_frames = int(envelope_seconds * sr / hop_length)
+
+        self.total_samples = 0
+        self.frame_count = 0
+        # Leading half-frame of zeros centres frame i on sample i * hop_length
+        self._carry = np.zeros(n_fft // 2, dtype=np.float32)
+        self._sums = np.zeros(5)
+        self._window_sums = np.zeros(5)
+        self._window_frames = 0
+        self._head = []
+        self._head_len = 0
+        self._envelope = []
+        self.timeline = []
+
+    def update(self, block):
+        """Add a block of mono samples"""
+        block = np.asarray(block, dtype=np.float32)
+        self.total_samples += len(block)
+
+        if self._head_len < self.head_samples:
+            head_part = block[:self.head_samples - self._head_len]
+            self._head.append(head_part)
+            self._head_len += len(head_part)
+
+        self._consume(np.concatenate([self._carry, block]))
+
+    def _consume(self, buffer):
+        """Analyse every full frame in buffer and carry the rest over"""
+        import librosa
+        if len(buffer) < self.n_fft:
+            self._carry = buffer
+            return
+
+        n_frames = 1 + (len(buffer) - self.n_fft) // self.hop_length
+        frames = librosa.util.frame(buffer, frame_length=self.n_fft, hop_length=self.hop_length)[:, :n_frames]
+        self._carry = buffer[n_frames * self.hop_length:]
+
+        self._add_frames(self._frame_features(frames))
+
+    def _frame_features(self, frames):
+        """Per-frame [rms, zcr, centroid, rolloff, bandwidth] for a (n_fft, n) frame matrix"""
+        rms = np.sqrt(np.mean(frames ** 2, axis=0))
+        # Crossings over the frame length, as librosa's zero_crossing_rate counts them
+        zcr = np.sum(np.diff(np.signbit(frames), axis=0), axis=0) / frames.shape[0]
+
+        S = np.abs(np.fft.rfft(frames * self.window[:, None], axis=0))
+        energy = np.sqrt(np.mean(S ** 2, axis=0))
+        if len(self._envelope) < self.envelope_frames:
+            self._envelope.extend(energy[:self.envelope_frames - len(self._envelope)].tolist())
+
+        total = np.sum(S, axis=0)
+        safe_total = np.where(total > 0, total, 1.0)
+        S_norm = S / safe_total
+
+        centroid = np.sum(self.freqs[:, None] * S_norm, axis=0)
+        bandwidth = np.sqrt(np.sum(S_norm * (self.freqs[:, None] - centroid) ** 2, axis=0))
+        cumulative = np.cumsum(S, axis=0)
+        rolloff = self.freqs[np.argmax(cumulative >= ROLL_PERCENT * total, axis=0)]
+
+        silent = total <= 0
+        centroid[silent] = 0.0
+        bandwidth[silent] = 0.0
+        rolloff[silent] = 0.0
+
+        return np.vstack([rms, zcr, centroid, rolloff, bandwidth])
+
+    def _add_frames(self, values):
+        self._sums += values.sum(axis=1)
+        self.frame_count += values.shape[1]
+
+        start = 0
+        while start < values.shape[1]:
+            take = min(self.frames_per_window - self._window_frames, values.shape[1] - start)
+            self._window_sums += values[:, start:start + take].sum(axis=1)
+            self._window_frames += take
+            start += take
+            if self._window_frames == self.frames_per_window:
+                self._close_window()
+
+    def _close_window(self):
+        if self._window_frames == 0:
+            return
+        means = self._window_sums / self._window_frames
+        window_start = len(self.timeline) * self.frames_per_window * self.hop_length / self.sr
+        self.timeline.append({
+            'start': round(window_start, 2),
+            'rms': round(float(means[0]), 4),
+            'zero_crossing_rate': round(float(means[1]), 4),
+            'spectral_centroid': round(float(means[2]), 2),
+            'spectral_rolloff': round(float(means[3]), 2),
+            'spectral_bandwidth': round(float(means[4]), 2),
+        })
+        self._window_sums = np.zeros(5)
+        self._window_frames = 0
+
+    def snapshot(self):
+        """
+        Provisional mean features of everything analysed so far (the
+        analyzer keeps accepting blocks)
+
+        Returns:
+            Dict with the mean features, 'duration' and 'windows'
+        """
+        means = self._sums / self.frame_count if self.frame_count else np.zeros(5)
+        return {
+            'rms': float(means[0]),
+            'zero_crossing_rate': float(means[1]),
+            'spectral_centroid': float(means[2]),
+            'spectral_rolloff': float(means[3]),
+            'spectral_bandwidth': float(means[4]),
+            'duration': self.total_samples / self.sr,
+            'windows': len(self.timeline),
+        }
+
+    def finalize(self):
+        """
+        Returns:
+            Dict with the same mean features as extract_clip_features, plus
+            'duration', periodicity metrics, 'timeline' (per-window means)
+            and 'head' (leading samples for reference matching)
+        """
+        # Trailing half-frame of zeros, so the frame count matches the
+        # centred batch analysis (1 + samples // hop_length)
+        if self.total_samples:
+            self._consume(np.concatenate([self._carry, np.zeros(self.n_fft // 2, dtype=np.float32)]))
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._close_window()
+
+        means = self._sums / self.frame_count if self.frame_count else np.zeros(5)
+        features = {
+            'rms': float(means[0]),
+            'zero_crossing_rate': float(means[1]),
+            'spectral_centroid': float(means[2]),
+            'spectral_rolloff': float(means[3]),
+            'spectral_bandwidth': float(means[4]),
+            'duration': self.total_samples / self.sr,
+            'timeline': self.timeline,
+            'head': np.concatenate(self._head) if self._head else np.zeros(0, dtype=np.float32),
+        }
+        features.update(estimate_periodicity(np.asarray(self._envelope), self.sr, hop_length=self.hop_length))
+        return features
+
+
+def analyze_stream(blocks, sr=ANALYSIS_SR, **kwargs):
+    """
+    Run a StreamingAnalyzer over an iterable of PCM blocks
+
+    Args:
+        blocks: Iterable of mono float32 arrays at sr
+        sr: Sample rate
+        **kwargs: Passed through to StreamingAnalyzer
+
+    Returns:
+        Dict from StreamingAnalyzer.finalize
+    """
+    analyzer = StreamingAnalyzer(sr=sr, **kwargs)
+    for block in blocks:
+        analyzer.update(block)
+    return analyzer.finalize()
@@ -0,0 +1,298 @@
+# batch_analysis.py
+import os
+import json
+import time
+import logging
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from audio_features import ANALYSIS_PROFILES, DEFAULT_ANALYSIS_PROFILE
+from audio_streaming import STREAMING_THRESHOLD_BYTES
+from analysis_pool import analyze_audio_bytes, ANALYSIS_WORKERS
+from diagnostic_rules import rule_engine
+# pyarrow (optional, Parquet output only) is imported by BatchWriter on first use
+
+logger = logging.getLogger(__name__)
+
+# POST /batch only reads recordings under BATCH_ROOT and writes to BATCH_OUTPUT_DIR
+BATCH_ROOT = Path(os.environ.get('BATCH_ROOT', './recordings'))
+BATCH_OUTPUT_DIR = Path(os.environ.get('BATCH_OUTPUT_DIR', './batch_results'))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+# Analysis pool workers a POST /batch job may keep busy, leaving the rest for /upload
+BATCH_POOL_WORKERS = int(os.environ.get('BATCH_POOL_WORKERS', max(1, ANALYSIS_WORKERS // 2)))
+# Results are scored and flushed to the output in groups of this size
+BATCH_FLUSH_SIZE = 256
+# Files picked up when a directory is given
+BATCH_AUDIO_EXTENSIONS = ('.wav', '.webm', '.ogg', '.mp3', '.m4a', '.opus', '.flac')
+
+# Column order of a result record
+BATCH_FIELDS = (
+    'path', 'duration', 'rms', 'zero_crossing_rate', 'spectral_centroid', 'spectral_rolloff',
+    'spectral_bandwidth', 'periodicity_hz', 'periodicity_rpm', 'periodicity_strength', 'tempo',
+    'issues', 'error', 'analysis_time'
+)
+
+
+def collect_audio_paths(source, root=None):
+    """
+    Resolve a batch source to a list of audio file paths
+
+    Args:
+        source: A directory (searched recursively) or a manifest file with
+            one path per line, or JSON lines with a 'path' field; relative
+            manifest paths are resolved against the manifest's directory
+        root: If given, every path must resolve inside this directory
+            (API batches; absolute or '../' manifest entries are rejected)
+
+    Returns:
+        List of path strings
+
+    Raises:
+        ValueError: a path resolves outside root
+    """
+    source = Path(source)
+    if source.is_dir():
+        paths = sorted(
+            str(path) for path in source.rglob('*')
+            if path.suffix.lower() in BATCH_AUDIO_EXTENSIONS and path.is_file()
+        )
+    else:
+        paths = []
+        with open(source, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                path = json.loads(line)['path'] if line.startswith('{') else line
+                paths.append(str(source.parent / path))
+
+    if root is not None:
+        root = Path(root).resolve()
+        for path in paths:
+            if not _is_inside(Path(path).resolve(), root):
+                raise ValueError(f"Batch entry '{path}' is outside the batch root")
+    return paths
+
+
+def _is_inside(path, root):
+    return path == root or root in path.parents
+
+
+def resolve_batch_source(source, root=BATCH_ROOT):
+    """
+    Resolve an API-supplied source relative to the batch root
+
+    Raises:
+        ValueError: the source is outside the root or does not exist
+    """
+    root = Path(root).resolve()
+    path = (root / source).resolve()
+    if not _is_inside(path, root):
+        raise ValueError("Batch source must be inside the batch root")
+    if not path.exists():
+        raise ValueError(f"Batch source '{source}' not found")
+    return path
+
+
+def analyze_recording(path, profile_name=DEFAULT_ANALYSIS_PROFILE):
+    """
+    Decode and featurize one recording with the same pipeline as /upload
+    (runs in a pool worker, so only the small result dict is sent back)
+
+    Returns:
+        Result record without 'issues' (scored in the parent), or with
+        'error' set when the file could not be analysed
+    """
+    start_time = time.time()
+    record = {'path': path}
+    try:
+        with open(path, 'rb') as f:
+            audio_bytes = f.read()
+
+        result = analyze_audio_bytes(
+            audio_bytes, profile_name, streaming=len(audio_bytes) > STREAMING_THRESHOLD_BYTES
+        )
+        record.update(result['features'], duration=result['duration'], **result['rhythm'])
+    except Exception as e:
+        stderr = getattr(e, 'stderr', None)
+        record['error'] = stderr.decode(errors='replace').strip() if stderr else str(e) or type(e).__name__
+
+    record['analysis_time'] = round(time.time() - start_time, 3)
+    return record
+
+
+class BatchWriter:
+    """Append result records to a JSONL or Parquet file in groups"""
+
+    def __init__(self, output, output_format=None):
+        """
+        Args:
+            output: Output path
+            output_format: 'jsonl' or 'parquet' (default: from the extension)
+        """
+        self.output = Path(output)
+        self.format = output_format or ('parquet' if self.output.suffix == '.parquet' else 'jsonl')
+        if self.format == 'parquet':
+            try:
+                import pyarrow.parquet  # imported on first use
+            except ImportError:
+                raise ValueError("Parquet output requires pyarrow (pip install pyarrow)")
+
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        self._file = None
+        self._writer = None
+
+    def write(self, records):
+        rows = [{field: record.get(field) for field in BATCH_FIELDS} for record in records]
+        if self.format == 'parquet':
+            import pyarrow.parquet
+            table = pyarrow.Table.from_pylist(rows, schema=self._schema())
+            if self._writer is None:
+                self._writer = pyarrow.parquet.ParquetWriter(self.output, table.schema)
+            self._writer.write_table(table)
+        else:
+            if self._file is None:
+                self._file = open(self.output, 'w', encoding='utf-8')
+            for row in rows:
+                self._file.write(json.dumps(row) + '\n')
+            self._file.flush()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    @staticmethod
+    def _schema():
+        import pyarrow
+        float_fields = [pyarrow.field(name, pyarrow.float64()) for name in BATCH_FIELDS[1:11]]
+        return pyarrow.schema(
+            [pyarrow.field('path', pyarrow.string())]
+            + float_fields
+            + [
+                pyarrow.field('issues', pyarrow.list_(pyarrow.string())),
+                pyarrow.field('error', pyarrow.string()),
+                pyarrow.field('analysis_time', pyarrow.float64()),
+            ]
+        )
+
+
+def run_batch(source, output, output_format=None, profile_name=DEFAULT_ANALYSIS_PROFILE,
+              max_workers=BATCH_WORKERS, progress=None, pool=None, root=None):
+    """
+    Analyse every recording in a directory or manifest on a process pool
+
+    At most two files per worker are in flight, and results are scored
+    with the current diagnostic rules and written out every
+    BATCH_FLUSH_SIZE records, so memory stays bounded for any archive size.
+
+    Args:
+        source: Directory or manifest (see collect_audio_paths)
+        output: JSONL or Parquet output path
+        output_format: 'jsonl' or 'parquet' (default: from the extension)
+        profile_name: Analysis profile (see ANALYSIS_PROFILES)
+        max_workers: Private pool size, or with pool, the most files in flight
+        progress: Optional callable receiving done=, total=, failed= keywords
+        pool: Shared AnalysisPool to run on (the API) instead of a private
+            process pool (the CLI); tasks go through its admission control
+        root: Reject recordings outside this directory (see collect_audio_paths)
+
+    Returns:
+        Summary dict (total, analysed, failed, issue counts, elapsed, output)
+    """
+    if profile_name not in ANALYSIS_PROFILES:
+        raise ValueError(f"Unknown analysis profile '{profile_name}'")
+
+    paths = collect_audio_paths(source, root=root)
+    total = len(paths)
+    logger.info(f"Batch analysis of {total} recordings with {max_workers} workers")
+
+    writer = BatchWriter(output, output_format)
+    start_time = time.time()
+    done = 0
+    failed = 0
+    issue_counts = {}
+    pending_records = []
+
+    def flush():
+        rule_engine.maybe_reload()
+        scored = [record for record in pending_records if 'error' not in record]
+        for record, issue_types in zip(scored, rule_engine.score_batch(scored)):
+            record['issues'] = issue_types
+            for issue_type in issue_types:
+                issue_counts[issue_type] = issue_counts.get(issue_type, 0) + 1
+        writer.write(pending_records)
+        pending_records.clear()
+
+    def analyse_all(submit, window):
+        nonlocal done, failed
+        remaining = iter(paths)
+        in_flight = set()
+        while True:
+            for path in remaining:
+                in_flight.add(submit(analyze_recording, path, profile_name))
+                if len(in_flight) >= window:
+                    break
+            if not in_flight:
+                break
+
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                if 'error' in record:
+                    failed += 1
+                    logger.warning(f"Batch: {record['path']} failed: {record['error']}")
+                pending_records.append(record)
+                done += 1
+
+            if len(pending_records) >= BATCH_FLUSH_SIZE:
+                flush()
+            if finished:
+                logger.info(f"Batch progress: {done}/{total} ({failed} failed)")
+                if progress is not None:
+                    progress(done=done, total=total, failed=failed)
+
+    try:
+        if pool is not None:
+            # Blocking submits wait for a free slot, so a batch queues behind
+            # /upload rather than adding workers or bypassing the admission limit
+            analyse_all(lambda fn, *args: pool.submit(fn, *args, block=True), max_workers)
+        else:
+            # spawn: the caller may be a threaded web worker, where fork is unsafe
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+                analyse_all(executor.submit, max_workers * 2)
+
+        if pending_records:
+            flush()
+    finally:
+        writer.close()
+
+    elapsed = time.time() - start_time
+    logger.info(f"Batch complete: {done - failed}/{total} analysed in {elapsed:.1f}s -> {output}")
+    return {
+        'total': total,
+        'analysed': done - failed,
+        'failed': failed,
+        'issue_counts': issue_counts,
+        'elapsed': round(elapsed, 2),
+        'output': str(output),
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Analyse an archive of recordings')
+    parser.add_argument('source', help='Directory of recordings or manifest file')
+    parser.add_argument('output', help='Output path (.jsonl or .parquet)')
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], help='Output format (default: from extension)')
+    parser.add_argument('--profile', default=DEFAULT_ANALYSIS_PROFILE, choices=sorted(ANALYSIS_PROFILES))
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help='Worker processes')
+    args = parser.parse_args()
+
+    summary = run_batch(args.source, args.output, args.format, args.profile, args.workers)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,360 @@
+# benchmark.py
+# Offline benchmark suite for the analysis and matching pipeline. Uses
+# synthetic engine-like signals only (no network, no recordings needed)
+# and writes machine-readable JSON so runs can be compared across commits.
+#
+#   python benchmark.py                         (full suite)
+#   python benchmark.py --quick                 (short clips, fewer references)
+#   python benchmark.py --only upload_pipeline --repeat 5
+#   python benchmark.py --compare benchmark_results/bench_<old>.json
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+
+# First local import: sets the numba cache dir before librosa loads
+from warmup import warm_up_pipeline
+import numpy as np
+import soundfile as sf
+
+BENCHMARK_OUTPUT_DIR = Path(os.environ.get('BENCHMARK_OUTPUT_DIR', './benchmark_results'))
+
+CLIP_DURATIONS = (1, 5, 15, 60)
+INPUT_SAMPLE_RATES = (16000, 22050, 44100)
+REFERENCE_COUNTS = (1, 10, 100, 1000, 10000)
+# find_best_audio_match decodes every reference file, so it gets smaller counts
+AUDIO_MATCH_REFERENCE_COUNTS = (1, 5, 10)
+
+QUICK_CLIP_DURATIONS = (1, 5)
+QUICK_INPUT_SAMPLE_RATES = (22050,)
+QUICK_REFERENCE_COUNTS = (1, 100, 10000)
+QUICK_AUDIO_MATCH_REFERENCE_COUNTS = (1, 5)
+
+# Median slow-down that --compare reports as a regression
+DEFAULT_TOLERANCE = 1.25
+
+
+def engine_signal(seconds, sr, rpm=850, cylinders=4, knock_hz=0.0, seed=0):
+    """
+    Synthetic engine recording: firing-frequency harmonics with cycle-to-cycle
+    amplitude jitter, broadband noise and an optional periodic knock
+
+    Args:
+        seconds: Clip length
+        sr: Sample rate
+        rpm: Engine speed (firing frequency = rpm / 60 * cylinders / 2)
+        cylinders: Cylinder count
+        knock_hz: Knock repetition rate (0 for none)
+        seed: Noise seed (same seed, same signal)
+
+    Returns:
+        float32 mono signal in [-1, 1]
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    firing_hz = rpm / 60.0 * cylinders / 2.0
+
+    signal = np.zeros_like(t)
+    for harmonic in range(1, 12):
+        phase = rng.uniform(0, 2 * np.pi)
+        signal += np.sin(2 * np.pi * firing_hz * harmonic * t + phase) / harmonic
+    signal *= 1.0 + 0.2 * np.sin(2 * np.pi * firing_hz / cylinders * t)
+    signal += 0.05 * rng.standard_normal(len(t))
+
+    if knock_hz > 0:
+        knock = (np.sin(2 * np.pi * knock_hz * t) > 0.98) * rng.standard_normal(len(t))
+        signal += 0.8 * knock
+
+    return (0.9 * signal / np.max(np.abs(signal))).astype(np.float32)
+
+
+def wav_bytes(y, sr):
+    buffer = io.BytesIO()
+    sf.write(buffer, y, sr, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+def measure(fn, repeat):
+    """
+    Run fn repeat times (after one untimed warm-up call), then once more
+    under tracemalloc for peak memory; tracing slows allocation-heavy code
+    several-fold, so it stays off while timing
+
+    Returns:
+        Tuple (timing stats dict, result of the last timed call, peak traced MB)
+    """
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    stats = {
+        'min': min(timings),
+        'median': float(np.median(timings)),
+        'mean': float(np.mean(timings)),
+        'max': max(timings),
+    }
+    return stats, result, peak / 1e6
+
+
+def max_rss_mb():
+    """
+    Process high-water mark RSS so far (ru_maxrss is KiB on Linux, bytes on
+    macOS); cumulative over the whole run, so it never drops between cases
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1e6 if sys.platform == 'darwin' else rss / 1e3
+
+
+def result_row(benchmark, params, stats, peak_traced_mb, **extra):
+    row = {
+        'benchmark': benchmark,
+        'params': params,
+        'seconds': {key: round(value, 6) for key, value in stats.items()},
+        'peak_traced_mb': round(peak_traced_mb, 2),
+        'cumulative_max_rss_mb': round(max_rss_mb(), 1),
+    }
+    row.update(extra)
+    print(f"  {benchmark:24} {json.dumps(params):48} median {stats['median'] * 1000:10.2f} ms"
+          f"  peak {peak_traced_mb:8.1f} MB")
+    return row
+
+
+def bench_upload_pipeline(config, repeat):
+    """Decode + features + rhythm + rules, as /upload runs them on a pool worker"""
+    from analysis_pool import analyze_audio_bytes
+    from diagnostic_rules import rule_engine
+
+    if shutil.which('ffmpeg') is None:
+        print("  upload_pipeline skipped: ffmpeg not on PATH")
+        return []
+
+    rows = []
+    for duration in config['durations']:
+        for input_sr in config['sample_rates']:
+            audio_bytes = wav_bytes(engine_signal(duration, input_sr, knock_hz=4.0), input_sr)
+            for streaming in (False, True):
+                def run():
+                    result = analyze_audio_bytes(audio_bytes, 'fast', streaming)
+                    features = dict(result['features'], duration=result['duration'])
+                    rules_start = time.perf_counter()
+                    rule_engine.diagnose(features)
+                    result['stages']['rules'] = time.perf_counter() - rules_start
+                    return result
+
+                stats, result, peak = measure(run, repeat)
+                stages = {stage: round(seconds, 6) for stage, seconds in result['stages'].items()}
+                rows.append(result_row(
+                    'upload_pipeline',
+                    {'duration': duration, 'input_sr': input_sr, 'streaming': streaming, 'bytes': len(audio_bytes)},
+                    stats, peak, stages=stages
+                ))
+    return rows
+
+
+def bench_extract_audio_features(config, repeat, workdir):
+    """extract_audio_features on fixture WAV files (reads at most 10 s)"""
+    from audio_matcher import extract_audio_features
+
+    rows = []
+    for duration in config['durations']:
+        for input_sr in config['sample_rates']:
+            path = workdir / f'clip_{duration}s_{input_sr}.wav'
+            sf.write(path, engine_signal(duration, input_sr, seed=duration), input_sr, subtype='PCM_16')
+            stats, _, peak = measure(lambda: extract_audio_features(str(path)), repeat)
+            rows.append(result_row(
+                'extract_audio_features', {'duration': duration, 'input_sr': input_sr}, stats, peak
+            ))
+    return rows
+
+
+def bench_find_best_audio_match(config, repeat, workdir):
+    """find_best_audio_match against N reference files (featurizes every file)"""
+    from audio_matcher import find_best_audio_match, extract_audio_features
+
+    user_path = workdir / 'user.wav'
+    sf.write(user_path, engine_signal(10, 22050, rpm=900, knock_hz=3.0, seed=1), 22050, subtype='PCM_16')
+    user_features = extract_audio_features(str(user_path))
+
+    max_count = max(config['audio_match_references'])
+    references = []
+    for i in range(max_count):
+        path = workdir / f'reference_{i}.wav'
+        sf.write(path, engine_signal(10, 22050, rpm=700 + 50 * i, seed=100 + i), 22050, subtype='PCM_16')
+        references.append(({'id': f'ref{i}', 'title': f'Reference {i}', 'channel': 'bench'}, path))
+
+    rows = []
+    for count in config['audio_match_references']:
+        stats, _, peak = measure(
+            lambda: find_best_audio_match(str(user_path), references[:count], user_features=user_features),
+            repeat
+        )
+        rows.append(result_row('find_best_audio_match', {'references': count}, stats, peak))
+    return rows
+
+
+def bench_reference_match(config, repeat):
+    """find_best_reference_match on precomputed fingerprints (the indexed path)"""
+    from audio_matcher import (
+        find_best_reference_match, fit_feature_scaling, DEFAULT_FEATURE_CENTER, DEFAULT_FEATURE_SCALE
+    )
+
+    rng = np.random.default_rng(0)
+    max_count = max(config['reference_counts'])
+    matrix = DEFAULT_FEATURE_CENTER + DEFAULT_FEATURE_SCALE * rng.standard_normal((max_count, len(DEFAULT_FEATURE_SCALE)))
+    user = matrix[0] + 0.1 * DEFAULT_FEATURE_SCALE * rng.standard_normal(len(DEFAULT_FEATURE_SCALE))
+    videos = [{'id': f'ref{i}', 'title': f'Reference {i}', 'channel': 'bench'} for i in range(max_count)]
+
+    rows = []
+    for count in config['reference_counts']:
+        references = list(zip(videos[:count], matrix[:count]))
+        scaling = fit_feature_scaling(matrix[:count])
+        stats, _, peak = measure(lambda: find_best_reference_match(user, references, scaling=scaling), repeat)
+        rows.append(result_row('find_best_reference_match', {'references': count}, stats, peak))
+    return rows
+
+
+BENCHMARKS = ('upload_pipeline', 'extract_audio_features', 'find_best_audio_match', 'find_best_reference_match')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment_info():
+    import librosa
+    import scipy
+
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'librosa': librosa.__version__,
+    }
+
+
+def run_suite(only=None, quick=False, repeat=3):
+    """
+    Run the selected benchmarks
+
+    Returns:
+        Dict with 'environment', 'config' and 'results' rows
+    """
+    config = {
+        'durations': QUICK_CLIP_DURATIONS if quick else CLIP_DURATIONS,
+        'sample_rates': QUICK_INPUT_SAMPLE_RATES if quick else INPUT_SAMPLE_RATES,
+        'reference_counts': QUICK_REFERENCE_COUNTS if quick else REFERENCE_COUNTS,
+        'audio_match_references': QUICK_AUDIO_MATCH_REFERENCE_COUNTS if quick else AUDIO_MATCH_REFERENCE_COUNTS,
+        'repeat': repeat,
+    }
+    selected = only or BENCHMARKS
+
+    # JIT compilation and lazy imports would otherwise land in the first case
+    warmup_seconds = warm_up_pipeline()
+    print(f"Warm-up: {warmup_seconds:.2f}s")
+
+    results = []
+    workdir = Path(tempfile.mkdtemp(prefix='autodecx_bench_'))
+    try:
+        for name in selected:
+            print(f"{name}:")
+            if name == 'upload_pipeline':
+                results += bench_upload_pipeline(config, repeat)
+            elif name == 'extract_audio_features':
+                results += bench_extract_audio_features(config, repeat, workdir)
+            elif name == 'find_best_audio_match':
+                results += bench_find_best_audio_match(config, repeat, workdir)
+            elif name == 'find_best_reference_match':
+                results += bench_reference_match(config, repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'environment': environment_info(),
+        'config': {key: list(value) if isinstance(value, tuple) else value for key, value in config.items()},
+        'results': results,
+    }
+
+
+def case_key(row):
+    return row['benchmark'], json.dumps(row['params'], sort_keys=True)
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare median timings against a baseline report
+
+    Returns:
+        List of regression messages (median slower than baseline * tolerance)
+    """
+    baseline_rows = {case_key(row): row for row in baseline['results']}
+    regressions = []
+    print(f"\nCompared with {baseline['environment'].get('commit')} (tolerance x{tolerance}):")
+    for row in report['results']:
+        old = baseline_rows.get(case_key(row))
+        if old is None:
+            continue
+        ratio = row['seconds']['median'] / max(old['seconds']['median'], 1e-9)
+        flag = 'REGRESSION' if ratio > tolerance else ''
+        print(f"  {row['benchmark']:24} {json.dumps(row['params']):48} x{ratio:6.2f} {flag}")
+        if ratio > tolerance:
+            regressions.append(f"{row['benchmark']} {json.dumps(row['params'])}: x{ratio:.2f}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the audio analysis pipeline')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help='Benchmarks to run (default: all)')
+    parser.add_argument('--quick', action='store_true', help='Short clips and fewer references')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per case')
+    parser.add_argument('--output', help='JSON output path (default: benchmark_results/bench_<commit>_<time>.json)')
+    parser.add_argument('--compare', help='Baseline JSON report to compare medians against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Slow-down ratio treated as a regression')
+    args = parser.parse_args()
+
+    report = run_suite(only=args.only, quick=args.quick, repeat=args.repeat)
+
+    output = Path(args.output) if args.output else BENCHMARK_OUTPUT_DIR / (
+        f"bench_{report['environment']['commit'] or 'unknown'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(report['results'])} results to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print('\n'.join(regressions))
+            sys.exit(1)
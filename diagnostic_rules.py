@@ -0,0 +1,380 @@
+# diagnostic_rules.py
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Optional JSON rule table replacing DEFAULT_RULES (reloaded when it changes)
+DIAGNOSTIC_RULES_PATH = os.environ.get('DIAGNOSTIC_RULES_PATH')
+RULES_RELOAD_INTERVAL = int(os.environ.get('DIAGNOSTIC_RULES_RELOAD_INTERVAL', 10))
+
+# Order of the columns in a feature matrix
+RULE_FEATURES = ('rms', 'spectral_centroid', 'zero_crossing_rate', 'spectral_bandwidth', 'duration')
+
+# Response metric names accepted in place of the feature names
+FEATURE_ALIASES = {
+    'dominant_frequency': 'spectral_centroid',
+    'vibration_level': 'rms',
+}
+
+OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+}
+
+SEVERITIES = ('info', 'warning', 'error')
+
+# Rules are evaluated in table order. Within a group only the first matching
+# rule fires (an if/elif chain); rules without a group are independent.
+# "when" conditions are ANDed: [feature, operator, threshold].
+DEFAULT_RULES = {
+    'groups': {
+        'vibration': 'Vibration level',
+        'frequency': 'Frequency range',
+        'pattern': 'Pattern regularity',
+        'spread': 'Frequency spread',
+        'duration': 'Recording length',
+    },
+    'rules': [
+        {'type': 'critical_vibration', 'severity': 'error', 'group': 'vibration',
+         'when': [['rms', '>', 0.20]], 'label': 'Very high vibration',
+         'message': 'Critical vibration levels detected - immediate inspection recommended'},
+        {'type': 'high_vibration', 'severity': 'warning', 'group': 'vibration',
+         'when': [['rms', '>', 0.15]], 'label': 'High vibration',
+         'message': 'Elevated vibration levels - check engine mounts or bearings'},
+        {'type': 'low_signal', 'severity': 'info', 'group': 'vibration',
+         'when': [['rms', '<', 0.01]], 'label': 'Low signal strength',
+         'message': 'Very low signal - move microphone closer to sound source'},
+
+        {'type': 'critical_high_frequency', 'severity': 'error', 'group': 'frequency',
+         'when': [['spectral_centroid', '>', 6000]], 'label': 'Extremely high frequency',
+         'message': 'Critical high-frequency noise - likely bearing failure or severe wear'},
+        {'type': 'very_high_frequency', 'severity': 'warning', 'group': 'frequency',
+         'when': [['spectral_centroid', '>', 5000]], 'label': 'Very high frequency',
+         'message': 'Very high-frequency noise - possible bearing wear or air leak'},
+        {'type': 'high_frequency_noise', 'severity': 'info', 'group': 'frequency',
+         'when': [['spectral_centroid', '>', 3000]], 'label': 'High frequency detected',
+         'message': 'High-frequency noise - possible belt squeal or pulley issue'},
+        # Checked before the < 500 rumble rule so it can actually fire
+        {'type': 'very_low_frequency', 'severity': 'warning', 'group': 'frequency',
+         'when': [['spectral_centroid', '<', 300]], 'label': 'Very low frequency',
+         'message': 'Very low-frequency noise - possible structural or mounting issue'},
+        {'type': 'low_frequency_rumble', 'severity': 'info', 'group': 'frequency',
+         'when': [['spectral_centroid', '<', 500]], 'label': 'Low frequency rumble',
+         'message': 'Low-frequency rumble - possible exhaust or suspension issue'},
+
+        {'type': 'critical_irregular', 'severity': 'error', 'group': 'pattern',
+         'when': [['zero_crossing_rate', '>', 0.30]], 'label': 'Highly irregular pattern',
+         'message': 'Critical irregular pattern - possible severe misfire or mechanical failure'},
+        {'type': 'highly_irregular', 'severity': 'warning', 'group': 'pattern',
+         'when': [['zero_crossing_rate', '>', 0.25]], 'label': 'Irregular pattern',
+         'message': 'Highly irregular pattern - possible misfire or timing issue'},
+        {'type': 'irregular_pattern', 'severity': 'info', 'group': 'pattern',
+         'when': [['zero_crossing_rate', '>', 0.20]], 'label': 'Slight irregularity',
+         'message': 'Irregular acoustic pattern - monitor for changes'},
+        {'type': 'very_smooth_pattern', 'severity': 'info', 'group': 'pattern',
+         'when': [['zero_crossing_rate', '<', 0.05]], 'label': 'Very smooth pattern',
+         'message': 'Very smooth pattern - consider if this is expected for the test'},
+
+        {'type': 'wide_frequency_spread', 'severity': 'warning', 'group': 'spread',
+         'when': [['spectral_bandwidth', '>', 3000]], 'label': 'Wide frequency spread',
+         'message': 'Wide frequency spread - possible multiple simultaneous issues'},
+        {'type': 'narrow_frequency', 'severity': 'info', 'group': 'spread',
+         'when': [['spectral_bandwidth', '<', 500]], 'label': 'Narrow frequency band',
+         'message': 'Narrow frequency band - single dominant sound source'},
+
+        {'type': 'vibration_and_high_freq', 'severity': 'error',
+         'when': [['rms', '>', 0.15], ['spectral_centroid', '>', 4000]],
+         'label': 'Combined vibration and frequency issue',
+         'message': 'High vibration with high-frequency noise - critical bearing or pulley wear'},
+        {'type': 'vibration_and_irregular', 'severity': 'warning',
+         'when': [['rms', '>', 0.15], ['zero_crossing_rate', '>', 0.20]],
+         'label': 'Combined vibration and irregularity',
+         'message': 'High vibration with irregular pattern - possible engine mount or timing issue'},
+        {'type': 'low_freq_high_energy', 'severity': 'warning',
+         'when': [['spectral_centroid', '<', 800], ['rms', '>', 0.10]],
+         'label': 'Low-frequency high-energy',
+         'message': 'Low-frequency high-energy noise - possible exhaust or structural issue'},
+
+        {'type': 'short_recording', 'severity': 'info', 'group': 'duration',
+         'when': [['duration', '<', 3]], 'label': 'Short recording duration',
+         'message': 'Recording too short for reliable analysis - recommend 5-10 seconds'},
+        {'type': 'long_recording', 'severity': 'info', 'group': 'duration',
+         'when': [['duration', '>', 15]], 'label': 'Long recording',
+         'message': 'Long recording detected - using average values'},
+    ],
+}
+
+
+def compile_rules(table):
+    """
+    Compile a rule table into threshold arrays for vectorized evaluation
+
+    Args:
+        table: Dict with 'rules' (and optional 'groups'), see DEFAULT_RULES
+
+    Returns:
+        Dict of compiled arrays plus the validated rule list
+
+    Raises:
+        ValueError: unknown feature, operator or severity in the table
+    """
+    rules = table['rules']
+    if not rules:
+        raise ValueError("Rule table has no rules")
+
+    # One column per condition: which feature, which threshold, which rule
+    by_operator = {op: ([], [], []) for op in OPERATORS}
+    n_conditions = 0
+    for rule_index, rule in enumerate(rules):
+        if rule.get('severity') not in SEVERITIES:
+            raise ValueError(f"Rule {rule.get('type')!r}: unknown severity {rule.get('severity')!r}")
+        if not rule.get('when'):
+            raise ValueError(f"Rule {rule.get('type')!r} has no conditions")
+        for feature, op, threshold in rule['when']:
+            feature = FEATURE_ALIASES.get(feature, feature)
+            if feature not in RULE_FEATURES:
+                raise ValueError(f"Rule {rule['type']!r}: unknown feature {feature!r}")
+            if op not in OPERATORS:
+                raise ValueError(f"Rule {rule['type']!r}: unknown operator {op!r}")
+            columns, thresholds, owners = by_operator[op]
+            columns.append(RULE_FEATURES.index(feature))
+            thresholds.append(float(threshold))
+            owners.append(rule_index)
+            n_conditions += 1
+
+    # Condition -> rule incidence, so "all conditions hold" is one matmul
+    incidence = np.zeros((n_conditions, len(rules)), dtype=np.int32)
+    operators = []
+    offset = 0
+    for op, (columns, thresholds, owners) in by_operator.items():
+        if not columns:
+            continue
+        incidence[np.arange(offset, offset + len(owners)), owners] = 1
+        operators.append((OPERATORS[op], np.asarray(columns), np.asarray(thresholds)))
+        offset += len(owners)
+
+    group_names = []
+    for rule in rules:
+        group = rule.get('group')
+        if group is not None and group not in group_names:
+            group_names.append(group)
+    groups = {
+        name: np.asarray([i for i, rule in enumerate(rules) if rule.get('group') == name])
+        for name in group_names
+    }
+
+    return {
+        'rules': rules,
+        # Content hash of the table, so cached diagnoses can be tied to the rules that made them
+        'version': hashlib.sha256(json.dumps(table, sort_keys=True).encode()).hexdigest()[:16],
+        'group_labels': dict(table.get('groups', {})),
+        'operators': operators,
+        'incidence': incidence,
+        'groups': groups,
+    }
+
+
+def features_to_matrix(records):
+    """
+    Stack feature dicts into an (n, len(RULE_FEATURES)) matrix
+
+    Accepts raw feature dicts or /upload response metrics (aliased names).
+    Missing features are NaN, which never satisfies a condition.
+    """
+    matrix = np.full((len(records), len(RULE_FEATURES)), np.nan)
+    for row, record in enumerate(records):
+        for key, value in record.items():
+            key = FEATURE_ALIASES.get(key, key)
+            if key in RULE_FEATURES and value is not None:
+                matrix[row, RULE_FEATURES.index(key)] = value
+    return matrix
+
+
+class RuleEngine:
+    """
+    Declarative diagnostic rules evaluated as NumPy threshold masks
+
+    A single clip and a batch of historical clips go through the same
+    code path: every condition of every rule is compared against the whole
+    feature matrix at once. The compiled table is swapped in atomically,
+    so a reload never disturbs concurrent evaluations.
+    """
+
+    def __init__(self, table=None, path=None, reload_interval=RULES_RELOAD_INTERVAL):
+        """
+        Args:
+            table: Rule table (defaults to DEFAULT_RULES)
+            path: Optional JSON rule table; replaces table when present
+            reload_interval: Seconds between checks of path for changes
+        """
+        self.path = path
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._loaded_mtime = None
+        self._last_check = 0.0
+        self._compiled = compile_rules(table or DEFAULT_RULES)
+
+        if path:
+            try:
+                self.load_json(path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.error(f"Failed to load diagnostic rules {path}: {str(e)}")
+
+    @property
+    def rules(self):
+        return self._compiled['rules']
+
+    @property
+    def version(self):
+        return self._compiled['version']
+
+    def load(self, table):
+        """Compile and swap in a new rule table"""
+        self._compiled = compile_rules(table)
+        logger.info(f"Diagnostic rules loaded: {len(table['rules'])} rules")
+
+    def load_json(self, path):
+        """Load a rule table from a JSON file"""
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        self.load(table)
+        self.path = path
+        self._loaded_mtime = os.path.getmtime(path)
+
+    def maybe_reload(self):
+        """Reload the JSON rule table if it changed on disk (checked at most every reload_interval)"""
+        if not self.path or time.time() - self._last_check < self.reload_interval:
+            return
+
+        with self._reload_lock:
+            self._last_check = time.time()
+            try:
+                if os.path.getmtime(self.path) != self._loaded_mtime:
+                    self.load_json(self.path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Keep serving the previous rules
+                logger.error(f"Diagnostic rules reload failed: {str(e)}")
+
+    def evaluate(self, matrix, compiled=None):
+        """
+        Evaluate all rules over a feature matrix
+
+        Args:
+            matrix: (n, len(RULE_FEATURES)) array, one row per clip
+
+        Returns:
+            (n, n_rules) boolean array of fired rules
+        """
+        compiled = compiled or self._compiled
+        matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+
+        holds = np.hstack([
+            op(matrix[:, columns], thresholds)
+            for op, columns, thresholds in compiled['operators']
+        ])
+        failed = (~holds).astype(np.int32)
+        fired = (failed @ compiled['incidence']) == 0
+
+        # if/elif semantics: only the first matching rule of a group fires
+        for members in compiled['groups'].values():
+            hits = fired[:, members]
+            fired[:, members] = hits & (np.cumsum(hits, axis=1) == 1)
+
+        return fired
+
+    def diagnose(self, features):
+        """
+        Issues for one clip
+
+        Args:
+            features: Dict of feature values (RULE_FEATURES or metric names)
+
+        Returns:
+            List of issue dicts (type, severity, message), the fired
+            rules themselves, and the labels of groups where nothing fired
+        """
+        compiled = self._compiled
+        fired = self.evaluate(features_to_matrix([features]), compiled)[0]
+        rules = [rule for rule, hit in zip(compiled['rules'], fired) if hit]
+        quiet_groups = [
+            compiled['group_labels'].get(name, name)
+            for name, members in compiled['groups'].items()
+            if not fired[members].any()
+        ]
+        issues = [
+            {'type': rule['type'], 'severity': rule['severity'], 'message': rule['message']}
+            for rule in rules
+        ]
+        return issues, rules, quiet_groups
+
+    def score_batch(self, records):
+        """
+        Re-score many clips against the current rules in one pass
+
+        Args:
+            records: List of feature dicts (or /upload response metrics)
+
+        Returns:
+            List of lists of fired issue types, one per record
+        """
+        compiled = self._compiled
+        fired = self.evaluate(features_to_matrix(records), compiled)
+        types = np.asarray([rule['type'] for rule in compiled['rules']])
+        return [types[row].tolist() for row in fired]
+
+
+# Process-wide engine used by the app
+rule_engine = RuleEngine(path=DIAGNOSTIC_RULES_PATH)
+
+
+if __name__ == '__main__':
+    import argparse
+    from collections import Counter
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Export the rule table or re-score historical clips')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Write the default rule table as JSON')
+    export_parser.add_argument('output', help='Output JSON path')
+
+    rescore_parser = subparsers.add_parser('rescore', help='Re-score a JSONL file of feature records')
+    rescore_parser.add_argument('records', help='JSONL file; each line a feature dict or an /upload response')
+    rescore_parser.add_argument('--rules', help='JSON rule table (defaults to the built-in rules)')
+    rescore_parser.add_argument('--output', help='Write per-record issue types as JSONL')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(DEFAULT_RULES, f, indent=2)
+    else:
+        records = []
+        with open(args.records, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records.append(record.get('metrics', record))
+
+        engine = RuleEngine(path=args.rules) if args.rules else RuleEngine()
+        start_time = time.time()
+        results = engine.score_batch(records)
+        elapsed = time.time() - start_time
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                for types in results:
+                    f.write(json.dumps(types) + '\n')
+
+        counts = Counter(issue_type for types in results for issue_type in types)
+        print(f"Scored {len(records)} records in {elapsed * 1000:.1f} ms")
+        for issue_type, count in counts.most_common():
+            print(f"  {issue_type}: {count}")
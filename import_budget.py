@@ -0,0 +1,80 @@
+# import_budget.py
+# Import-time budget check: each entry point is imported in a fresh
+# interpreter and must load within its budget without pulling in heavy
+# dependencies that are only needed on first use.
+#
+#   python import_budget.py    (exit status 1 if any budget is blown)
+import os
+import sys
+import json
+import subprocess
+
+# Seconds allowed for a cold import of each entry point
+IMPORT_BUDGETS = {
+    'vehicle_catalog': 0.5,
+    'vehicle_api': 0.75,
+    'diagnostic_rules': 0.5,
+    'match_jobs': 0.5,
+    'batch_analysis': 0.75,
+    'reference_index': 0.75,
+    'reference_library': 0.5,
+    'app': 1.0,
+}
+
+# Heavy modules that must never load at import time: yt_dlp is imported on
+# first download, librosa (with numba and scipy) on first analysis or warm-up
+# (disabled for the probe), pyarrow on the first Parquet batch, and sklearn is
+# no longer used and must not creep back in
+LAZY_MODULES = ('yt_dlp', 'librosa', 'numba', 'scipy', 'sklearn', 'pyarrow')
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}), flush=True)
+"""
+
+
+def measure_import(module):
+    """
+    Returns:
+        Dict with 'elapsed' seconds and the lazy modules that got 'loaded'
+    """
+    env = dict(os.environ, WARMUP_ENABLED='0', PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(
+        [sys.executable, '-c', _PROBE.format(module=module, lazy=LAZY_MODULES)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check_budgets(budgets=IMPORT_BUDGETS):
+    """
+    Returns:
+        List of failure messages (empty when every module is within budget)
+    """
+    failures = []
+    for module, budget in budgets.items():
+        measured = measure_import(module)
+        status = 'ok' if measured['elapsed'] <= budget and not measured['loaded'] else 'FAIL'
+        print(f"{status:4} {module:18} {measured['elapsed']:.3f}s (budget {budget:.2f}s)"
+              + (f" loaded {', '.join(measured['loaded'])}" if measured['loaded'] else ''))
+        if measured['elapsed'] > budget:
+            failures.append(f"{module} took {measured['elapsed']:.3f}s (budget {budget:.2f}s)")
+        if measured['loaded']:
+            failures.append(f"{module} eagerly imports {', '.join(measured['loaded'])}")
+    return failures
+
+
+if __name__ == '__main__':
+    failures = check_budgets()
+    if failures:
+        print('\n'.join(failures))
+        sys.exit(1)
@@ -0,0 +1,197 @@
+# live_analysis.py
+import os
+import time
+import uuid
+import threading
+import subprocess
+import logging
+import numpy as np
+from audio_features import ANALYSIS_SR, ffmpeg_decode_command
+from audio_streaming import StreamingAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Sessions with no chunk for this long are aborted
+LIVE_SESSION_IDLE_TIMEOUT = int(os.environ.get('LIVE_SESSION_IDLE_TIMEOUT', 60))
+# Hard cap on concurrent live sessions per worker process
+LIVE_MAX_SESSIONS = int(os.environ.get('LIVE_MAX_SESSIONS', 32))
+# Seconds to wait for ffmpeg to drain after the last chunk
+LIVE_FINISH_TIMEOUT = 15
+# Samples the reader pulls from ffmpeg at a time (small, for low latency)
+LIVE_READ_SIZE = 4096
+
+
+class LiveAnalysisSession:
+    """
+    Incremental analysis of a recording that is still being uploaded
+
+    Encoded chunks (e.g. MediaRecorder webm slices) are written to a
+    long-running ffmpeg process; a reader thread feeds the decoded PCM into
+    a StreamingAnalyzer, so aggregates are current after every chunk and
+    the final result is ready as soon as the last chunk is decoded.
+    """
+
+    def __init__(self, sr=ANALYSIS_SR, vehicle_info=None):
+        """
+        Args:
+            sr: Analysis sample rate
+            vehicle_info: Vehicle details to use for reference matching on finish
+        """
+        self.session_id = uuid.uuid4().hex
+        self.sr = sr
+        self.vehicle_info = vehicle_info
+        self.analyzer = StreamingAnalyzer(sr=sr)
+        self.last_activity = time.monotonic()
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._stderr = b''
+
+        self.process = subprocess.Popen(
+            ffmpeg_decode_command(sr, low_latency=True),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self._reader = threading.Thread(target=self._read_pcm, name='live-pcm-reader', daemon=True)
+        self._stderr_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._reader.start()
+        self._stderr_reader.start()
+
+    def _read_pcm(self):
+        # read1 returns whatever ffmpeg has produced so far instead of
+        # blocking for a full buffer, so snapshots stay current
+        pending = b''
+        while True:
+            chunk = self.process.stdout.read1(LIVE_READ_SIZE * 4)
+            if not chunk:
+                break
+            pending += chunk
+            usable = len(pending) - len(pending) % 4
+            if usable:
+                block = np.frombuffer(pending[:usable], dtype=np.float32)
+                pending = pending[usable:]
+                with self._lock:
+                    self.analyzer.update(block)
+
+    def _read_stderr(self):
+        self._stderr = self.process.stderr.read()
+
+    def feed(self, chunk):
+        """
+        Write one encoded chunk to the decoder
+
+        Raises:
+            BrokenPipeError: the decoder has exited (invalid stream)
+        """
+        self.last_activity = time.monotonic()
+        self.bytes_received += len(chunk)
+        self.process.stdin.write(chunk)
+        self.process.stdin.flush()
+
+    def snapshot(self):
+        """Provisional aggregates over the audio decoded so far"""
+        with self._lock:
+            return self.analyzer.snapshot()
+
+    def finish(self, timeout=LIVE_FINISH_TIMEOUT):
+        """
+        Close the input, wait for the decoder to drain and return final features
+
+        Returns:
+            Dict from StreamingAnalyzer.finalize
+
+        Raises:
+            subprocess.CalledProcessError: ffmpeg could not decode the stream
+            subprocess.TimeoutExpired: the decoder did not drain within timeout
+        """
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+        command = ffmpeg_decode_command(self.sr, low_latency=True)
+        try:
+            returncode = self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.abort()
+            raise
+
+        self._reader.join(timeout=timeout)
+        self._stderr_reader.join(timeout=1)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command, stderr=self._stderr)
+
+        with self._lock:
+            return self.analyzer.finalize()
+
+    def abort(self):
+        """Kill the decoder and drop the session's state"""
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+
+class LiveSessionRegistry:
+    """
+    Per-process registry of live analysis sessions
+
+    Sessions live in the worker that created them, so chunked uploads need
+    a single worker process (threads are fine) or sticky routing.
+    """
+
+    def __init__(self, idle_timeout=LIVE_SESSION_IDLE_TIMEOUT, max_sessions=LIVE_MAX_SESSIONS):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._reaper = None
+
+    def create(self, vehicle_info=None):
+        """
+        Returns:
+            New LiveAnalysisSession, or None if the registry is full
+        """
+        self.purge_idle()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                return None
+            session = LiveAnalysisSession(vehicle_info=vehicle_info)
+            self._sessions[session.session_id] = session
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name='live-session-reaper', daemon=True)
+                self._reaper.start()
+        logger.info(f"Live session {session.session_id} started")
+        return session
+
+    def _reap(self):
+        # Abandoned sessions hold an ffmpeg process and a reader thread,
+        # so they are aborted on a timer rather than on the next create()
+        while True:
+            time.sleep(max(1, self.idle_timeout / 4))
+            try:
+                self.purge_idle()
+            except Exception as e:
+                logger.error(f"Live session purge failed: {str(e)}")
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        self.purge_idle()
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id):
+        self.purge_idle()
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def purge_idle(self):
+        """Abort sessions that stopped sending chunks"""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [sid for sid, session in self._sessions.items() if session.last_activity < cutoff]
+            sessions = [self._sessions.pop(sid) for sid in idle]
+        for session in sessions:
+            logger.warning(f"Live session {session.session_id} idle, aborting")
+            session.abort()
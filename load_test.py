@@ -0,0 +1,430 @@
+# load_test.py
+# Load-test harness: runs the Flask app in-process with the live services
+# replaced by local stand-ins (a fake NHTSA vPIC HTTP server and a fake
+# yt_dlp module serving fixture WAVs, both with configurable latency and
+# failure rates) and drives it with N concurrent clients.
+#
+#   python load_test.py --clients 8 --duration 60
+#   python load_test.py --clients 16 --requests 500 --mix upload=1 --repeat-ratio 0.5
+#   python load_test.py --yt-download-latency 2.0 --yt-failure-rate 0.1 --output load.json
+#
+# Needs ffmpeg on PATH (uploads are decoded exactly as in production).
+import os
+import sys
+import json
+import time
+import types
+import random
+import shutil
+import hashlib
+import logging
+import tempfile
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+# Default request mix (relative weights)
+DEFAULT_MIX = 'upload=4,poll=2,vehicle_models=3,health=1'
+
+# Makes the catalog may answer locally plus made-up ones that always reach vPIC
+LOAD_TEST_MAKES = ('Toyota', 'Honda', 'Ford', 'BMW', 'Acme', 'Zephyr', 'Kestrel', 'Orbit')
+LOAD_TEST_MODELS = ('Alpha', 'Bravo', 'Charlie', 'Delta')
+LOAD_TEST_LOCATIONS = ('engine', 'brakes', 'suspension', 'exhaust')
+LOAD_TEST_YEARS = tuple(str(year) for year in range(1995, 2025))
+
+
+class FakeVpicHandler(BaseHTTPRequestHandler):
+    """GetModelsForMakeYear stand-in; latency and failure rate are set on the server"""
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        if random.random() < server.failure_rate:
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        # .../GetModelsForMakeYear/make/<make>/modelyear/<year>?format=json
+        parts = self.path.split('?')[0].strip('/').split('/')
+        make = parts[-3] if len(parts) >= 4 else 'Unknown'
+        seed = int(hashlib.sha256(self.path.encode()).hexdigest()[:8], 16)
+        count = 3 + seed % 8
+        body = json.dumps({
+            'Count': count,
+            'Results': [{'Make_Name': make, 'Model_Name': f'{make} Model {i}'} for i in range(count)],
+        }).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_vpic(latency=0.05, failure_rate=0.0):
+    """
+    Start the fake vPIC server on a free local port
+
+    Returns:
+        The server (base URL in server.base_url; call shutdown() to stop)
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeVpicHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.base_url = f"http://127.0.0.1:{server.server_port}/api/vehicles"
+    threading.Thread(target=server.serve_forever, daemon=True, name='fake-vpic').start()
+    return server
+
+
+class FakeDownloadError(Exception):
+    """Raised by the fake YoutubeDL like yt_dlp.utils.DownloadError"""
+
+
+def make_fake_yt_dlp(fixtures, search_latency=0.3, download_latency=1.0, failure_rate=0.0):
+    """
+    Build a stand-in for the yt_dlp module
+
+    Searches return deterministic entries per query; downloads copy one of
+    the fixture WAVs to the requested output template. Both sleep for the
+    configured latency and fail with probability failure_rate.
+
+    Args:
+        fixtures: Paths of WAV files to serve
+        search_latency: Seconds per search
+        download_latency: Seconds per download
+        failure_rate: Probability that a search or download raises
+
+    Returns:
+        Module object to install as sys.modules['yt_dlp']
+    """
+    module = types.ModuleType('yt_dlp')
+    module.utils = types.SimpleNamespace(DownloadError=FakeDownloadError)
+    module.calls = defaultdict(int)
+
+    class YoutubeDL:
+        def __init__(self, opts=None):
+            self.opts = opts or {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, tb):
+            return False
+
+        def extract_info(self, url, download=False):
+            if url.startswith('ytsearch'):
+                module.calls['search'] += 1
+                time.sleep(search_latency)
+                if random.random() < failure_rate:
+                    raise FakeDownloadError(f"fake search failure: {url}")
+                count_text, query = url[len('ytsearch'):].split(':', 1)
+                digest = hashlib.sha256(query.encode()).hexdigest()
+                return {'entries': [
+                    {
+                        'id': f'fake{digest[:8]}{i}',
+                        'title': f'{query} #{i} ({("belt squeal", "bearing noise", "exhaust leak")[i % 3]})',
+                        'channel': 'Fake Mechanic',
+                        'duration': 60 + 10 * i,
+                        'view_count': 1000 * (i + 1),
+                    }
+                    for i in range(min(int(count_text or 1), 5))
+                ]}
+
+            module.calls['download'] += 1
+            time.sleep(download_latency)
+            if random.random() < failure_rate:
+                raise FakeDownloadError(f"fake download failure: {url}")
+            video_id = url.rsplit('=', 1)[-1]
+            fixture = fixtures[int(hashlib.sha256(video_id.encode()).hexdigest()[:8], 16) % len(fixtures)]
+            target = self.opts['outtmpl'] % {'id': video_id, 'ext': 'wav'}
+            shutil.copyfile(fixture, target)
+            return {'id': video_id}
+
+    module.YoutubeDL = YoutubeDL
+    return module
+
+
+def write_fixtures(directory, count=6, seconds=12, sr=22050):
+    """Synthetic reference WAVs for the fake YouTube backend"""
+    import soundfile as sf
+    from benchmark import engine_signal
+
+    paths = []
+    for i in range(count):
+        path = Path(directory) / f'fixture_{i}.wav'
+        sf.write(path, engine_signal(seconds, sr, rpm=700 + 150 * i, knock_hz=i % 3, seed=i), sr, subtype='PCM_16')
+        paths.append(str(path))
+    return paths
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {'upload', 'poll', 'vehicle_models', 'health'}
+    if unknown:
+        raise ValueError(f"Unknown endpoints in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+class LoadClient:
+    """One simulated client: picks endpoints from the mix until told to stop"""
+
+    def __init__(self, base_url, mix, clips, repeat_ratio, results, job_ids, seed):
+        import requests
+
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.endpoints = list(mix)
+        self.weights = np.array([mix[name] for name in self.endpoints]) / sum(mix.values())
+        self.clips = clips
+        self.repeat_ratio = repeat_ratio
+        self.results = results
+        self.job_ids = job_ids
+        self.rng = random.Random(seed)
+
+    def record(self, endpoint, seconds, status):
+        self.results.append((endpoint, seconds, status))
+
+    def upload_body(self):
+        # Repeated clips exercise the result cache; fresh ones get a unique byte tail
+        # (the cache key covers the vehicle info too, so a repeat resends both)
+        index = self.rng.randrange(len(self.clips))
+        clip = self.clips[index]
+        if self.rng.random() >= self.repeat_ratio:
+            clip = clip[:-4] + self.rng.randbytes(4)
+        vehicle_info = {
+            'manufacturer': LOAD_TEST_MAKES[index % len(LOAD_TEST_MAKES)],
+            'year': LOAD_TEST_YEARS[index * 3 % len(LOAD_TEST_YEARS)],
+            'model': LOAD_TEST_MODELS[index % len(LOAD_TEST_MODELS)],
+            'soundLocation': LOAD_TEST_LOCATIONS[index % len(LOAD_TEST_LOCATIONS)],
+        }
+        return clip, vehicle_info
+
+    def request_once(self):
+        endpoint = self.endpoints[self.rng.choices(range(len(self.endpoints)), weights=self.weights)[0]]
+        if endpoint == 'poll' and not self.job_ids:
+            endpoint = 'health'
+
+        start = time.perf_counter()
+        try:
+            if endpoint == 'upload':
+                clip, vehicle_info = self.upload_body()
+                response = self.session.post(
+                    f'{self.base_url}/upload',
+                    files={'audio': ('load.wav', clip, 'audio/wav')},
+                    data={'vehicle_info': json.dumps(vehicle_info)},
+                    timeout=120
+                )
+                if response.status_code == 200 and response.json().get('job_id'):
+                    self.job_ids.append(response.json()['job_id'])
+            elif endpoint == 'poll':
+                response = self.session.get(f'{self.base_url}/upload/jobs/{self.rng.choice(self.job_ids)}', timeout=30)
+            elif endpoint == 'vehicle_models':
+                response = self.session.get(f'{self.base_url}/api/vehicle-models', params={
+                    'manufacturer': self.rng.choice(LOAD_TEST_MAKES), 'year': self.rng.choice(LOAD_TEST_YEARS)
+                }, timeout=30)
+            else:
+                response = self.session.get(f'{self.base_url}/', timeout=30)
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        self.record(endpoint, time.perf_counter() - start, status)
+
+    def run(self, stop_event, request_budget):
+        while not stop_event.is_set() and request_budget.take():
+            self.request_once()
+
+
+class RequestBudget:
+    """Shared countdown of requests (None = unlimited)"""
+
+    def __init__(self, total):
+        self.remaining = total
+        self._lock = threading.Lock()
+
+    def take(self):
+        if self.remaining is None:
+            return True
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+def summarize(results, elapsed):
+    """
+    Per-endpoint throughput, latency percentiles and error rates
+
+    Errors are exceptions and 5xx responses other than 503; 503s are load
+    shedding by the analysis pool and reported separately.
+    """
+    by_endpoint = defaultdict(list)
+    for endpoint, seconds, status in results:
+        by_endpoint[endpoint].append((seconds, status))
+
+    summary = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        latencies = np.array([seconds for seconds, _ in rows]) * 1000
+        statuses = defaultdict(int)
+        for _, status in rows:
+            statuses[str(status)] += 1
+        errors = sum(
+            count for status, count in statuses.items()
+            if not status.isdigit() or (int(status) >= 500 and status != '503')
+        )
+        summary[endpoint] = {
+            'requests': len(rows),
+            'throughput_rps': round(len(rows) / elapsed, 2),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+            'max_ms': round(float(latencies.max()), 1),
+            'error_rate': round(errors / len(rows), 4),
+            'shed_rate': round(statuses.get('503', 0) / len(rows), 4),
+            'statuses': dict(statuses),
+        }
+    return summary
+
+
+def run_load_test(args):
+    """Start the stand-ins and the app, run the clients, return the report"""
+    if shutil.which('ffmpeg') is None:
+        raise SystemExit("ffmpeg is required on PATH (uploads are decoded as in production)")
+
+    repo_dir = Path(__file__).resolve().parent
+    # Absolute, so imports (here and in spawned pool workers) survive the chdir below
+    sys.path.insert(0, str(repo_dir))
+    # Read at import time by log_config, so set before anything from the app is imported
+    os.environ.setdefault('REQUEST_LOG_SAMPLE_RATE', '0')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='autodecx_load_'))
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    fixtures = write_fixtures(workdir)
+    vpic = start_fake_vpic(args.vpic_latency, args.vpic_failure_rate)
+    fake_yt_dlp = make_fake_yt_dlp(fixtures, args.yt_search_latency, args.yt_download_latency, args.yt_failure_rate)
+    sys.modules['yt_dlp'] = fake_yt_dlp
+
+    # The app keeps its state in relative directories: isolate it in the workdir
+    os.environ['NHTSA_BASE_URL'] = vpic.base_url
+    os.chdir(workdir)
+
+    from werkzeug.serving import make_server
+    import app as app_module
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    # werkzeug's per-request access log would otherwise dominate the run
+    logging.getLogger('werkzeug').setLevel(os.environ['LOG_LEVEL'])
+    threading.Thread(target=server.serve_forever, daemon=True, name='load-test-app').start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    from benchmark import engine_signal, wav_bytes
+
+    clips = [
+        wav_bytes(engine_signal(args.clip_seconds, 22050, rpm=650 + 100 * i, knock_hz=(i % 4) * 1.5, seed=50 + i), 22050)
+        for i in range(8)
+    ]
+
+    print(f"App {base_url} | fake vPIC {vpic.base_url} | workdir {workdir}")
+    print(f"{args.clients} clients, mix {args.mix}, "
+          + (f"{args.requests} requests" if args.requests else f"{args.duration}s"))
+
+    results = []
+    job_ids = []
+    stop_event = threading.Event()
+    budget = RequestBudget(args.requests)
+    mix = parse_mix(args.mix)
+    clients = [
+        LoadClient(base_url, mix, clips, args.repeat_ratio, results, job_ids, seed=i)
+        for i in range(args.clients)
+    ]
+    threads = [threading.Thread(target=client.run, args=(stop_event, budget), daemon=True) for client in clients]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    if not args.requests:
+        stop_event.wait(args.duration)
+        stop_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # Let queued reference matches finish before the workdir goes away
+    drain_deadline = time.monotonic() + args.drain_timeout
+    while app_module.match_jobs.depth() and time.monotonic() < drain_deadline:
+        time.sleep(0.1)
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'elapsed_seconds': round(elapsed, 2),
+        'total_requests': len(results),
+        'throughput_rps': round(len(results) / elapsed, 2),
+        'endpoints': summarize(results, elapsed),
+        'fake_backend_calls': dict(fake_yt_dlp.calls),
+        'match_jobs_pending': app_module.match_jobs.depth(),
+        'result_cache': app_module.result_cache.stats(),
+    }
+
+    server.shutdown()
+    vpic.shutdown()
+    app_module.analysis_pool.shutdown()
+    os.chdir(repo_dir)
+    if not args.workdir and not args.keep_workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def print_report(report):
+    print(f"\n{report['total_requests']} requests in {report['elapsed_seconds']}s "
+          f"({report['throughput_rps']} req/s)")
+    print(f"{'endpoint':16} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'shed':>7}")
+    for endpoint, stats in report['endpoints'].items():
+        print(f"{endpoint:16} {stats['requests']:8} {stats['throughput_rps']:8} {stats['p50_ms']:9} "
+              f"{stats['p95_ms']:9} {stats['p99_ms']:9} {stats['error_rate']:7.2%} {stats['shed_rate']:7.2%}")
+    print(f"Fake YouTube calls: {report['fake_backend_calls']} | result cache hit rate: "
+          f"{report['result_cache']['hit_rate']:.2%} | match jobs still pending: {report['match_jobs_pending']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load-test the API against local YouTube/NHTSA stand-ins')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run (ignored with --requests)')
+    parser.add_argument('--requests', type=int, help='Total requests to send instead of a fixed duration')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Endpoint weights, e.g. upload=4,poll=2,vehicle_models=3,health=1')
+    parser.add_argument('--clip-seconds', type=float, default=5, help='Length of uploaded clips')
+    parser.add_argument('--repeat-ratio', type=float, default=0.2,
+                        help='Fraction of uploads that resend an identical clip (result cache hits)')
+    parser.add_argument('--yt-search-latency', type=float, default=0.3, help='Fake YouTube search latency (s)')
+    parser.add_argument('--yt-download-latency', type=float, default=1.0, help='Fake YouTube download latency (s)')
+    parser.add_argument('--yt-failure-rate', type=float, default=0.0, help='Fake YouTube failure probability')
+    parser.add_argument('--vpic-latency', type=float, default=0.05, help='Fake vPIC latency (s)')
+    parser.add_argument('--vpic-failure-rate', type=float, default=0.0, help='Fake vPIC 500 probability')
+    parser.add_argument('--drain-timeout', type=float, default=60,
+                        help='Seconds to wait for queued match jobs after the clients stop')
+    parser.add_argument('--workdir', help='Directory for app state and fixtures (default: fresh temp dir)')
+    parser.add_argument('--keep-workdir', action='store_true', help='Keep the temp workdir for inspection')
+    parser.add_argument('--output', help='Write the JSON report here')
+    args = parser.parse_args()
+
+    report = run_load_test(args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote report to {args.output}")
@@ -0,0 +1,109 @@
+# log_config.py
+import os
+import sys
+import queue
+import atexit
+import random
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_DIR = Path(os.environ.get('LOG_DIR', './logs'))
+# Records buffered for the writer thread; beyond this they are dropped, never waited on
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+# Fraction of successful per-request records written (errors and slow requests always are;
+# set to 1.0 to log every request)
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 0.1))
+REQUEST_LOG_SLOW_MS = float(os.environ.get('REQUEST_LOG_SLOW_MS', 1000))
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestLogSampler(logging.Filter):
+    """
+    Keep a random sample of per-request records
+
+    Records logged with extra={'force_log': True} (errors, slow requests)
+    always pass.
+    """
+
+    def __init__(self, rate=REQUEST_LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return getattr(record, 'force_log', False) or self.rate >= 1.0 or random.random() < self.rate
+
+
+_listener = None
+_queue_handler = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level=LOG_LEVEL, log_dir=LOG_DIR):
+    """
+    Route all logging through one queue drained by a background writer
+
+    Request threads only enqueue records; the QueueListener thread does
+    the formatting I/O to the daily log file and the console. Safe to call
+    more than once (later calls only adjust the level).
+
+    Returns:
+        The QueueListener
+    """
+    global _listener, _queue_handler
+
+    root = logging.getLogger()
+    root.setLevel(level)
+
+    with _configure_lock:
+        if _listener is not None:
+            return _listener
+
+        log_dir = Path(log_dir)
+        log_dir.mkdir(exist_ok=True)
+
+        formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+        file_handler = logging.FileHandler(log_dir / f'autodecx_{datetime.now().strftime("%Y%m%d")}.log')
+        file_handler.setFormatter(formatter)
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+
+        # Replace anything basicConfig or an earlier import attached, so each line is written once
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        root.addHandler(_queue_handler)
+
+        logging.getLogger('autodecx.requests').addFilter(RequestLogSampler())
+
+        _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
+
+
+def dropped_log_records():
+    """Records dropped because the log queue was full"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
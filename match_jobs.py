@@ -0,0 +1,182 @@
+# match_jobs.py
+import json
+import os
+import re
+import time
+import uuid
+import logging
+import traceback
+import threading
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job records live on disk so any worker on the host can answer a poll
+JOBS_DIR = Path(os.environ.get('MATCH_JOBS_DIR', './match_jobs'))
+MATCH_WORKERS = int(os.environ.get('MATCH_WORKERS', 2))
+JOB_TTL_SECONDS = int(os.environ.get('MATCH_JOB_TTL', 3600))
+# Unfinished records older than this were left by a crashed process
+JOB_STALE_TTL_SECONDS = int(os.environ.get('MATCH_JOB_STALE_TTL', 86400))
+# Minimum seconds between scans of the jobs directory
+JOB_PURGE_INTERVAL = float(os.environ.get('MATCH_JOB_PURGE_INTERVAL', 300))
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Records in these states belong to live jobs and only expire after the stale TTL
+UNFINISHED_STATUSES = ('pending', 'running')
+
+
+class MatchJobQueue:
+    """
+    Background worker pool for YouTube reference matching
+
+    /upload submits a job after the rule-based analysis and returns its id;
+    the client polls for the final diagnosis once matching is done.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, max_workers=MATCH_WORKERS, ttl=JOB_TTL_SECONDS,
+                 stale_ttl=JOB_STALE_TTL_SECONDS, purge_interval=JOB_PURGE_INTERVAL):
+        """
+        Args:
+            jobs_dir: Directory for job status records
+            max_workers: Number of concurrent matching jobs
+            ttl: Seconds to keep finished job records
+            stale_ttl: Seconds to keep pending or running records
+            purge_interval: Minimum seconds between expiry scans
+        """
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.purge_interval = purge_interval
+        self._purge_lock = threading.Lock()
+        self._next_purge = 0.0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='match-job')
+        self._depth_lock = threading.Lock()
+        self._depth = 0
+
+    def submit(self, fn, *args, job_id=None, **kwargs):
+        """
+        Queue fn(*args, **kwargs); its return value becomes the job result
+
+        Args:
+            job_id: Id to record the job under (default: a new random id)
+
+        Returns:
+            Job id string
+        """
+        self._maybe_purge()
+
+        job_id = job_id or uuid.uuid4().hex
+        self._write(job_id, {
+            'job_id': job_id,
+            'status': 'pending',
+            'submitted_at': datetime.now().isoformat()
+        })
+        with self._depth_lock:
+            self._depth += 1
+        self.executor.submit(self._run, job_id, fn, args, kwargs)
+
+        logger.info(f"Match job {job_id} queued")
+        return job_id
+
+    def submit_with_progress(self, fn, *args, **kwargs):
+        """
+        Like submit, but fn also receives a progress=callable keyword;
+        each call records its keyword arguments as the job's progress
+        so pollers can follow long jobs
+
+        Returns:
+            Job id string
+        """
+        job_id = uuid.uuid4().hex
+
+        def progress(**fields):
+            self._write(job_id, {'job_id': job_id, 'status': 'running', 'progress': fields})
+
+        return self.submit(fn, *args, progress=progress, job_id=job_id, **kwargs)
+
+    def depth(self):
+        """Jobs submitted by this process and not yet finished (queued plus running)"""
+        return self._depth
+
+    def get(self, job_id):
+        """
+        Returns:
+            Job record dict, or None if the id is unknown or expired
+        """
+        if not JOB_ID_PATTERN.match(job_id or ''):
+            return None
+
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def purge_expired(self):
+        """
+        Delete finished job records older than the TTL, and pending or
+        running records older than the stale TTL
+
+        A finished record is written last at completion, so its mtime is
+        the completion time. Unfinished records get the much longer stale
+        TTL so slow jobs survive, while records orphaned by a crashed
+        process are eventually removed.
+        """
+        now = time.time()
+        cutoff = now - self.ttl
+        stale_cutoff = now - self.stale_ttl
+        for path in self.jobs_dir.glob('*.json'):
+            try:
+                mtime = path.stat().st_mtime
+                if mtime >= cutoff:
+                    continue
+                if mtime < stale_cutoff:
+                    path.unlink()
+                    continue
+                with open(path, 'r', encoding='utf-8') as f:
+                    status = json.load(f).get('status')
+                if status not in UNFINISHED_STATUSES:
+                    path.unlink()
+            except (OSError, ValueError):
+                pass
+
+    def _maybe_purge(self):
+        """Run purge_expired at most once per purge interval"""
+        now = time.monotonic()
+        if now < self._next_purge or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_purge = now + self.purge_interval
+            self.purge_expired()
+        finally:
+            self._purge_lock.release()
+
+    def _run(self, job_id, fn, args, kwargs):
+        start_time = time.time()
+        try:
+            result = fn(*args, **kwargs)
+            record = {'job_id': job_id, 'status': 'complete', 'result': result}
+        except Exception as e:
+            logger.error(f"Match job {job_id} failed: {str(e)}")
+            logger.error(traceback.format_exc())
+            record = {'job_id': job_id, 'status': 'failed', 'error': str(e)}
+
+        record['completed_at'] = datetime.now().isoformat()
+        self._write(job_id, record)
+        with self._depth_lock:
+            self._depth -= 1
+        logger.info(f"Match job {job_id} {record['status']} in {time.time() - start_time:.2f}s")
+
+    def _path(self, job_id):
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _write(self, job_id, record):
+        path = self._path(job_id)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
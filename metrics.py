@@ -0,0 +1,230 @@
+# metrics.py
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from log_config import REQUEST_LOG_SLOW_MS
+
+logger = logging.getLogger(__name__)
+
+# One JSON record per request goes to this logger (route it separately if needed)
+request_logger = logging.getLogger('autodecx.requests')
+
+# Upper bounds in seconds; covers sub-millisecond cache hits to minute-long downloads
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics) per label set"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        """Record one observation (labels in labelnames order)"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: ([*counts], total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from a callback at scrape time"""
+
+    def __init__(self, name, documentation, fn, metric_type='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+        self.metric_type = metric_type
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            logger.error(f"Metric {self.name} callback failed: {str(e)}")
+            return []
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}',
+            f'{self.name} {value}',
+        ]
+
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def callback(self, name, documentation, fn, metric_type='gauge'):
+        """Register a metric read from fn() on every scrape (replaces an existing one)"""
+        metric = CallbackMetric(name, documentation, fn, metric_type)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry served by GET /metrics
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    'autodecx_stage_seconds', 'Latency of each analysis pipeline stage', ('stage',)
+)
+REQUEST_SECONDS = metrics.histogram(
+    'autodecx_request_seconds', 'End-to-end request latency', ('route', 'method', 'status')
+)
+
+
+@contextmanager
+def timed_stage(stage):
+    """Time a block with perf_counter into the stage histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+
+
+class RequestTrace:
+    """
+    Stage timings and summary fields for one request
+
+    Stages land in the stage histogram as they finish; finish() adds the
+    request to the latency histogram and writes the single structured
+    log record for the request.
+    """
+
+    def __init__(self, request_id, route, method='GET'):
+        self.request_id = request_id
+        self.route = route
+        self.method = method
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.fields = {}
+        self._finished = False
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block as stage name (repeated stages accumulate)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name, seconds):
+        """Record a stage measured elsewhere (e.g. in a pool worker)"""
+        STAGE_SECONDS.observe(seconds, name)
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def set(self, **fields):
+        """Attach summary fields to the request record"""
+        self.fields.update(fields)
+
+    def finish(self, status):
+        """
+        Record the request (only the first call counts)
+
+        Returns:
+            The structured record dict
+        """
+        if self._finished:
+            return None
+        self._finished = True
+        elapsed = time.perf_counter() - self.start
+        REQUEST_SECONDS.observe(elapsed, self.route, self.method, str(status))
+
+        record = {
+            'request_id': self.request_id,
+            'route': self.route,
+            'method': self.method,
+            'status': status,
+            'duration_ms': round(elapsed * 1000, 2),
+            'stages_ms': {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+        }
+        record.update(self.fields)
+
+        # Failures and slow requests bypass the request log sampler
+        failed = status >= 400 if isinstance(status, int) else status != 'ok'
+        force_log = failed or record['duration_ms'] >= REQUEST_LOG_SLOW_MS
+        if request_logger.isEnabledFor(logging.INFO):
+            request_logger.info(json.dumps(record, default=str), extra={'force_log': force_log})
+        return record
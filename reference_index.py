@@ -0,0 +1,290 @@
+# reference_index.py
+import json
+import os
+import threading
+import logging
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+from youtube_helper import build_vehicle_query, search_vehicle_issue_videos, YouTubeAudioDownloader
+from audio_matcher import extract_reference_fingerprints, fit_feature_scaling
+from audio_landmarks import LandmarkIndex, LANDMARKS_FILENAME
+from analysis_pool import analysis_pool
+from metrics import timed_stage
+from single_flight import file_lock
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_INDEX_DIR = Path(os.environ.get('REFERENCE_INDEX_DIR', './reference_index'))
+INDEX_FILENAME = 'index.json'
+INDEX_LOCK_FILENAME = 'index.lock'
+INDEX_VERSION = 1
+
+# Video metadata persisted alongside each fingerprint
+VIDEO_FIELDS = ('id', 'title', 'url', 'channel', 'duration', 'views')
+
+
+def normalize_query(query):
+    """Normalize a search query so equivalent requests share one index entry"""
+    return ' '.join(str(query).lower().split())
+
+
+class ReferenceIndex:
+    """
+    On-disk index of reference audio fingerprints
+
+    Stores the feature vectors from extract_audio_features keyed by video id,
+    plus the list of video ids returned for each search query, so repeat
+    queries are a lookup instead of a search + download. Frame-level
+    landmarks of the same videos live in a LandmarkIndex next to index.json.
+    """
+
+    def __init__(self, index_dir=REFERENCE_INDEX_DIR):
+        """
+        Args:
+            index_dir: Directory holding index.json (a fixture directory works too)
+        """
+        self.index_dir = Path(index_dir)
+        self.index_path = self.index_dir / INDEX_FILENAME
+        self._lock = threading.Lock()
+        self.videos = {}
+        self.queries = {}
+        self._scaling = None
+        self.landmarks = LandmarkIndex(self.index_dir / LANDMARKS_FILENAME)
+        self.load()
+
+    def _read_disk(self):
+        """
+        Returns:
+            Tuple (videos, queries) as currently on disk (empty if absent or unreadable)
+        """
+        if not self.index_path.exists():
+            return {}, {}
+
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load reference index {self.index_path}: {str(e)}")
+            return {}, {}
+
+        queries = {
+            normalize_query(query): entry
+            for query, entry in data.get('queries', {}).items()
+        }
+        return data.get('videos', {}), queries
+
+    def load(self):
+        """Load the index from disk (an absent index is treated as empty)"""
+        videos, queries = self._read_disk()
+        with self._lock:
+            self._scaling = None
+            self.videos = videos
+            self.queries = queries
+        if videos or queries:
+            logger.info(f"Loaded reference index: {len(videos)} videos, {len(queries)} queries")
+
+    def save(self):
+        """
+        Merge with the on-disk index and atomically write the result
+
+        Several worker processes share index.json: under a file lock the
+        current file is re-read and entries indexed by other workers are
+        merged in (this process's entries win for the same video, the most
+        recently indexed entry wins for the same query), so no worker's
+        additions are lost to a later writer.
+        """
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.index_dir / INDEX_LOCK_FILENAME):
+            disk_videos, disk_queries = self._read_disk()
+            with self._lock:
+                videos = {**disk_videos, **self.videos}
+                queries = dict(disk_queries)
+                for query, entry in self.queries.items():
+                    current = queries.get(query)
+                    if current is None or entry.get('indexed_at', '') >= current.get('indexed_at', ''):
+                        queries[query] = entry
+
+                data = {
+                    'version': INDEX_VERSION,
+                    'videos': videos,
+                    'queries': queries,
+                }
+                tmp_path = self.index_path.with_suffix(f'.{os.getpid()}.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.index_path)
+
+                if len(videos) != len(self.videos):
+                    self._scaling = None
+                self.videos = videos
+                self.queries = queries
+        self.landmarks.save()
+
+    def add_video(self, video_info, features, labels=None, landmarks=None):
+        """
+        Store (or replace) the fingerprint and metadata for one video
+
+        Args:
+            video_info: Video metadata (see VIDEO_FIELDS)
+            features: Fingerprint vector
+            labels: Optional vehicle labels (manufacturer, year, model,
+                location) used to filter reference library searches
+            landmarks: Optional (hashes, frames) from extract_landmarks
+        """
+        entry = {field: video_info.get(field) for field in VIDEO_FIELDS}
+        entry['features'] = [float(value) for value in features]
+        if labels:
+            entry['labels'] = dict(labels)
+        with self._lock:
+            self.videos[video_info['id']] = entry
+            self._scaling = None
+        if landmarks is not None:
+            self.landmarks.add(video_info['id'], *landmarks)
+
+    def add_query(self, query, video_ids):
+        """Record which videos a search query resolved to"""
+        with self._lock:
+            self.queries[normalize_query(query)] = {
+                'video_ids': list(video_ids),
+                'indexed_at': datetime.now().isoformat(),
+            }
+
+    def get_video(self, video_id):
+        """
+        Returns:
+            Tuple (video_info, feature_vector) or None if not indexed
+        """
+        entry = self.videos.get(video_id)
+        if entry is None:
+            return None
+        video_info = {field: entry.get(field) for field in VIDEO_FIELDS}
+        return video_info, np.asarray(entry['features'], dtype=float)
+
+    def feature_scaling(self):
+        """
+        Per-dimension standardization fitted over every indexed fingerprint
+        (the matcher's defaults until enough references are indexed)
+
+        Returns:
+            Tuple (center, scale), see audio_matcher.fit_feature_scaling
+        """
+        scaling = self._scaling
+        if scaling is None:
+            with self._lock:
+                features = [entry['features'] for entry in self.videos.values()]
+            scaling = fit_feature_scaling(np.asarray(features, dtype=float).reshape(len(features), -1))
+            self._scaling = scaling
+        return scaling
+
+    def match_landmarks(self, hashes, frames, k=5, video_ids=None):
+        """
+        Rank indexed videos by time-aligned landmark hits
+
+        Args:
+            video_ids: Optional subset of videos to consider (e.g. the
+                references for the user's vehicle)
+
+        Returns:
+            List of (video_info, match) tuples, see LandmarkIndex.match
+        """
+        matches = []
+        for match in self.landmarks.match(hashes, frames, k=k, video_ids=video_ids):
+            reference = self.get_video(match['video_id'])
+            if reference is not None:
+                matches.append((reference[0], match))
+        return matches
+
+    def lookup(self, query):
+        """
+        Look up the indexed references for a search query
+
+        Returns:
+            List of (video_info, feature_vector) tuples, or None on a cache miss
+        """
+        entry = self.queries.get(normalize_query(query))
+        if entry is None:
+            return None
+
+        references = []
+        for video_id in entry['video_ids']:
+            reference = self.get_video(video_id)
+            if reference is not None:
+                references.append(reference)
+        return references
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_reference_index():
+    """Return the process-wide reference index"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = ReferenceIndex()
+        return _default_index
+
+
+def get_vehicle_references(manufacturer, year, model, location, max_videos=3, index=None):
+    """
+    Get reference fingerprints for a vehicle issue, downloading only on a cache miss
+
+    Args:
+        manufacturer: Vehicle manufacturer (e.g., "BMW")
+        year: Vehicle year (e.g., "2024")
+        model: Vehicle model (e.g., "3 Series")
+        location: Sound location (e.g., "engine")
+        max_videos: Maximum number of reference videos
+        index: ReferenceIndex to use (defaults to the process-wide index)
+
+    Returns:
+        List of tuples: (video_info, feature_vector)
+    """
+    if index is None:
+        index = get_reference_index()
+
+    query = build_vehicle_query(manufacturer, year, model, location)
+    references = index.lookup(query)
+
+    if references is not None:
+        logger.info(f"Reference index hit for '{query}': {len(references)} references")
+        return references[:max_videos]
+
+    logger.info(f"Reference index miss for '{query}', downloading references")
+
+    references = []
+    with YouTubeAudioDownloader(max_videos=max_videos) as downloader:
+        youtube_results = search_vehicle_issue_videos(
+            manufacturer=manufacturer,
+            year=year,
+            model=model,
+            location=location,
+            max_videos=max_videos,
+            downloader=downloader
+        )
+        
+        for video_info, audio_path in youtube_results:
+            with timed_stage('reference_featurize'):
+                fingerprints = analysis_pool.run(extract_reference_fingerprints, str(audio_path), block=True)
+            if fingerprints is None:
+                continue
+            features, landmarks = fingerprints
+            index.add_video(video_info, features, labels={
+                'manufacturer': manufacturer,
+                'year': year,
+                'model': model,
+                'location': location,
+            }, landmarks=landmarks)
+            references.append((video_info, features))
+
+    # Empty results are not cached so the next request retries the search
+    if references:
+        index.add_query(query, [video_info['id'] for video_info, _ in references])
+        try:
+            index.save()
+        except OSError as e:
+            logger.error(f"Failed to save reference index: {str(e)}")
+
+    return references
@@ -0,0 +1,404 @@
+# reference_library.py
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import logging
+from pathlib import Path
+import numpy as np
+from audio_matcher import fit_feature_scaling, normalize_fingerprints
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_LIBRARY_DIR = Path(os.environ.get('REFERENCE_LIBRARY_DIR', './reference_library'))
+LIBRARY_VERSION = 1
+LIBRARY_RELOAD_INTERVAL = int(os.environ.get('REFERENCE_LIBRARY_RELOAD_INTERVAL', 60))
+
+# Libraries at least this large get an IVF (inverted file) index at build time
+IVF_MIN_REFERENCES = int(os.environ.get('IVF_MIN_REFERENCES', 5000))
+# Clusters probed per query: more is slower but closer to exact
+IVF_NPROBE = int(os.environ.get('IVF_NPROBE', 8))
+IVF_TRAIN_ITERATIONS = 10
+# Rows scored per chunk while building (bounds the N x nlist score matrix)
+BUILD_CHUNK_ROWS = 65536
+
+# Metadata columns that can be filtered on
+FILTER_FIELDS = ('manufacturer', 'model', 'location')
+# Video metadata returned with each match
+VIDEO_FIELDS = ('id', 'title', 'url', 'channel', 'duration', 'views')
+
+VECTORS_FILE = 'vectors.npy'
+METADATA_FILE = 'metadata.json'
+IVF_FILE = 'ivf.npz'
+# Each build goes to its own generation directory; CURRENT names the live one
+CURRENT_FILE = 'CURRENT'
+GENERATION_PREFIX = 'generation-'
+# Older generations kept after a build (readers may still have them mapped)
+KEEP_GENERATIONS = 1
+
+
+def normalize_label(value):
+    """Case/whitespace-insensitive form of a filter value"""
+    return ' '.join(str(value).lower().split()) if value is not None else ''
+
+
+def _train_ivf(vectors, n_lists, iterations=IVF_TRAIN_ITERATIONS, seed=0):
+    """
+    Spherical k-means over unit vectors
+
+    Returns:
+        Tuple (centroids (n_lists, D) float32, assignment per row)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].astype(np.float32)
+    assignment = np.zeros(len(vectors), dtype=np.int32)
+
+    for _ in range(iterations):
+        for start in range(0, len(vectors), BUILD_CHUNK_ROWS):
+            chunk = vectors[start:start + BUILD_CHUNK_ROWS]
+            assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+        sums = np.zeros_like(centroids, dtype=np.float64)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Re-seed empty clusters with random rows
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return centroids, assignment
+
+
+def build_library(references, library_dir=REFERENCE_LIBRARY_DIR, ivf_min_references=IVF_MIN_REFERENCES):
+    """
+    Write a reference library: a float32 matrix of standardized unit
+    fingerprints (memory-mapped at query time), per-row metadata with
+    filter codes, and an IVF index for large libraries
+
+    Args:
+        references: Iterable of (video_info, feature_vector, labels) tuples
+        library_dir: Output directory; the files are written to a new
+            generation directory and published by atomically replacing
+            CURRENT, so readers always see one complete build
+        ivf_min_references: Build the IVF index from this many references
+
+    Returns:
+        Number of references written
+    """
+    videos, vectors, labels = [], [], []
+    for video_info, features, row_labels in references:
+        videos.append({field: video_info.get(field) for field in VIDEO_FIELDS})
+        vectors.append(np.asarray(features, dtype=float))
+        labels.append(row_labels or {})
+
+    if not vectors:
+        raise ValueError("No references to build a library from")
+
+    raw = np.vstack(vectors)
+    center, scale = fit_feature_scaling(raw)
+    unit = normalize_fingerprints(raw, (center, scale)).astype(np.float32)
+
+    # Filter columns as integer codes into a per-field vocabulary
+    filters = {}
+    for field in FILTER_FIELDS:
+        values = [normalize_label(row.get(field)) for row in labels]
+        vocabulary = sorted(set(values))
+        codes = {value: code for code, value in enumerate(vocabulary)}
+        filters[field] = {'vocabulary': vocabulary, 'codes': [codes[value] for value in values]}
+
+    library_dir = Path(library_dir)
+    generation = f"{GENERATION_PREFIX}{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    generation_dir = library_dir / generation
+    generation_dir.mkdir(parents=True)
+
+    if len(unit) >= ivf_min_references:
+        n_lists = int(np.clip(np.sqrt(len(unit)), 1, 4096))
+        start_time = time.time()
+        centroids, assignment = _train_ivf(unit, n_lists)
+        order = np.argsort(assignment, kind='stable').astype(np.int32)
+        offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1)).astype(np.int64)
+        np.savez(generation_dir / IVF_FILE, centroids=centroids, order=order, offsets=offsets)
+        logger.info(f"IVF index built: {n_lists} lists in {time.time() - start_time:.1f}s")
+
+    np.save(generation_dir / VECTORS_FILE, unit)
+
+    metadata = {
+        'version': LIBRARY_VERSION,
+        'generation': generation,
+        'built_at': time.time(),
+        'count': len(unit),
+        'scaling': {'center': center.tolist(), 'scale': scale.tolist()},
+        'videos': videos,
+        'labels': labels,
+        'filters': filters,
+    }
+    with open(generation_dir / METADATA_FILE, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f)
+
+    # Publish: one atomic rename switches readers to the complete new generation
+    tmp_path = library_dir / f'{CURRENT_FILE}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(generation)
+    os.replace(tmp_path, library_dir / CURRENT_FILE)
+    _prune_generations(library_dir, generation)
+
+    logger.info(f"Reference library written: {len(unit)} references -> {generation_dir}")
+    return len(unit)
+
+
+def _prune_generations(library_dir, current, keep=KEEP_GENERATIONS):
+    """Delete generation directories older than the newest keep superseded ones"""
+    superseded = sorted(
+        (path for path in library_dir.glob(f'{GENERATION_PREFIX}*') if path.is_dir() and path.name != current),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True
+    )
+    for path in superseded[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def current_generation_dir(library_dir):
+    """
+    Returns:
+        Directory of the published generation (library_dir itself for a
+        library written before generations), or None if nothing is published
+    """
+    library_dir = Path(library_dir)
+    try:
+        generation = (library_dir / CURRENT_FILE).read_text(encoding='utf-8').strip()
+    except OSError:
+        return library_dir if (library_dir / METADATA_FILE).exists() else None
+    return library_dir / generation
+
+
+class ReferenceLibrary:
+    """
+    Memory-mapped reference fingerprints with filtered top-k search
+
+    Small libraries are searched exactly (one matrix-vector product over
+    the filtered rows); libraries with an IVF index only score the rows in
+    the nprobe clusters closest to the query, widening the probe when a
+    filter leaves fewer than k rows there. Selective filters are scanned
+    exactly.
+    """
+
+    def __init__(self, library_dir=REFERENCE_LIBRARY_DIR, reload_interval=LIBRARY_RELOAD_INTERVAL):
+        """
+        Args:
+            library_dir: Directory written by build_library
+            reload_interval: Seconds between checks for a rebuilt library
+        """
+        self.library_dir = Path(library_dir)
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._loaded_dir = None
+        self._last_check = 0.0
+        self._state = None
+        self.load()
+
+    def load(self):
+        """Map the published library generation (a missing library leaves search empty)"""
+        generation_dir = current_generation_dir(self.library_dir)
+        if generation_dir is None:
+            self._state = None
+            return
+
+        try:
+            with open(generation_dir / METADATA_FILE, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            vectors = np.load(generation_dir / VECTORS_FILE, mmap_mode='r')
+            ivf = None
+            if (generation_dir / IVF_FILE).exists():
+                with np.load(generation_dir / IVF_FILE) as data:
+                    ivf = {key: data[key] for key in ('centroids', 'order', 'offsets')}
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load reference library {generation_dir}: {str(e)}")
+            return
+
+        if len(vectors) != metadata['count'] or (ivf is not None and len(ivf['order']) != len(vectors)):
+            logger.error("Reference library files disagree, not loading")
+            return
+
+        # Swapped in as one object so concurrent searches see a consistent library
+        self._state = {
+            'vectors': vectors,
+            'videos': metadata['videos'],
+            'labels': metadata['labels'],
+            'scaling': (np.asarray(metadata['scaling']['center']), np.asarray(metadata['scaling']['scale'])),
+            'filters': {
+                field: (
+                    {value: code for code, value in enumerate(column['vocabulary'])},
+                    np.asarray(column['codes'], dtype=np.int32),
+                )
+                for field, column in metadata['filters'].items()
+            },
+            'ivf': ivf,
+        }
+        self._loaded_dir = generation_dir
+        mode = f"IVF ({len(ivf['centroids'])} lists)" if ivf else 'exact'
+        logger.info(f"Reference library loaded: {len(vectors)} references, {mode} search")
+
+    def maybe_reload(self):
+        """Reload if the library was rebuilt (checked at most every reload_interval)"""
+        if time.time() - self._last_check < self.reload_interval:
+            return
+
+        with self._reload_lock:
+            self._last_check = time.time()
+            generation_dir = current_generation_dir(self.library_dir)
+            if generation_dir is not None and generation_dir != self._loaded_dir:
+                self.load()
+
+    def __len__(self):
+        return 0 if self._state is None else len(self._state['vectors'])
+
+    def _filter_mask(self, state, filters):
+        """Boolean row mask for the metadata filters (None = no filtering)"""
+        mask = None
+        for field, value in (filters or {}).items():
+            if value is None or field not in state['filters']:
+                continue
+            codes_by_value, codes = state['filters'][field]
+            code = codes_by_value.get(normalize_label(value))
+            field_mask = codes == code if code is not None else np.zeros(len(codes), dtype=bool)
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def search(self, user_features, k=5, filters=None, nprobe=IVF_NPROBE, exact=False):
+        """
+        Top-k most similar references
+
+        Args:
+            user_features: Fingerprint of the user's clip
+            k: Number of matches
+            filters: Optional dict of FILTER_FIELDS values (exact, case-insensitive)
+            nprobe: IVF clusters to scan
+            exact: Force a brute-force scan even if an IVF index exists
+
+        Returns:
+            List of (video_info, labels, score) tuples, best first
+        """
+        state = self._state
+        if state is None or k <= 0:
+            return []
+
+        query = normalize_fingerprints(user_features, state['scaling'])[0].astype(np.float32)
+        mask = self._filter_mask(state, filters)
+        ivf = state['ivf']
+
+        if ivf is not None and not exact and mask is not None:
+            # A filter matching no more rows than nprobe average lists hold is
+            # cheaper to scan exactly, and probing would miss most of its rows
+            n_lists = len(ivf['centroids'])
+            if np.count_nonzero(mask) <= nprobe * len(state['vectors']) / n_lists:
+                exact = True
+
+        if ivf is not None and not exact:
+            candidates = self._ivf_candidates(ivf, query, k, nprobe, mask)
+        elif mask is not None:
+            candidates = np.flatnonzero(mask)
+        else:
+            candidates = None
+
+        if candidates is None:
+            scores = np.asarray(state['vectors'] @ query)
+            rows = np.arange(len(scores))
+        else:
+            scores = np.asarray(state['vectors'][candidates] @ query)
+            rows = candidates
+
+        if len(scores) == 0:
+            return []
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return [
+            (state['videos'][rows[i]], state['labels'][rows[i]], float(max(scores[i], 0.0)))
+            for i in top
+        ]
+
+    @staticmethod
+    def _ivf_candidates(ivf, query, k, nprobe, mask):
+        """
+        Rows in the clusters closest to the query, probing more clusters
+        (doubling) until at least k rows pass the filter mask
+
+        Returns:
+            Sorted array of row numbers
+        """
+        list_order = np.argsort(-(ivf['centroids'] @ query))
+        offsets = ivf['offsets']
+        probe = min(max(nprobe, 1), len(list_order))
+        while True:
+            candidates = np.concatenate([
+                ivf['order'][offsets[lst]:offsets[lst + 1]] for lst in list_order[:probe]
+            ])
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+            if len(candidates) >= k or probe == len(list_order):
+                break
+            probe = min(2 * probe, len(list_order))
+        candidates.sort()
+        return candidates
+
+
+_default_library = None
+_default_library_lock = threading.Lock()
+
+
+def get_reference_library():
+    """Return the process-wide reference library"""
+    global _default_library
+    with _default_library_lock:
+        if _default_library is None:
+            _default_library = ReferenceLibrary()
+        return _default_library
+
+
+def references_from_index(index):
+    """(video_info, features, labels) tuples for every video in a ReferenceIndex"""
+    for entry in index.videos.values():
+        video_info = {field: entry.get(field) for field in VIDEO_FIELDS}
+        yield video_info, entry['features'], entry.get('labels')
+
+
+def references_from_jsonl(path):
+    """
+    (video_info, features, labels) tuples from a JSONL file of labelled clips;
+    each line has the VIDEO_FIELDS, 'features' and the FILTER_FIELDS
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            labels = {field: record.get(field) for field in FILTER_FIELDS + ('year',)}
+            yield record, record['features'], labels
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Build the memory-mapped reference library')
+    parser.add_argument('--from-index', action='store_true', help='Use the on-disk reference index')
+    parser.add_argument('--from-jsonl', help='JSONL file of labelled reference clips')
+    parser.add_argument('--output', default=str(REFERENCE_LIBRARY_DIR), help='Library directory')
+    parser.add_argument('--ivf-min', type=int, default=IVF_MIN_REFERENCES,
+                        help='Build an IVF index from this many references')
+    args = parser.parse_args()
+
+    if args.from_jsonl:
+        references = references_from_jsonl(args.from_jsonl)
+    else:
+        from reference_index import ReferenceIndex
+        references = references_from_index(ReferenceIndex())
+
+    count = build_library(references, args.output, ivf_min_references=args.ivf_min)
+    print(f"Built reference library with {count} references in {args.output}")
@@ -0,0 +1,246 @@
+# result_cache.py
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+from pathlib import Path
+from collections import OrderedDict
+from audio_features import N_FFT, HOP_LENGTH, N_MFCC, ANALYSIS_SR
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 256))
+# Optional on-disk tier shared by every worker on the host (empty = memory only)
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', '')
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 24 * 3600))
+# Disk tier capacity; past it the oldest entries are deleted first
+RESULT_CACHE_DISK_SIZE = int(os.environ.get('RESULT_CACHE_DISK_SIZE', 10000))
+# Minimum seconds between prunes of the disk tier
+RESULT_CACHE_PRUNE_INTERVAL = float(os.environ.get('RESULT_CACHE_PRUNE_INTERVAL', 300))
+
+# Bump when analysis output changes in a way the STFT parameters don't capture
+RESULT_CACHE_VERSION = 1
+ANALYSIS_CONFIG_VERSION = f"{RESULT_CACHE_VERSION}:{ANALYSIS_SR}:{N_FFT}:{HOP_LENGTH}:{N_MFCC}"
+
+
+def normalize_vehicle_info(vehicle_info):
+    """Canonical form of vehicle_info so equivalent forms share a cache entry"""
+    if not vehicle_info:
+        return None
+    return {
+        str(key): ' '.join(str(value).lower().split()) if value is not None else None
+        for key, value in vehicle_info.items()
+    }
+
+
+def result_cache_key(audio_bytes, vehicle_info, profile_name, streaming, rules_version):
+    """
+    Cache key for one upload
+
+    Args:
+        audio_bytes: Uploaded file contents
+        vehicle_info: Vehicle details from the form (or None)
+        profile_name: Analysis profile
+        streaming: Whether the streaming analysis path is used
+        rules_version: Diagnostic rule table version (see RuleEngine.version)
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256(audio_bytes)
+    digest.update(json.dumps({
+        'vehicle_info': normalize_vehicle_info(vehicle_info),
+        'profile': profile_name,
+        'streaming': bool(streaming),
+        'config': ANALYSIS_CONFIG_VERSION,
+        'rules': rules_version,
+    }, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of /upload responses keyed by content hash
+
+    A bounded in-memory LRU serves repeats within one worker; the optional
+    disk tier lets a retry that lands on another worker (or after a restart)
+    skip decoding and analysis too. Entries are stored as JSON text, so a
+    hit always hands out a fresh copy. The disk tier is pruned from put()
+    at most once per prune interval: expired files go first, then the
+    oldest until it is back within disk_max_entries.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, cache_dir=RESULT_CACHE_DIR, ttl=RESULT_CACHE_TTL,
+                 disk_max_entries=RESULT_CACHE_DISK_SIZE, prune_interval=RESULT_CACHE_PRUNE_INTERVAL):
+        """
+        Args:
+            max_entries: In-memory LRU capacity (0 disables the memory tier)
+            cache_dir: Directory for the disk tier (falsy disables it)
+            ttl: Seconds an entry stays valid
+            disk_max_entries: Disk tier capacity
+            prune_interval: Minimum seconds between disk tier prunes
+        """
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+        self._next_prune = 0.0
+        self._entries = OrderedDict()
+        self._counters = {
+            'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0, 'stores': 0, 'evictions': 0,
+            'disk_evictions': 0
+        }
+
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f'{key}.json'
+
+    def _remember(self, key, stored_at, payload):
+        """Insert into the memory tier (caller holds the lock)"""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (stored_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def get(self, key):
+        """
+        Returns:
+            Cached response dict, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                self._counters['memory_hits'] += 1
+                return json.loads(entry[1])
+            if entry is not None:
+                del self._entries[key]
+
+        payload = None
+        if self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                if now - os.path.getmtime(path) <= self.ttl:
+                    payload = path.read_text(encoding='utf-8')
+            except OSError:
+                payload = None
+
+        with self._lock:
+            if payload is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['hits'] += 1
+            self._counters['disk_hits'] += 1
+            self._remember(key, now, payload)
+        return json.loads(payload)
+
+    def put(self, key, response):
+        """Store a response in both tiers (disk write errors are logged, never raised)"""
+        payload = json.dumps(response)
+        with self._lock:
+            self._remember(key, time.time(), payload)
+            self._counters['stores'] += 1
+
+        if self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+                tmp_path.write_text(payload, encoding='utf-8')
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.error(f"Failed to write result cache entry: {str(e)}")
+            self._maybe_prune_disk()
+
+    def _maybe_prune_disk(self):
+        """Run prune_disk at most once per prune interval"""
+        now = time.monotonic()
+        if now < self._next_prune or not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_prune = now + self.prune_interval
+            self.prune_disk()
+        finally:
+            self._prune_lock.release()
+
+    def prune_disk(self):
+        """
+        Delete expired disk entries (and leftover temp files), then the
+        oldest entries beyond disk_max_entries
+
+        Returns:
+            Number of files deleted
+        """
+        if self.cache_dir is None:
+            return 0
+
+        cutoff = time.time() - self.ttl
+        live = []
+        removed = 0
+        for path in self.cache_dir.glob('*/*'):
+            try:
+                mtime = path.stat().st_mtime
+                if path.suffix == '.json' and mtime >= cutoff:
+                    live.append((mtime, path))
+                    continue
+                if path.suffix == '.json' or mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass
+
+        excess = len(live) - self.disk_max_entries
+        if excess > 0:
+            live.sort(key=lambda item: item[0])
+            for _, path in live[:excess]:
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+
+        if removed:
+            with self._lock:
+                self._counters['disk_evictions'] += removed
+            logger.info(f"Result cache: pruned {removed} disk entries")
+        return removed
+
+    def discard(self, key):
+        """Drop an entry from both tiers"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.cache_dir is not None:
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def stats(self):
+        """
+        Returns:
+            Dict of hit/miss counters, hit rate and memory-tier size
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['disk_tier'] = self.cache_dir is not None
+        return stats
+
+
+# Process-wide cache used by /upload
+result_cache = ResultCache()
@@ -0,0 +1,166 @@
+# single_flight.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: coalesce within the process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive cross-process lock on path for the duration of the block
+
+    Used to serialize read-merge-write cycles on files shared by several
+    workers. Without fcntl (Windows dev machines) this is a no-op.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution
+
+    Within a process, callers for a key that is already in flight wait on the
+    leader's future instead of repeating the work. Across processes, leaders
+    serialize on a per-key file lock in lock_dir; a process that had to wait
+    re-checks for the other process's result (via recheck, or the shared
+    JSON result file when result_ttl is set) before doing the work itself.
+    """
+
+    def __init__(self, name, lock_dir=None, result_ttl=0):
+        """
+        Args:
+            name: Label used in logs and lock file names
+            lock_dir: Directory for cross-process lock files (None = threads only)
+            result_ttl: Seconds a JSON-serializable result is shared with
+                other processes (0 disables result sharing)
+        """
+        self.name = name
+        self.lock_dir = Path(lock_dir) if lock_dir is not None and fcntl is not None else None
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+        if self.lock_dir is not None:
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+
+    def do(self, key, fn, *args, recheck=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) once per key across concurrent callers
+
+        Args:
+            key: Coalescing key (query string, video id, ...)
+            fn: Function doing the work
+            recheck: Optional callable run after waiting on another process;
+                a non-None return value is used instead of calling fn
+
+        Returns:
+            The result of the single execution shared by all callers
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_leader:
+            logger.info(f"[{self.name}] Joining in-flight call for {key!r}")
+            return future.result()
+
+        try:
+            result = self._run_across_processes(key, fn, args, kwargs, recheck)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _run_across_processes(self, key, fn, args, kwargs, recheck):
+        with self._process_lock(key) as waited:
+            if waited:
+                result = recheck() if recheck is not None else None
+                if result is None:
+                    result = self._load_shared_result(key)
+                if result is not None:
+                    logger.info(f"[{self.name}] Reused result from another process for {key!r}")
+                    return result
+
+            result = fn(*args, **kwargs)
+            self._store_shared_result(key, result)
+            return result
+
+    def _key_path(self, key, suffix):
+        digest = hashlib.sha1(str(key).encode('utf-8')).hexdigest()
+        return self.lock_dir / f"{self.name}-{digest}{suffix}"
+
+    @contextmanager
+    def _process_lock(self, key):
+        """Hold the per-key file lock; yields True if another process held it first"""
+        if self.lock_dir is None:
+            yield False
+            return
+
+        with open(self._key_path(key, '.lock'), 'a+') as lock_file:
+            waited = False
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                waited = True
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield waited
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_shared_result(self, key):
+        if self.lock_dir is None or not self.result_ttl:
+            return None
+
+        path = self._key_path(key, '.json')
+        try:
+            if time.time() - path.stat().st_mtime > self.result_ttl:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store_shared_result(self, key, result):
+        if self.lock_dir is None or not self.result_ttl or result is None:
+            return
+
+        path = self._key_path(key, '.json')
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"[{self.name}] Could not share result for {key!r}: {str(e)}")
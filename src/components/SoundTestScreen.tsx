@@ -5,7 +5,14 @@ import { Card } from "@/components/ui/card";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { Mic, Play, Square, RotateCcw, Car, ChevronDown } from "lucide-react";
-import { uploadAudio } from "@/lib/api";
+import {
+  uploadAudio,
+  startLiveSession,
+  sendLiveChunk,
+  finishLiveSession,
+  type AnalysisResult,
+  type LiveSession,
+} from "@/lib/api";
 import {
   Command,
   CommandEmpty,
@@ -60,6 +67,9 @@ const MANUFACTURERS = [
   "Volvo"
 ];
 
+// MediaRecorder slice length; each slice is streamed to the live session while recording
+const LIVE_CHUNK_MS = 1000;
+
 // Generate years from 1980 to 2025
 const YEARS = Array.from({ length: 2025 - 1980 + 1 }, (_, i) => (2025 - i).toString());
 
@@ -108,6 +118,14 @@ export default function SoundTestScreen() {
   const mediaRecorderRef = useRef<MediaRecorder | null>(null);
   const audioChunksRef = useRef<Blob[]>([]);
   const audioRef = useRef<HTMLAudioElement | null>(null);
+  // Bumped on every analysis / re-record so late match results for an old clip are ignored
+  const analysisIdRef = useRef(0);
+
+  // Live diagnosis: chunks are sent in order while recording; on any failure
+  // the finished clip is uploaded through /upload instead
+  const liveSessionRef = useRef<LiveSession | null>(null);
+  const liveChainRef = useRef<Promise<void>>(Promise.resolve());
+  const liveFailedRef = useRef(false);
 
   // Fetch models when manufacturer and year are selected
   useEffect(() => {
@@ -193,8 +211,31 @@ export default function SoundTestScreen() {
       mediaRecorderRef.current = mediaRecorder;
       audioChunksRef.current = [];
 
+      liveSessionRef.current = null;
+      liveFailedRef.current = false;
+      liveChainRef.current = startLiveSession(vehicleInfo)
+        .then((session) => {
+          liveSessionRef.current = session;
+        })
+        .catch((error) => {
+          console.warn("⚠️ Live diagnosis unavailable, will upload after recording:", error);
+          liveFailedRef.current = true;
+        });
+
       mediaRecorder.ondataavailable = (event) => {
         audioChunksRef.current.push(event.data);
+
+        // Analysis runs while recording, so the result is ready when the user taps Analyze
+        liveChainRef.current = liveChainRef.current.then(async () => {
+          const session = liveSessionRef.current;
+          if (!session || liveFailedRef.current) return;
+          try {
+            await sendLiveChunk(session, event.data);
+          } catch (error) {
+            console.warn("⚠️ Live chunk failed, will upload after recording:", error);
+            liveFailedRef.current = true;
+          }
+        });
       };
 
       mediaRecorder.onstop = () => {
@@ -203,7 +244,7 @@ export default function SoundTestScreen() {
         stream.getTracks().forEach((track) => track.stop());
       };
 
-      mediaRecorder.start();
+      mediaRecorder.start(LIVE_CHUNK_MS);
       setState("recording");
     } catch (error) {
       console.error("Error accessing microphone:", error);
@@ -250,14 +291,51 @@ export default function SoundTestScreen() {
 
     setState("analyzed");
     setIsAnalyzing(true);
-    setAnalysisResult("⏳ Analyzing audio and searching for similar issues...\n\nPlease wait, this may take 30-60 seconds...");
+    setAnalysisResult("⏳ Analyzing audio...");
+
+    const analysisId = ++analysisIdRef.current;
+
+    const onMatchResult = (matched: AnalysisResult) => {
+      // Reference matching finished in the background: swap in the final result
+      if (analysisIdRef.current === analysisId) {
+        setAnalysisResult(formatResult(matched));
+      }
+    };
 
     try {
-      console.log("📤 Uploading audio with vehicle info...");
-      const result = await uploadAudio(audioBlob, vehicleInfo);
+      await liveChainRef.current;
+      const session = liveSessionRef.current;
+      liveSessionRef.current = null;
+
+      let result: AnalysisResult | null = null;
+      if (session && !liveFailedRef.current) {
+        try {
+          console.log("📤 Finishing live session...");
+          result = await finishLiveSession(session, onMatchResult);
+        } catch (error) {
+          console.warn("⚠️ Live analysis failed, uploading the recording instead:", error);
+        }
+      }
+      if (!result) {
+        console.log("📤 Uploading audio with vehicle info...");
+        result = await uploadAudio(audioBlob, vehicleInfo, onMatchResult);
+      }
       console.log("✅ Analysis result received:", result);
 
-      const formattedResult = `✓ Audio analysis complete
+      setAnalysisResult(formatResult(result));
+
+    } catch (error) {
+      console.error("❌ Analysis failed:", error);
+      setAnalysisResult(
+        `❌ Analysis Failed\n\n${error instanceof Error ? error.message : 'Unknown error'}\n\nPlease ensure:\n• Flask backend is running on port 5000\n• YouTube API is configured\n• Internet connection is active`
+      );
+    } finally {
+      setIsAnalyzing(false);
+    }
+  };
+
+  const formatResult = (result: AnalysisResult) => {
+    return `✓ Audio analysis complete
 
 Vehicle: ${vehicleInfo.manufacturer} ${vehicleInfo.year} ${vehicleInfo.model}
 Sound Location: ${vehicleInfo.soundLocation}
@@ -282,21 +360,12 @@ ${result.issues.length > 0 ? '\n⚠️ Issues Detected:\n' + result.issues.map(i
 
 ${result.youtube_matches ? '\n🔗 Reference Videos:\n' + result.youtube_matches.slice(0, 3).map((match, idx) => 
   `${idx + 1}. ${match.title} (${match.similarity}% match)\n   ${match.url}`
-).join('\n') : ''}`;
-
-      setAnalysisResult(formattedResult);
-
-    } catch (error) {
-      console.error("❌ Analysis failed:", error);
-      setAnalysisResult(
-        `❌ Analysis Failed\n\n${error instanceof Error ? error.message : 'Unknown error'}\n\nPlease ensure:\n• Flask backend is running on port 5000\n• YouTube API is configured\n• Internet connection is active`
-      );
-    } finally {
-      setIsAnalyzing(false);
-    }
+).join('\n') : ''}${result.status === 'pending' ? '\n\n⏳ Searching for similar reference videos...' : ''}`;
   };
 
   const handleReRecord = () => {
+    analysisIdRef.current++;
+    liveSessionRef.current = null;
     if (audioRef.current) {
       audioRef.current.pause();
       audioRef.current = null;
@@ -32,6 +32,30 @@ export interface AnalysisResult {
     url: string;
     similarity: number;
   }>;
+  job_id?: string;
+  status?: 'pending' | 'complete' | 'failed';
+  result_url?: string;
+}
+
+interface MatchJob {
+  job_id: string;
+  status: 'pending' | 'complete' | 'failed';
+  result?: AnalysisResult;
+  error?: string;
+}
+
+export interface LiveSession {
+  stream_id: string;
+  chunk_url: string;
+  finish_url: string;
+}
+
+export interface LiveUpdate {
+  stream_id: string;
+  provisional: true;
+  bytes_received: number;
+  metrics: Partial<AnalysisResult['metrics']>;
+  issues: AnalysisResult['issues'];
 }
 
 export interface VehicleInfo {
@@ -47,13 +71,20 @@ export interface VehicleInfo {
 
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://127.0.0.1:5000';
 
+// YouTube matching job polling (runs in the background after the upload resolves)
+const JOB_POLL_INTERVAL_MS = 1500;
+const JOB_POLL_TIMEOUT_MS = 120000;
+
 // ============================================================
 // API FUNCTIONS
 // ============================================================
 
+// Resolves with the rule-based diagnosis as soon as the upload is analyzed;
+// when YouTube matching was queued, onMatchResult later receives the final result
 export async function uploadAudio(
   file: File | Blob, 
-  vehicleInfo?: VehicleInfo
+  vehicleInfo?: VehicleInfo,
+  onMatchResult?: (result: AnalysisResult) => void
 ): Promise<AnalysisResult> {
   
   console.log('📡 uploadAudio called with:', {
@@ -94,9 +125,13 @@ export async function uploadAudio(
       throw new Error(`HTTP ${response.status}: ${errorText}`);
     }
 
-    const data = await response.json();
+    const data: AnalysisResult = await response.json();
     console.log('📊 Parsed response data:', data);
     
+    if (data.status === 'pending' && data.result_url && onMatchResult) {
+      void pollMatchResult(data, onMatchResult);
+    }
+    
     return data;
 
   } catch (error) {
@@ -109,3 +144,89 @@ export async function uploadAudio(
     throw error;
   }
 }
+
+
+// Poll the YouTube matching job in the background; on failure or timeout the
+// rule-based result is reported back with status 'failed' so the UI can stop waiting
+async function pollMatchResult(
+  initial: AnalysisResult,
+  onMatchResult: (result: AnalysisResult) => void
+): Promise<void> {
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+  const giveUp = () => onMatchResult({ ...initial, status: 'failed' });
+
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+
+    try {
+      const response = await fetch(`${API_BASE_URL}${initial.result_url}`);
+      if (!response.ok) {
+        console.warn(`⚠️ Match job poll failed: HTTP ${response.status}`);
+        return giveUp();
+      }
+
+      const job: MatchJob = await response.json();
+      if (job.status === 'complete' && job.result) {
+        console.log('🎥 Match job complete:', job.result);
+        return onMatchResult({ ...job.result, job_id: job.job_id, status: 'complete' });
+      }
+      if (job.status === 'failed') {
+        console.warn('⚠️ Match job failed:', job.error);
+        return giveUp();
+      }
+    } catch (error) {
+      console.warn('⚠️ Match job poll error:', error);
+      return giveUp();
+    }
+  }
+
+  console.warn('⚠️ Match job timed out, keeping rule-based result');
+  giveUp();
+}
+
+
+// ============================================================
+// LIVE DIAGNOSIS (chunks sent while recording)
+// ============================================================
+
+export async function startLiveSession(vehicleInfo?: VehicleInfo): Promise<LiveSession> {
+  const response = await fetch(`${API_BASE_URL}/live`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ vehicle_info: vehicleInfo ?? null }),
+  });
+  if (!response.ok) {
+    throw new Error(`Could not start live session: HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+// Send one MediaRecorder slice; resolves with provisional metrics so far
+export async function sendLiveChunk(session: LiveSession, chunk: Blob): Promise<LiveUpdate> {
+  const response = await fetch(`${API_BASE_URL}${session.chunk_url}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/octet-stream' },
+    body: chunk,
+  });
+  if (!response.ok) {
+    throw new Error(`Live chunk rejected: HTTP ${response.status}`);
+  }
+  return response.json();
+}
+
+export async function finishLiveSession(
+  session: LiveSession,
+  onMatchResult?: (result: AnalysisResult) => void
+): Promise<AnalysisResult> {
+  const response = await fetch(`${API_BASE_URL}${session.finish_url}`, { method: 'POST' });
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(errorData.error || `Live analysis failed: HTTP ${response.status}`);
+  }
+
+  const result: AnalysisResult = await response.json();
+  if (result.status === 'pending' && result.result_url && onMatchResult) {
+    void pollMatchResult(result, onMatchResult);
+  }
+  return result;
+}
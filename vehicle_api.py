@@ -1,13 +1,210 @@
 # vehicle_api.py
+import os
+import json
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Blueprint, jsonify, request
 import logging
+from vehicle_catalog import catalog
 
 vehicle_bp = Blueprint('vehicle', __name__)
 logger = logging.getLogger(__name__)
 
-# NHTSA API base URL
-NHTSA_BASE_URL = "https://vpic.nhtsa.dot.gov/api/vehicles"
+# NHTSA API base URL (overridable to point at a local stand-in, see load_test.py)
+NHTSA_BASE_URL = os.environ.get('NHTSA_BASE_URL', "https://vpic.nhtsa.dot.gov/api/vehicles")
+NHTSA_TIMEOUT = float(os.environ.get('NHTSA_TIMEOUT', 10))
+
+# Model list cache: fresh for MODEL_CACHE_TTL, then served stale (while a
+# background refresh runs) for up to MODEL_CACHE_MAX_STALE
+MODEL_CACHE_TTL = int(os.environ.get('MODEL_CACHE_TTL', 24 * 3600))
+MODEL_CACHE_MAX_STALE = int(os.environ.get('MODEL_CACHE_MAX_STALE', 30 * 24 * 3600))
+MODEL_CACHE_FAILURE_BACKOFF = int(os.environ.get('MODEL_CACHE_FAILURE_BACKOFF', 60))
+# Optional JSON file so the cache survives restarts
+MODEL_CACHE_PATH = os.environ.get('MODEL_CACHE_PATH')
+
+
+def create_nhtsa_session():
+    """Pooled HTTP session so NHTSA calls reuse keep-alive connections"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+nhtsa_session = create_nhtsa_session()
+
+
+def fetch_models_from_nhtsa(manufacturer, year, session=None, timeout=NHTSA_TIMEOUT):
+    """
+    Fetch the model list for a manufacturer and year from NHTSA vPIC
+    
+    Returns:
+        Sorted list of unique model names (may be empty)
+    
+    Raises:
+        requests.RequestException: on network errors or a non-200 response
+    """
+    session = session or nhtsa_session
+    
+    # NHTSA API endpoint for models by make and year
+    url = f"{NHTSA_BASE_URL}/GetModelsForMakeYear/make/{manufacturer}/modelyear/{year}?format=json"
+    
+    logger.info(f"Calling NHTSA API: {url}")
+    response = session.get(url, timeout=timeout)
+    
+    if response.status_code != 200:
+        raise requests.HTTPError(f"NHTSA API error: {response.status_code}", response=response)
+    
+    data = response.json()
+    
+    # Extract model names from results
+    results = data.get('Results', [])
+    models = []
+    
+    for item in results:
+        model_name = item.get('Model_Name')
+        if model_name and model_name not in models:
+            models.append(model_name)
+    
+    # Sort alphabetically
+    models.sort()
+    
+    return models
+
+
+class ModelCache:
+    """
+    TTL cache of NHTSA model lists with stale-while-revalidate
+    
+    Fresh entries are served directly. Stale entries are served immediately
+    while one background refresh per key updates them. Only a cold miss
+    waits on NHTSA, and after a failed call misses for the same key fail
+    fast for failure_backoff seconds so a slow or down API doesn't stall
+    requests.
+    """
+    
+    def __init__(self, fetch=fetch_models_from_nhtsa, ttl=MODEL_CACHE_TTL,
+                 max_stale=MODEL_CACHE_MAX_STALE, failure_backoff=MODEL_CACHE_FAILURE_BACKOFF,
+                 cache_path=MODEL_CACHE_PATH):
+        """
+        Args:
+            fetch: Function (manufacturer, year) -> list of models
+            ttl: Seconds an entry is fresh
+            max_stale: Seconds an entry may still be served while refreshing
+            failure_backoff: Seconds to skip NHTSA on a miss after a failure for that key
+            cache_path: Optional JSON file to persist entries across restarts
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.failure_backoff = failure_backoff
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._refreshing = set()
+        self._failures = {}
+        self._load()
+    
+    @staticmethod
+    def _key(manufacturer, year):
+        return f"{manufacturer.strip().lower()}|{str(year).strip()}"
+    
+    def get(self, manufacturer, year):
+        """
+        Returns:
+            Tuple (models, cache_state) with cache_state 'fresh', 'stale' or 'miss'
+        
+        Raises:
+            requests.RequestException: on a cache miss when NHTSA is unavailable
+        """
+        key = self._key(manufacturer, year)
+        now = time.time()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+        
+        if entry is not None:
+            age = now - entry['fetched_at']
+            if age < self.ttl:
+                return entry['models'], 'fresh'
+            if age < self.ttl + self.max_stale:
+                self._refresh_in_background(key, manufacturer, year)
+                return entry['models'], 'stale'
+        
+        with self._lock:
+            last_failure = self._failures.get(key, 0.0)
+        if now - last_failure < self.failure_backoff:
+            raise requests.ConnectionError("NHTSA API unavailable (recent failure, backing off)")
+        
+        return self._refresh(key, manufacturer, year), 'miss'
+    
+    def _refresh(self, key, manufacturer, year):
+        try:
+            models = self.fetch(manufacturer, year)
+        except Exception:
+            now = time.time()
+            with self._lock:
+                # Drop expired back-offs so failures for many keys don't pile up
+                self._failures = {
+                    other: failed_at for other, failed_at in self._failures.items()
+                    if now - failed_at < self.failure_backoff
+                }
+                self._failures[key] = now
+            raise
+        
+        with self._lock:
+            self._failures.pop(key, None)
+            self._entries[key] = {'models': models, 'fetched_at': time.time()}
+        self._save()
+        return models
+    
+    def _refresh_in_background(self, key, manufacturer, year):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        
+        def refresh():
+            try:
+                self._refresh(key, manufacturer, year)
+                logger.info(f"Refreshed cached models for {manufacturer} {year}")
+            except Exception as e:
+                logger.warning(f"Background model refresh failed for {manufacturer} {year}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        
+        threading.Thread(target=refresh, name='model-cache-refresh', daemon=True).start()
+    
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+            logger.info(f"Loaded {len(self._entries)} cached model lists from {self.cache_path}")
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load model cache {self.cache_path}: {str(e)}")
+    
+    def _save(self):
+        if not self.cache_path:
+            return
+        with self._lock:
+            entries = dict(self._entries)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.error(f"Failed to save model cache {self.cache_path}: {str(e)}")
+
+
+model_cache = ModelCache()
+
 
 @vehicle_bp.route('/api/vehicle-models', methods=['GET'])
 def get_vehicle_models():
@@ -23,48 +220,36 @@ def get_vehicle_models():
     
     logger.info(f"Fetching models for {manufacturer} {year}")
     
+    # Preloaded catalog data for this make/year needs no NHTSA call
+    catalog.maybe_reload()
+    if catalog.has_year(manufacturer, year):
+        models = list(catalog.get_models(manufacturer, year))
+        return jsonify({
+            'success': True,
+            'manufacturer': manufacturer,
+            'year': year,
+            'models': models,
+            'count': len(models),
+            'cache': 'catalog'
+        })
+    
     try:
-        # NHTSA API endpoint for models by make and year
-        url = f"{NHTSA_BASE_URL}/GetModelsForMakeYear/make/{manufacturer}/modelyear/{year}?format=json"
+        models, cache_state = model_cache.get(manufacturer, year)
         
-        logger.info(f"Calling NHTSA API: {url}")
-        response = requests.get(url, timeout=10)
+        logger.info(f"Found {len(models)} models for {manufacturer} {year} (cache: {cache_state})")
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Extract model names from results
-            results = data.get('Results', [])
-            models = []
-            
-            for item in results:
-                model_name = item.get('Model_Name')
-                if model_name and model_name not in models:
-                    models.append(model_name)
-            
-            # Sort alphabetically
-            models.sort()
-            
-            logger.info(f"Found {len(models)} models for {manufacturer} {year}")
-            
-            if not models:
-                # Fallback: common models for popular brands
-                models = get_fallback_models(manufacturer, year)
-            
-            return jsonify({
-                'success': True,
-                'manufacturer': manufacturer,
-                'year': year,
-                'models': models,
-                'count': len(models)
-            })
-        else:
-            logger.error(f"NHTSA API error: {response.status_code}")
-            return jsonify({
-                'success': False,
-                'error': 'Failed to fetch models',
-                'models': get_fallback_models(manufacturer, year)
-            }), 200
+        if not models:
+            # Fallback: common models for popular brands
+            models = get_fallback_models(manufacturer, year)
+        
+        return jsonify({
+            'success': True,
+            'manufacturer': manufacturer,
+            'year': year,
+            'models': models,
+            'count': len(models),
+            'cache': cache_state
+        })
     
     except requests.Timeout:
         logger.error("NHTSA API timeout")
@@ -74,6 +259,14 @@ def get_vehicle_models():
             'models': get_fallback_models(manufacturer, year)
         }), 200
     
+    except requests.HTTPError as e:
+        logger.error(str(e))
+        return jsonify({
+            'success': False,
+            'error': 'Failed to fetch models',
+            'models': get_fallback_models(manufacturer, year)
+        }), 200
+    
     except Exception as e:
         logger.error(f"Error fetching models: {str(e)}")
         return jsonify({
@@ -83,139 +276,61 @@ def get_vehicle_models():
         }), 200
 
 
+@vehicle_bp.route('/api/manufacturers', methods=['GET'])
+def get_manufacturers():
+    """List all manufacturers in the vehicle catalog"""
+    catalog.maybe_reload()
+    manufacturers = catalog.makes()
+    return jsonify({
+        'success': True,
+        'manufacturers': manufacturers,
+        'count': len(manufacturers)
+    })
+
+
+@vehicle_bp.route('/api/vehicle-catalog/search', methods=['GET'])
+def search_vehicle_catalog():
+    """
+    Typeahead search over the in-memory vehicle catalog
+    Query params: q (prefix), manufacturer (search its models instead of
+    manufacturers), year (optional), limit (default 10, max 50)
+    """
+    prefix = request.args.get('q', '')
+    manufacturer = request.args.get('manufacturer')
+    year = request.args.get('year')
+    
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 50))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    catalog.maybe_reload()
+    
+    if manufacturer:
+        results = catalog.search_models(manufacturer, prefix, year=year, limit=limit)
+    else:
+        results = catalog.search_makes(prefix, limit=limit)
+    
+    return jsonify({
+        'success': True,
+        'query': prefix,
+        'manufacturer': manufacturer,
+        'results': results,
+        'count': len(results)
+    })
+
+
 def get_fallback_models(manufacturer, year):
     """
     Fallback models for popular South African brands
     Based on common models sold in SA market
     """
-    fallback_data = {
-        'BMW': [
-            '1 Series', '2 Series', '3 Series', '4 Series', '5 Series', '6 Series', '7 Series', '8 Series',
-            'X1', 'X2', 'X3', 'X4', 'X5', 'X6', 'X7',
-            'Z4', 'M2', 'M3', 'M4', 'M5', 'M8', 'i3', 'i4', 'iX', 'iX3'
-        ],
-        'Mercedes-Benz': [
-            'A-Class', 'B-Class', 'C-Class', 'E-Class', 'S-Class',
-            'CLA', 'CLS', 'GLA', 'GLB', 'GLC', 'GLE', 'GLS',
-            'AMG GT', 'EQA', 'EQB', 'EQC', 'EQE', 'EQS', 'G-Class', 'V-Class'
-        ],
-        'Audi': [
-            'A1', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8',
-            'Q2', 'Q3', 'Q4 e-tron', 'Q5', 'Q7', 'Q8',
-            'TT', 'R8', 'e-tron GT', 'RS3', 'RS4', 'RS5', 'RS6', 'RS7'
-        ],
-        'Toyota': [
-            'Agya', 'Starlet', 'Corolla', 'Corolla Cross', 'Camry', 'Prius',
-            'Hilux', 'Fortuner', 'Land Cruiser', 'Prado', 'RAV4',
-            'Urban Cruiser', 'C-HR', 'Avanza', 'Quantum', 'HiAce'
-        ],
-        'Volkswagen': [
-            'Polo', 'Polo Vivo', 'Golf', 'Jetta', 'Passat', 'Arteon',
-            'T-Cross', 'T-Roc', 'Tiguan', 'Tiguan Allspace', 'Touareg',
-            'Amarok', 'Caddy', 'Transporter', 'ID.4'
-        ],
-        'Ford': [
-            'Figo', 'Fiesta', 'Focus', 'Mustang',
-            'EcoSport', 'Puma', 'Kuga', 'Everest',
-            'Ranger', 'Ranger Raptor', 'Transit', 'Transit Custom'
-        ],
-        'Nissan': [
-            'Micra', 'Almera', 'Sentra',
-            'Magnite', 'Qashqai', 'X-Trail', 'Patrol',
-            'Navara', 'NP200', 'NP300'
-        ],
-        'Hyundai': [
-            'Grand i10', 'i20', 'Accent', 'Elantra', 'Sonata',
-            'Venue', 'Creta', 'Tucson', 'Santa Fe', 'Palisade',
-            'H-100', 'Staria', 'Kona', 'Ioniq 5'
-        ],
-        'Kia': [
-            'Picanto', 'Rio', 'Cerato', 'K5',
-            'Seltos', 'Sportage', 'Sorento', 'Carnival',
-            'EV6', 'Stinger'
-        ],
-        'Mazda': [
-            'Mazda2', 'Mazda3', 'Mazda6',
-            'CX-3', 'CX-30', 'CX-5', 'CX-60', 'CX-9',
-            'BT-50', 'MX-5'
-        ],
-        'Honda': [
-            'Brio', 'Ballade', 'Civic', 'Accord',
-            'HR-V', 'CR-V', 'ZR-V'
-        ],
-        'Renault': [
-            'Kwid', 'Sandero', 'Clio', 'Megane',
-            'Kiger', 'Captur', 'Duster', 'Koleos',
-            'Triber', 'Kangoo'
-        ],
-        'Suzuki': [
-            'S-Presso', 'Swift', 'Baleno', 'Ciaz',
-            'Dzire', 'Fronx', 'Brezza', 'Ertiga', 'XL6',
-            'Jimny', 'Vitara', 'Grand Vitara'
-        ],
-        'Isuzu': [
-            'D-Max', 'MU-X'
-        ],
-        'Mitsubishi': [
-            'Mirage', 'Attrage',
-            'ASX', 'Eclipse Cross', 'Outlander', 'Pajero Sport',
-            'Triton', 'Xpander'
-        ],
-        'Jeep': [
-            'Avenger', 'Renegade', 'Compass', 'Cherokee',
-            'Grand Cherokee', 'Wrangler', 'Gladiator'
-        ],
-        'Land Rover': [
-            'Defender', 'Discovery', 'Discovery Sport',
-            'Range Rover Evoque', 'Range Rover Velar',
-            'Range Rover Sport', 'Range Rover'
-        ],
-        'Volvo': [
-            'XC40', 'XC60', 'XC90',
-            'S60', 'S90', 'V60', 'V90',
-            'C40 Recharge', 'XC40 Recharge'
-        ],
-        'Peugeot': [
-            '108', '208', '2008', '3008', '5008',
-            'Partner', 'Expert', 'Boxer'
-        ],
-        'Opel': [
-            'Corsa', 'Astra', 'Grandland',
-            'Combo', 'Movano'
-        ],
-        'Chevrolet': [
-            'Spark', 'Aveo', 'Cruze',
-            'Trailblazer', 'Captiva',
-            'Utility'
-        ],
-        'GWM': [
-            'P Series', 'Steed', 'Poer',
-            'Haval H2', 'Haval Jolion', 'Haval H6', 'Haval H9'
-        ],
-        'Haval': [
-            'H2', 'Jolion', 'H6', 'H9'
-        ],
-        'Chery': [
-            'QQ', 'Tiggo 4 Pro', 'Tiggo 7 Pro', 'Tiggo 8 Pro'
-        ],
-        'Mahindra': [
-            'KUV100', 'XUV300', 'XUV500', 'XUV700',
-            'Scorpio', 'Bolero', 'Pik Up'
-        ],
-        'Fiat': [
-            '500', 'Panda', 'Tipo', 'Ducato'
-        ],
-        'Jaguar': [
-            'XE', 'XF', 'F-Pace', 'E-Pace', 'I-Pace', 'F-Type'
-        ]
-    }
-    
-    # Get models for the manufacturer (case-insensitive)
-    for brand, models in fallback_data.items():
-        if brand.lower() == manufacturer.lower():
-            logger.info(f"Using fallback models for {manufacturer}")
-            return models
+    # Get models for the manufacturer (case-insensitive, indexed lookup)
+    models = catalog.get_models(manufacturer)
+    if models:
+        logger.info(f"Using fallback models for {manufacturer}")
+        return list(models)
     
     # Generic fallback
     logger.info(f"No fallback data for {manufacturer}, returning generic message")
-    return ["Please type model name manually"]
\ No newline at end of file
+    return ["Please type model name manually"]
@@ -0,0 +1,349 @@
+# vehicle_catalog.py
+import os
+import json
+import time
+import bisect
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Optional full make -> year -> models dump loaded at startup
+VEHICLE_CATALOG_PATH = os.environ.get('VEHICLE_CATALOG_PATH')
+# Seconds between checks of the dump file for offline refreshes
+CATALOG_RELOAD_INTERVAL = int(os.environ.get('VEHICLE_CATALOG_RELOAD_INTERVAL', 30))
+
+# Year key for model lists that apply to every year
+ANY_YEAR = '*'
+
+# Common models for popular South African brands (year-independent)
+# Based on common models sold in SA market
+FALLBACK_MODELS = {
+    'BMW': [
+        '1 Series', '2 Series', '3 Series', '4 Series', '5 Series', '6 Series', '7 Series', '8 Series',
+        'X1', 'X2', 'X3', 'X4', 'X5', 'X6', 'X7',
+        'Z4', 'M2', 'M3', 'M4', 'M5', 'M8', 'i3', 'i4', 'iX', 'iX3'
+    ],
+    'Mercedes-Benz': [
+        'A-Class', 'B-Class', 'C-Class', 'E-Class', 'S-Class',
+        'CLA', 'CLS', 'GLA', 'GLB', 'GLC', 'GLE', 'GLS',
+        'AMG GT', 'EQA', 'EQB', 'EQC', 'EQE', 'EQS', 'G-Class', 'V-Class'
+    ],
+    'Audi': [
+        'A1', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8',
+        'Q2', 'Q3', 'Q4 e-tron', 'Q5', 'Q7', 'Q8',
+        'TT', 'R8', 'e-tron GT', 'RS3', 'RS4', 'RS5', 'RS6', 'RS7'
+    ],
+    'Toyota': [
+        'Agya', 'Starlet', 'Corolla', 'Corolla Cross', 'Camry', 'Prius',
+        'Hilux', 'Fortuner', 'Land Cruiser', 'Prado', 'RAV4',
+        'Urban Cruiser', 'C-HR', 'Avanza', 'Quantum', 'HiAce'
+    ],
+    'Volkswagen': [
+        'Polo', 'Polo Vivo', 'Golf', 'Jetta', 'Passat', 'Arteon',
+        'T-Cross', 'T-Roc', 'Tiguan', 'Tiguan Allspace', 'Touareg',
+        'Amarok', 'Caddy', 'Transporter', 'ID.4'
+    ],
+    'Ford': [
+        'Figo', 'Fiesta', 'Focus', 'Mustang',
+        'EcoSport', 'Puma', 'Kuga', 'Everest',
+        'Ranger', 'Ranger Raptor', 'Transit', 'Transit Custom'
+    ],
+    'Nissan': [
+        'Micra', 'Almera', 'Sentra',
+        'Magnite', 'Qashqai', 'X-Trail', 'Patrol',
+        'Navara', 'NP200', 'NP300'
+    ],
+    'Hyundai': [
+        'Grand i10', 'i20', 'Accent', 'Elantra', 'Sonata',
+        'Venue', 'Creta', 'Tucson', 'Santa Fe', 'Palisade',
+        'H-100', 'Staria', 'Kona', 'Ioniq 5'
+    ],
+    'Kia': [
+        'Picanto', 'Rio', 'Cerato', 'K5',
+        'Seltos', 'Sportage', 'Sorento', 'Carnival',
+        'EV6', 'Stinger'
+    ],
+    'Mazda': [
+        'Mazda2', 'Mazda3', 'Mazda6',
+        'CX-3', 'CX-30', 'CX-5', 'CX-60', 'CX-9',
+        'BT-50', 'MX-5'
+    ],
+    'Honda': [
+        'Brio', 'Ballade', 'Civic', 'Accord',
+        'HR-V', 'CR-V', 'ZR-V'
+    ],
+    'Renault': [
+        'Kwid', 'Sandero', 'Clio', 'Megane',
+        'Kiger', 'Captur', 'Duster', 'Koleos',
+        'Triber', 'Kangoo'
+    ],
+    'Suzuki': [
+        'S-Presso', 'Swift', 'Baleno', 'Ciaz',
+        'Dzire', 'Fronx', 'Brezza', 'Ertiga', 'XL6',
+        'Jimny', 'Vitara', 'Grand Vitara'
+    ],
+    'Isuzu': [
+        'D-Max', 'MU-X'
+    ],
+    'Mitsubishi': [
+        'Mirage', 'Attrage',
+        'ASX', 'Eclipse Cross', 'Outlander', 'Pajero Sport',
+        'Triton', 'Xpander'
+    ],
+    'Jeep': [
+        'Avenger', 'Renegade', 'Compass', 'Cherokee',
+        'Grand Cherokee', 'Wrangler', 'Gladiator'
+    ],
+    'Land Rover': [
+        'Defender', 'Discovery', 'Discovery Sport',
+        'Range Rover Evoque', 'Range Rover Velar',
+        'Range Rover Sport', 'Range Rover'
+    ],
+    'Volvo': [
+        'XC40', 'XC60', 'XC90',
+        'S60', 'S90', 'V60', 'V90',
+        'C40 Recharge', 'XC40 Recharge'
+    ],
+    'Peugeot': [
+        '108', '208', '2008', '3008', '5008',
+        'Partner', 'Expert', 'Boxer'
+    ],
+    'Opel': [
+        'Corsa', 'Astra', 'Grandland',
+        'Combo', 'Movano'
+    ],
+    'Chevrolet': [
+        'Spark', 'Aveo', 'Cruze',
+        'Trailblazer', 'Captiva',
+        'Utility'
+    ],
+    'GWM': [
+        'P Series', 'Steed', 'Poer',
+        'Haval H2', 'Haval Jolion', 'Haval H6', 'Haval H9'
+    ],
+    'Haval': [
+        'H2', 'Jolion', 'H6', 'H9'
+    ],
+    'Chery': [
+        'QQ', 'Tiggo 4 Pro', 'Tiggo 7 Pro', 'Tiggo 8 Pro'
+    ],
+    'Mahindra': [
+        'KUV100', 'XUV300', 'XUV500', 'XUV700',
+        'Scorpio', 'Bolero', 'Pik Up'
+    ],
+    'Fiat': [
+        '500', 'Panda', 'Tipo', 'Ducato'
+    ],
+    'Jaguar': [
+        'XE', 'XF', 'F-Pace', 'E-Pace', 'I-Pace', 'F-Type'
+    ]
+}
+
+
+def normalize_make(name):
+    """Lowercase, whitespace-collapsed key for a manufacturer name"""
+    return ' '.join(str(name).lower().split())
+
+
+def _prefix_range(keys, prefix):
+    """Indices [start, end) of the sorted keys that start with prefix"""
+    start = bisect.bisect_left(keys, prefix)
+    end = bisect.bisect_left(keys, prefix + '\uffff')
+    return start, end
+
+
+def build_catalog_index(data):
+    """
+    Build the immutable lookup structure for a catalog
+    
+    Args:
+        data: Dict of make -> {year: [models]} (year '*' = any year)
+        
+    Returns:
+        Dict with sorted, lowercase-keyed tables for lookups and prefix search
+    """
+    makes = {}
+    models = {}
+    
+    for make, years in data.items():
+        make_key = normalize_make(make)
+        makes.setdefault(make_key, make)
+        make_models = models.setdefault(make_key, {})
+        for year, names in years.items():
+            merged = set(make_models.get(str(year), ())) | {name for name in names if name}
+            make_models[str(year)] = tuple(sorted(merged))
+    
+    # Per make/year: sorted lowercase names aligned with display names for bisect
+    model_search = {}
+    for make_key, years in models.items():
+        all_models = sorted({name for names in years.values() for name in names})
+        years_with_all = dict(years)
+        years_with_all[None] = tuple(all_models)
+        model_search[make_key] = {
+            year: tuple(zip(*sorted((name.lower(), name) for name in names))) or ((), ())
+            for year, names in years_with_all.items()
+        }
+    
+    return {
+        'makes': makes,
+        'make_keys': sorted(makes),
+        'models': models,
+        'model_search': model_search,
+    }
+
+
+class VehicleCatalog:
+    """
+    In-memory make -> year -> models catalog with prefix (typeahead) search
+    
+    Lookups read an immutable index that load() swaps in atomically, so a
+    refresh from a JSON dump never blocks or disturbs concurrent readers.
+    """
+    
+    def __init__(self, data=None, path=None, reload_interval=CATALOG_RELOAD_INTERVAL):
+        """
+        Args:
+            data: Base dataset (make -> {year: [models]})
+            path: Optional JSON dump layered over the base dataset
+            reload_interval: Seconds between checks of path for changes
+        """
+        self.base_data = data or {}
+        self.path = path
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._loaded_mtime = None
+        self._last_check = 0.0
+        self._index = build_catalog_index(self.base_data)
+        
+        if path:
+            try:
+                self.load_json(path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to load vehicle catalog {path}: {str(e)}")
+    
+    def load(self, data):
+        """Replace the catalog with the base dataset plus data"""
+        merged = {make: dict(years) for make, years in self.base_data.items()}
+        for make, years in data.items():
+            target = merged.setdefault(make, {})
+            for year, names in years.items():
+                target[str(year)] = list(target.get(str(year), [])) + list(names)
+        self._index = build_catalog_index(merged)
+        logger.info(f"Vehicle catalog loaded: {len(self._index['makes'])} makes")
+    
+    def load_json(self, path):
+        """Load a make -> year -> models JSON dump (refreshes the catalog offline)"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.load(data.get('makes', data))
+        self.path = path
+        self._loaded_mtime = os.path.getmtime(path)
+    
+    def maybe_reload(self):
+        """Reload the JSON dump if it changed on disk (checked at most every reload_interval)"""
+        if not self.path or time.time() - self._last_check < self.reload_interval:
+            return
+        
+        with self._reload_lock:
+            self._last_check = time.time()
+            try:
+                if os.path.getmtime(self.path) != self._loaded_mtime:
+                    self.load_json(self.path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Vehicle catalog reload failed: {str(e)}")
+    
+    def makes(self):
+        """All manufacturer display names, sorted"""
+        index = self._index
+        return [index['makes'][key] for key in index['make_keys']]
+    
+    def get_models(self, manufacturer, year=None):
+        """
+        Models for a manufacturer, preferring year-specific data
+        
+        Returns:
+            Tuple of model names, or None if the make is unknown
+        """
+        years = self._index['models'].get(normalize_make(manufacturer))
+        if years is None:
+            return None
+        if year is not None and str(year) in years:
+            return years[str(year)]
+        return years.get(ANY_YEAR, ())
+    
+    def has_year(self, manufacturer, year):
+        """True if the catalog holds year-specific models for this make"""
+        years = self._index['models'].get(normalize_make(manufacturer), {})
+        return str(year) in years
+    
+    def search_makes(self, prefix, limit=10):
+        """Manufacturers whose name starts with prefix (case-insensitive)"""
+        index = self._index
+        keys = index['make_keys']
+        start, end = _prefix_range(keys, normalize_make(prefix))
+        return [index['makes'][key] for key in keys[start:min(end, start + limit)]]
+    
+    def search_models(self, manufacturer, prefix, year=None, limit=10):
+        """Models of a manufacturer whose name starts with prefix (case-insensitive)"""
+        years = self._index['model_search'].get(normalize_make(manufacturer))
+        if years is None:
+            return []
+        
+        if year is not None and str(year) in years:
+            keys, names = years[str(year)]
+        elif year is not None and ANY_YEAR in years:
+            keys, names = years[ANY_YEAR]
+        else:
+            keys, names = years[None]
+        
+        start, end = _prefix_range(keys, prefix.lower().strip())
+        return list(names[start:min(end, start + limit)])
+
+
+catalog = VehicleCatalog(
+    data={make: {ANY_YEAR: models} for make, models in FALLBACK_MODELS.items()},
+    path=VEHICLE_CATALOG_PATH
+)
+
+
+def export_catalog(makes, years, output_path):
+    """
+    Build a catalog JSON dump from NHTSA (run offline, then load via VEHICLE_CATALOG_PATH)
+    
+    Args:
+        makes: Manufacturer names to export
+        years: Model years to export
+        output_path: Destination JSON file
+    """
+    from vehicle_api import fetch_models_from_nhtsa
+    
+    data = {}
+    for make in makes:
+        for year in years:
+            try:
+                models = fetch_models_from_nhtsa(make, year)
+            except Exception as e:
+                logger.error(f"Export failed for {make} {year}: {str(e)}")
+                continue
+            if models:
+                data.setdefault(make, {})[str(year)] = models
+        logger.info(f"Exported {make}: {len(data.get(make, {}))} years")
+    
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'makes': data}, f, indent=2)
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    logging.basicConfig(level=logging.INFO)
+    
+    parser = argparse.ArgumentParser(description='Export a vehicle catalog dump from NHTSA')
+    parser.add_argument('output', help='Output JSON path')
+    parser.add_argument('--makes', nargs='+', default=sorted(FALLBACK_MODELS), help='Manufacturers to export')
+    parser.add_argument('--years', default='2000-2025', help='Year range, e.g. 2010-2025')
+    args = parser.parse_args()
+    
+    first_year, last_year = (int(part) for part in args.years.split('-'))
+    export_catalog(args.makes, range(first_year, last_year + 1), args.output)
@@ -0,0 +1,107 @@
+# warmup.py
+import os
+import time
+import logging
+import multiprocessing
+from pathlib import Path
+
+# Numba reads its cache location when first imported, so this module must
+# be imported before librosa. Point it at a persistent volume in production
+# so JIT-compiled kernels survive restarts and new workers load them from disk.
+os.environ.setdefault('NUMBA_CACHE_DIR', str(Path('./numba_cache').absolute()))
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', '1') != '0'
+WARMUP_SECONDS = 3
+WARMUP_SR = 22050
+
+
+def synthetic_signal(seconds=WARMUP_SECONDS, sr=WARMUP_SR):
+    """
+    Deterministic test signal exercising every analysis stage: a harmonic
+    tone (spectral features, MFCCs) with a 4 Hz knock (onsets, beats,
+    periodicity) and a little noise (ZCR)
+    """
+    t = np.arange(int(seconds * sr)) / sr
+    tone = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.1 * np.sin(2 * np.pi * 1760 * t)
+    knock = 0.5 * (np.sin(2 * np.pi * 4 * t) > 0.95)
+    noise = 0.02 * np.random.default_rng(0).standard_normal(len(t))
+    return (tone + knock + noise).astype(np.float32)
+
+
+def warm_up_pipeline():
+    """
+    Run the full feature pipeline once on a synthetic signal so lazy
+    imports and numba compilation happen before the first request
+
+    Returns:
+        Seconds spent
+    """
+    from audio_features import magnitude_spectrogram, extract_clip_features, extract_rhythm_features
+    from audio_matcher import extract_signal_features
+    from audio_streaming import analyze_stream
+
+    start_time = time.time()
+    y = synthetic_signal()
+
+    S = magnitude_spectrogram(y)
+    extract_clip_features(y, WARMUP_SR, S=S)
+    extract_rhythm_features(S, WARMUP_SR, beat_tracking=True)
+    extract_signal_features(y, WARMUP_SR)
+    analyze_stream(np.array_split(y, 4), WARMUP_SR)
+
+    return time.time() - start_time
+
+
+class WarmupState:
+    """Readiness of this worker: in-process warm-up plus the analysis pool"""
+
+    def __init__(self):
+        self.warmed = not WARMUP_ENABLED
+        self.warmup_seconds = None
+        self.error = None
+
+    def run(self):
+        """Warm up the current process (errors are logged, never raised)"""
+        # Pool workers re-import the app module; they warm up in their initializer
+        if not WARMUP_ENABLED or multiprocessing.current_process().name != 'MainProcess':
+            return
+        try:
+            self.warmup_seconds = warm_up_pipeline()
+            self.warmed = True
+            logger.info(f"Warm-up complete in {self.warmup_seconds:.2f}s")
+        except Exception as e:
+            # Serve anyway: a failed warm-up only costs first-request latency
+            self.error = str(e)
+            self.warmed = True
+            logger.error(f"Warm-up failed: {str(e)}")
+
+    def readiness(self, pool=None):
+        """
+        Returns:
+            Tuple (ready, details dict)
+        """
+        checks = {'pipeline': self.warmed}
+        if pool is not None:
+            checks['analysis_pool'] = pool.is_ready()
+        details = {
+            'checks': checks,
+            'warmup_seconds': round(self.warmup_seconds, 2) if self.warmup_seconds is not None else None,
+            'numba_cache_dir': os.environ.get('NUMBA_CACHE_DIR'),
+        }
+        if self.error:
+            details['warmup_error'] = self.error
+        return all(checks.values()), details
+
+
+warmup_state = WarmupState()
+
+
+if __name__ == '__main__':
+    # Run at build/deploy time to pre-populate NUMBA_CACHE_DIR, so even the
+    # first worker after a deploy starts from compiled kernels
+    logging.basicConfig(level=logging.INFO)
+    print(f"Warm-up took {warm_up_pipeline():.2f}s (cache: {os.environ['NUMBA_CACHE_DIR']})")
@@ -1,39 +1,174 @@
 # youtube_helper.py
-import yt_dlp
 import os
 from pathlib import Path
 import logging
 import time
+import shutil
+import tempfile
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from single_flight import SingleFlight
+from metrics import timed_stage
 
 logger = logging.getLogger(__name__)
 
 TEMP_DIR = Path('./temp_videos')
 TEMP_DIR.mkdir(exist_ok=True)
 
+# Shared download cache (lives under TEMP_DIR so files can be hard-linked)
+DOWNLOAD_CACHE_DIR = TEMP_DIR / 'cache'
+DOWNLOAD_CACHE_MAX_BYTES = int(os.environ.get('DOWNLOAD_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+DOWNLOAD_CACHE_MAX_FILES = int(os.environ.get('DOWNLOAD_CACHE_MAX_FILES', 200))
+
+AUDIO_EXTENSIONS = ['.wav', '.m4a', '.webm', '.opus']
+
+# Cross-process lock files for request coalescing
+SINGLE_FLIGHT_DIR = TEMP_DIR / 'locks'
+SEARCH_RESULT_TTL = int(os.environ.get('YOUTUBE_SEARCH_RESULT_TTL', 300))
+
+# Identical searches and downloads in flight are shared, not repeated
+search_flight = SingleFlight('youtube-search', lock_dir=SINGLE_FLIGHT_DIR, result_ttl=SEARCH_RESULT_TTL)
+download_flight = SingleFlight('youtube-download', lock_dir=SINGLE_FLIGHT_DIR)
+
+
+def _link_or_copy(src, dst):
+    """Hard-link src to dst, falling back to a copy across filesystems"""
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class DownloadCache:
+    """
+    Bounded LRU cache of downloaded reference audio, shared by all requests
+    
+    Files are hard-linked into each request's workspace on a hit, so
+    evicting a cache entry never removes a file a request is still using.
+    """
+    
+    def __init__(self, cache_dir=DOWNLOAD_CACHE_DIR, max_bytes=DOWNLOAD_CACHE_MAX_BYTES,
+                 max_files=DOWNLOAD_CACHE_MAX_FILES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._lock = threading.Lock()
+    
+    def fetch(self, video_id, workspace):
+        """
+        Link a cached download into a workspace
+        
+        Returns:
+            Path inside workspace, or None on a cache miss
+        """
+        for ext in AUDIO_EXTENSIONS:
+            cached_file = self.cache_dir / f"{video_id}{ext}"
+            target = Path(workspace) / cached_file.name
+            try:
+                _link_or_copy(cached_file, target)
+            except FileNotFoundError:
+                continue
+            except FileExistsError:
+                return target
+            
+            # Refresh recency for LRU eviction
+            try:
+                os.utime(cached_file)
+            except OSError:
+                pass
+            return target
+        return None
+    
+    def store(self, audio_file):
+        """Add a downloaded file to the cache, then evict down to the size bounds"""
+        cached_file = self.cache_dir / Path(audio_file).name
+        tmp_file = cached_file.with_name(f".{cached_file.name}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            _link_or_copy(audio_file, tmp_file)
+            os.replace(tmp_file, cached_file)
+        except OSError as e:
+            logger.error(f"Download cache store error: {str(e)}")
+            return
+        self.evict()
+    
+    def evict(self):
+        """Delete least-recently-used files until within max_bytes/max_files"""
+        with self._lock:
+            entries = []
+            for file in self.cache_dir.iterdir():
+                if file.name.startswith('.'):
+                    continue
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, file))
+            
+            entries.sort(key=lambda entry: entry[0])
+            total_bytes = sum(size for _, size, _ in entries)
+            
+            while entries and (total_bytes > self.max_bytes or len(entries) > self.max_files):
+                _, size, file = entries.pop(0)
+                try:
+                    file.unlink()
+                    logger.info(f"Evicted cached download: {file.name}")
+                except OSError:
+                    pass
+                total_bytes -= size
+
+
+download_cache = DownloadCache()
+
 class YouTubeAudioDownloader:
     """
     Download audio from YouTube videos for vehicle sound comparison
     """
     
-    def __init__(self, max_videos=3, max_duration=180):
+    def __init__(self, max_videos=3, max_duration=180, cache=None):
         """
         Args:
             max_videos: Maximum number of videos to download
             max_duration: Maximum video duration in seconds (default: 3 minutes)
+            cache: Shared DownloadCache (defaults to the process-wide cache)
+        
+        Each downloader owns a private workspace under TEMP_DIR; use it as a
+        context manager (or call cleanup_temp_files) to delete it when done.
         """
         self.max_videos = max_videos
         self.max_duration = max_duration
-        
-        # yt-dlp options for audio-only download
-        self.ydl_opts = {
+        self.cache = cache if cache is not None else download_cache
+        self._workspace = None
+        self._workspace_lock = threading.Lock()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        self.cleanup_temp_files()
+        return False
+    
+    @property
+    def workspace(self):
+        """Private download directory for this downloader (created on first use)"""
+        with self._workspace_lock:
+            if self._workspace is None:
+                self._workspace = Path(tempfile.mkdtemp(prefix='req_', dir=TEMP_DIR))
+            return self._workspace
+    
+    @property
+    def ydl_opts(self):
+        """yt-dlp options for audio-only download into the workspace"""
+        return {
             'format': 'bestaudio/best',
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'wav',
                 'preferredquality': '192',
             }],
-            'outtmpl': str(TEMP_DIR / '%(id)s.%(ext)s'),
+            'outtmpl': str(self.workspace / '%(id)s.%(ext)s'),
             'quiet': True,
             'no_warnings': True,
             'extract_flat': False,
@@ -64,8 +199,11 @@ class YouTubeAudioDownloader:
             
             search_url = f"ytsearch{max_results}:{query}"
             
+            import yt_dlp  # imported on first use: ~0.2s that catalog-only processes never need
+            
             with yt_dlp.YoutubeDL(ydl_search_opts) as ydl:
-                search_results = ydl.extract_info(search_url, download=False)
+                with timed_stage('youtube_search'):
+                    search_results = ydl.extract_info(search_url, download=False)
                 
                 if not search_results or 'entries' not in search_results:
                     logger.warning(f"No results found for query: {query}")
@@ -117,32 +255,53 @@ class YouTubeAudioDownloader:
             Path to downloaded audio file or None
         """
         try:
-            logger.info(f"Downloading audio from: {video_url}")
+            cached_file = self.cache.fetch(video_id, self.workspace)
+            if cached_file:
+                logger.info(f"✅ Download cache hit: {video_id}")
+                return cached_file
             
-            with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=True)
-                
-                # Find the downloaded file
-                audio_file = TEMP_DIR / f"{video_id}.wav"
-                
-                if audio_file.exists():
-                    logger.info(f"✅ Downloaded: {audio_file}")
-                    return audio_file
-                else:
-                    # Sometimes the file has a different extension
-                    for ext in ['.wav', '.m4a', '.webm', '.opus']:
-                        alt_file = TEMP_DIR / f"{video_id}{ext}"
-                        if alt_file.exists():
-                            logger.info(f"✅ Downloaded: {alt_file}")
-                            return alt_file
-                    
-                    logger.error(f"Audio file not found after download: {video_id}")
-                    return None
+            # One download per video id; concurrent callers (threads or
+            # processes) wait for it and then link the cached file
+            downloaded = download_flight.do(
+                video_id, self._download_to_cache, video_url, video_id,
+                recheck=lambda: self.cache.fetch(video_id, self.workspace)
+            )
+            
+            if not downloaded:
+                return None
+            
+            return self.cache.fetch(video_id, self.workspace)
         
         except Exception as e:
             logger.error(f"Download error for {video_url}: {str(e)}")
             return None
     
+    def _download_to_cache(self, video_url, video_id):
+        """
+        Download one video into the workspace and add it to the shared cache
+        
+        Returns:
+            True if the audio file was downloaded
+        """
+        logger.info(f"Downloading audio from: {video_url}")
+        
+        import yt_dlp  # imported on first use (see search_videos)
+        
+        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
+            with timed_stage('youtube_download'):
+                ydl.extract_info(video_url, download=True)
+        
+        # Sometimes the file has a different extension
+        for ext in AUDIO_EXTENSIONS:
+            audio_file = self.workspace / f"{video_id}{ext}"
+            if audio_file.exists():
+                logger.info(f"✅ Downloaded: {audio_file}")
+                self.cache.store(audio_file)
+                return True
+        
+        logger.error(f"Audio file not found after download: {video_id}")
+        return False
+    
     def download_multiple(self, videos):
         """
         Download audio from multiple videos in parallel
@@ -181,16 +340,39 @@ class YouTubeAudioDownloader:
         return results
     
     def cleanup_temp_files(self):
-        """Delete all temporary downloaded files"""
+        """Delete this downloader's workspace (the shared cache is untouched)"""
+        with self._workspace_lock:
+            workspace, self._workspace = self._workspace, None
+        
+        if workspace is None:
+            return
+        
         try:
-            for file in TEMP_DIR.glob('*'):
-                file.unlink()
-            logger.info("🧹 Cleaned up temporary video files")
+            shutil.rmtree(workspace)
+            logger.info(f"🧹 Cleaned up temporary video files in {workspace}")
         except Exception as e:
             logger.error(f"Cleanup error: {str(e)}")
 
 
-def search_vehicle_issue_videos(manufacturer, year, model, location, max_videos=3):
+def build_vehicle_query(manufacturer, year, model, location):
+    """Build the primary YouTube search query for a vehicle issue"""
+    return f"{manufacturer} {year} {model} {location} noise problem sound"
+
+
+def _search_with_fallback(downloader, manufacturer, model, location, query):
+    """Search for videos, retrying with a broader query if nothing is found"""
+    videos = downloader.search_videos(query, max_results=15)
+    
+    if not videos:
+        logger.warning("No videos found, trying broader search")
+        # Try broader query
+        query = f"{manufacturer} {model} {location} noise"
+        videos = downloader.search_videos(query, max_results=15)
+    
+    return videos
+
+
+def search_vehicle_issue_videos(manufacturer, year, model, location, downloader, max_videos=3):
     """
     Search for YouTube videos matching vehicle issue
     
@@ -199,26 +381,23 @@ def search_vehicle_issue_videos(manufacturer, year, model, location, max_videos=
         year: Vehicle year (e.g., "2024")
         model: Vehicle model (e.g., "3 Series")
         location: Sound location (e.g., "engine")
+        downloader: YouTubeAudioDownloader whose workspace receives the files;
+            the caller owns it (use it as a context manager so the
+            workspace is removed)
         max_videos: Maximum number of videos to download
         
     Returns:
         List of tuples: (video_info, audio_file_path)
     """
     # Build search query
-    query = f"{manufacturer} {year} {model} {location} noise problem sound"
+    query = build_vehicle_query(manufacturer, year, model, location)
     
     logger.info(f"🔍 Searching for: {query}")
     
-    downloader = YouTubeAudioDownloader(max_videos=max_videos)
-    
-    # Search for videos
-    videos = downloader.search_videos(query, max_results=15)
-    
-    if not videos:
-        logger.warning("No videos found, trying broader search")
-        # Try broader query
-        query = f"{manufacturer} {model} {location} noise"
-        videos = downloader.search_videos(query, max_results=15)
+    # Search for videos (identical in-flight searches are shared)
+    videos = search_flight.do(
+        f"{query}|{max_videos}", _search_with_fallback, downloader, manufacturer, model, location, query
+    )
     
     if not videos:
         logger.error("No videos found even with broader search")
@@ -239,23 +418,21 @@ if __name__ == '__main__':
     print("="*60)
     
     # Test with BMW example
-    results = search_vehicle_issue_videos(
-        manufacturer="BMW",
-        year="2024",
-        model="3 Series",
-        location="engine",
-        max_videos=2
-    )
-    
-    print(f"\n✅ Downloaded {len(results)} videos")
-    for video, audio_path in results:
-        print(f"\n📹 {video['title']}")
-        print(f"   URL: {video['url']}")
-        print(f"   Audio: {audio_path}")
-    
-    # Cleanup
-    downloader = YouTubeAudioDownloader()
-    downloader.cleanup_temp_files()
+    with YouTubeAudioDownloader(max_videos=2) as downloader:
+        results = search_vehicle_issue_videos(
+            manufacturer="BMW",
+            year="2024",
+            model="3 Series",
+            location="engine",
+            max_videos=2,
+            downloader=downloader
+        )
+        
+        print(f"\n✅ Downloaded {len(results)} videos")
+        for video, audio_path in results:
+            print(f"\n📹 {video['title']}")
+            print(f"   URL: {video['url']}")
+            print(f"   Audio: {audio_path}")
     
     print("\n" + "="*60)
     print("✅ Test complete!")